@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    endtoend
+    ========
+
+    End-to-end benchmark, which builds a synthetic project against a
+    :class:`~fakeserver.FakeTrackerServer`.
+
+    Build a project with 20 documents, which reference 500 distinct Github
+    issues, with 50 milliseconds latency per request, and write the results
+    to ``results.json``::
+
+       python benchmarks/endtoend.py --documents 20 --distinct-issues 500 \\
+          --latency 0.05 -o results.json
+
+    Record the responses of the fake server into a cassette, and replay them
+    later with the recorded latencies, see
+    :mod:`~sphinxcontrib.issuetracker.transport`::
+
+       python benchmarks/endtoend.py --port 8642 --cassette github.json \\
+          --cassette-mode record
+       python benchmarks/endtoend.py --port 8642 --cassette github.json
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+from optparse import OptionParser
+from timeit import default_timer
+
+from sphinxcontrib.issuetracker import resolvers
+
+from fakeserver import FakeTrackerServer
+from synthetic import make_app, make_source
+
+
+#: The trackers supported by the fake server, as mapping from tracker names
+#: to pairs of configuration values and the format of issue references.  The
+#: Github and BitBucket trackers have fixed API URLs in
+#: :mod:`~sphinxcontrib.issuetracker.resolvers`, which are pointed to the
+#: fake server by :func:`point_resolvers_at`.
+TRACKERS = {
+    'github': ({'issuetracker': 'github',
+                'issuetracker_project': 'foo/bar'}, '#{0}'),
+    'bitbucket': ({'issuetracker': 'bitbucket',
+                   'issuetracker_project': 'foo/bar'}, '#{0}'),
+    'jira': ({'issuetracker': 'jira', 'issuetracker_project': 'FOO',
+              'issuetracker_issue_pattern': r'(FOO-\d+)'}, 'FOO-{0}'),
+}
+
+
+def point_resolvers_at(url):
+    """
+    Point the API URLs of the builtin Github and BitBucket resolvers to the
+    fake server at ``url``.
+
+    Return a dictionary with the previous URLs.
+    """
+    previous = {'GITHUB_API_URL': resolvers.GITHUB_API_URL,
+                'GITHUB_ISSUES_API_URL': resolvers.GITHUB_ISSUES_API_URL,
+                'BITBUCKET_API_URL': resolvers.BITBUCKET_API_URL}
+    resolvers.GITHUB_API_URL = url + '/repos/{0.project}/issues/{1}'
+    resolvers.GITHUB_ISSUES_API_URL = (url + '/repos/{0.project}/issues?'
+                                       'state=all&per_page=100')
+    resolvers.BITBUCKET_API_URL = (url + '/1.0/repositories/'
+                                   '{0.project}/issues/{1}/')
+    return previous
+
+
+def make_documents(options, reference_format):
+    return dict(('doc{0}'.format(index), make_source(
+        paragraphs=options.paragraphs,
+        references_per_paragraph=options.references,
+        distinct_issues=options.distinct_issues,
+        reference_format=reference_format, seed=index))
+        for index in range(options.documents))
+
+
+def run_benchmark(options):
+    """
+    Build a synthetic project against a fake tracker server.
+
+    Return a dictionary with the build time in seconds, the requests served
+    by the fake server, and the resolved and missing issues.
+    """
+    server = FakeTrackerServer(
+        issue_count=options.issue_count, latency=options.latency,
+        error_rate=options.error_rate, throttle_rate=options.throttle_rate,
+        rate_limit=options.rate_limit, port=options.port)
+    directory = tempfile.mkdtemp()
+    previous_urls = point_resolvers_at(server.url)
+    try:
+        with server:
+            confoverrides, reference_format = TRACKERS[options.tracker]
+            confoverrides = dict(
+                confoverrides, issuetracker_url=server.url,
+                issuetracker_pipeline_workers=options.pipeline_workers,
+                issuetracker_circuit_breaker=options.circuit_breaker)
+            if options.cassette:
+                confoverrides.update(
+                    issuetracker_cassette=os.path.abspath(options.cassette),
+                    issuetracker_cassette_mode=options.cassette_mode)
+            app = make_app(directory,
+                           make_documents(options, reference_format),
+                           confoverrides, buildername=options.builder,
+                           lookup=None)
+            start = default_timer()
+            app.build()
+            duration = default_timer() - start
+        cache = app.env.issuetracker_cache
+        resolved = sum(1 for issue in cache.values() if issue)
+    finally:
+        for name, url in previous_urls.items():
+            setattr(resolvers, name, url)
+        shutil.rmtree(directory)
+    return {
+        'parameters': dict((name, getattr(options, name)) for name in (
+            'tracker', 'builder', 'documents', 'paragraphs', 'references',
+            'distinct_issues', 'issue_count', 'latency', 'error_rate',
+            'throttle_rate', 'rate_limit', 'pipeline_workers',
+            'circuit_breaker', 'cassette', 'cassette_mode')),
+        'duration': duration,
+        'requests': dict(server.stats),
+        'issues': {'resolved': resolved, 'missing': len(cache) - resolved},
+    }
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-o', '--output', help='Write results to FILE',
+                      metavar='FILE')
+    parser.add_option('--tracker', choices=sorted(TRACKERS),
+                      default='github',
+                      help='The issue tracker to use [%default]')
+    parser.add_option('--builder', default='html',
+                      help='The Sphinx builder to use [%default]')
+    parser.add_option('--documents', type='int', default=10,
+                      help='Number of documents [%default]')
+    parser.add_option('--paragraphs', type='int', default=20,
+                      help='Paragraphs per document [%default]')
+    parser.add_option('--references', type='int', default=5,
+                      help='Issue references per paragraph [%default]')
+    parser.add_option('--distinct-issues', type='int', default=200,
+                      help='Number of distinct referenced issues [%default]')
+    parser.add_option('--issue-count', type='int', default=1000,
+                      help='Number of existing issues [%default]')
+    parser.add_option('--latency', type='float', default=0.01,
+                      help='Latency of each request in seconds [%default]')
+    parser.add_option('--error-rate', type='float', default=0,
+                      help='Fraction of requests failing with status 500 '
+                      '[%default]')
+    parser.add_option('--throttle-rate', type='float', default=0,
+                      help='Fraction of requests failing with status 429 '
+                      '[%default]')
+    parser.add_option('--rate-limit', type='int',
+                      help='Number of requests before the Github rate limit '
+                      'is exhausted')
+    parser.add_option('--pipeline-workers', type='int', default=0,
+                      help='Look up issues in the background with N threads '
+                      '[%default]', metavar='N')
+    parser.add_option('--circuit-breaker', type='int', default=5,
+                      help='Stop requesting the tracker after N consecutive '
+                      'failures, or never if 0 [%default]', metavar='N')
+    parser.add_option('--port', type='int', default=0,
+                      help='The port of the fake server, to replay '
+                      'cassettes recorded with the same port [free port]')
+    parser.add_option('--cassette', metavar='FILE',
+                      help='Record responses into or replay responses from '
+                      'the cassette FILE')
+    parser.add_option('--cassette-mode', choices=['record', 'replay'],
+                      default='replay',
+                      help='Whether to record or replay the cassette '
+                      '[%default]')
+    options, args = parser.parse_args()
+    if args:
+        parser.error('unexpected arguments')
+    results = run_benchmark(options)
+    print('build took {0:.3f}s'.format(results['duration']))
+    for name, count in sorted(results['requests'].items()):
+        print('{0:<20} {1:6d} requests'.format(name, count))
+    print('{resolved} issues resolved, {missing} missing'.format(
+        **results['issues']))
+    if options.output:
+        with open(options.output, 'w') as stream:
+            json.dump(results, stream, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    fakeserver
+    ==========
+
+    A local stand-in for the HTTP APIs of Github, BitBucket and Jira.
+
+    The server imitates the API endpoints used by
+    :mod:`sphinxcontrib.issuetracker.resolvers`, and can inject latency,
+    server errors and rate limit responses.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import re
+import json
+import time
+import random
+import threading
+from collections import defaultdict
+from xml.sax.saxutils import escape
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs
+
+
+JIRA_RSS_XML = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<rss version="0.92">
+<channel>
+{items}</channel>
+</rss>
+"""
+
+JIRA_ITEM_XML = """\
+<item>
+<title>[{key}] {title}</title>
+<link>{link}</link>
+<project key="{project}">{project}</project>
+<summary>{title}</summary>
+<key>{key}</key>
+<resolution>{resolution}</resolution>
+</item>
+"""
+
+JIRA_SEARCH_PATH = ('/sr/jira.issueviews:searchrequest-xml/temp/'
+                    'SearchRequest.xml')
+JIRA_SEARCH_JQL = re.compile(r'^issuekey in \((?P<keys>[^)]*)\)$')
+JIRA_KEY = re.compile(r'^(?P<project>[A-Z][A-Z0-9]*)-(?P<id>\d+)$')
+
+
+class FakeIssue(object):
+    """
+    An issue served by the fake server.
+
+    Issues with even numbers are closed.
+    """
+
+    def __init__(self, project, number, base_url):
+        self.project = project
+        self.number = number
+        self.title = 'Issue {0}'.format(number)
+        self.closed = number % 2 == 0
+        self.url = '{0}/{1}/issues/{2}'.format(base_url, project, number)
+
+
+class FakeTrackerServer(ThreadingMixIn, HTTPServer):
+    """
+    A fake issue tracker server on ``localhost``.
+
+    The server knows the issues ``1`` to ``issue_count`` of every project.
+    Each request waits ``latency`` seconds before it is answered.  A fraction
+    of ``error_rate`` of all requests fails with status 500, and a fraction
+    of ``throttle_rate`` of all requests fails with status 429.  If
+    ``rate_limit`` is not ``None``, it is the number of requests the Github
+    endpoint answers, before it responds with status 403 like the real Github
+    API with an exhausted rate limit.
+
+    The counts of all requests by endpoint and status code are available in
+    :attr:`stats`.
+
+    The server listens on ``port``, or on a free port, if ``port`` is ``0``.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, issue_count=1000, latency=0, error_rate=0,
+                 throttle_rate=0, rate_limit=None, seed=0, port=0):
+        HTTPServer.__init__(self, ('127.0.0.1', port), FakeTrackerHandler)
+        self.issue_count = issue_count
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.rate_remaining = rate_limit
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = defaultdict(int)
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        The base URL of this server, without trailing slash.
+        """
+        return 'http://{0}:{1}'.format(*self.server_address)
+
+    def start(self):
+        """
+        Serve requests in a background thread.
+        """
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def get_issue(self, project, number):
+        """
+        Get the :class:`FakeIssue` with the given ``number`` in ``project``,
+        or ``None``, if there is no such issue.
+        """
+        if 1 <= number <= self.issue_count:
+            return FakeIssue(project, number, self.url)
+        return None
+
+    def inject_failure(self):
+        """
+        Decide whether to fail the current request.
+
+        Return the status code to fail with, or ``None``.
+        """
+        with self.lock:
+            value = self.random.random()
+        if value < self.error_rate:
+            return 500
+        if value < self.error_rate + self.throttle_rate:
+            return 429
+        return None
+
+    def take_rate_limit(self):
+        """
+        Consume one request of the Github rate limit.
+
+        Return the number of remaining requests, or ``None`` if the rate
+        limit is exhausted.
+        """
+        with self.lock:
+            if self.rate_remaining is None:
+                return 5000
+            if self.rate_remaining <= 0:
+                return None
+            self.rate_remaining -= 1
+            return self.rate_remaining
+
+    def record(self, endpoint, status):
+        with self.lock:
+            self.stats['{0} {1}'.format(endpoint, status)] += 1
+
+
+class FakeTrackerHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of :class:`FakeTrackerServer`.
+    """
+
+    #: Endpoints as pairs of patterns of request paths and handler methods.
+    ENDPOINTS = [
+        (re.compile(r'^/repos/(?P<project>[^/]+/[^/]+)/issues/(?P<id>\d+)$'),
+         'github'),
+        (re.compile(r'^/1\.0/repositories/(?P<project>[^/]+/[^/]+)/issues/'
+                    r'(?P<id>\d+)/$'),
+         'bitbucket'),
+        (re.compile(r'^/si/jira\.issueviews:issue-xml/'
+                    r'(?P<project>[A-Z][A-Z0-9]*)-(?P<id>\d+)/[^/]+\.xml$'),
+         'jira'),
+    ]
+
+    def log_message(self, format, *args):
+        # be quiet
+        pass
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        path, _, query = self.path.partition('?')
+        if path == JIRA_SEARCH_PATH:
+            return self.respond_jira_search(parse_qs(query))
+        for pattern, endpoint in self.ENDPOINTS:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            return self.respond('unknown', 404)
+        status = self.server.inject_failure()
+        if status == 429:
+            return self.respond(endpoint, 429, headers={'Retry-After': '1'})
+        elif status:
+            return self.respond(endpoint, status)
+        project = match.group('project')
+        issue = self.server.get_issue(project, int(match.group('id')))
+        getattr(self, 'respond_' + endpoint)(project, issue)
+
+    def respond(self, endpoint, status, body=b'', content_type='text/plain',
+                headers=None):
+        self.server.record(endpoint, status)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def respond_json(self, endpoint, data, headers=None):
+        body = json.dumps(data).encode('utf-8')
+        self.respond(endpoint, 200, body, 'application/json', headers)
+
+    def respond_github(self, project, issue):
+        remaining = self.server.take_rate_limit()
+        reset = str(int(time.time()) + 3600)
+        if remaining is None:
+            return self.respond('github', 403, headers={
+                'X-RateLimit-Limit': str(self.server.rate_limit),
+                'X-RateLimit-Remaining': '0',
+                'X-RateLimit-Reset': reset})
+        headers = {'X-RateLimit-Limit': str(self.server.rate_limit or 5000),
+                   'X-RateLimit-Remaining': str(remaining),
+                   'X-RateLimit-Reset': reset}
+        if not issue:
+            return self.respond('github', 404, headers=headers)
+        self.respond_json('github', {
+            'number': issue.number, 'title': issue.title,
+            'state': 'closed' if issue.closed else 'open',
+            'html_url': issue.url}, headers)
+
+    def respond_bitbucket(self, project, issue):
+        if not issue:
+            return self.respond('bitbucket', 404)
+        self.respond_json('bitbucket', {
+            'local_id': issue.number, 'title': issue.title,
+            'status': 'resolved' if issue.closed else 'open'})
+
+    def format_jira_item(self, issue):
+        return JIRA_ITEM_XML.format(
+            key='{0}-{1}'.format(issue.project, issue.number),
+            title=escape(issue.title), link=escape(issue.url),
+            project=issue.project,
+            resolution='Fixed' if issue.closed else 'Unresolved')
+
+    def respond_jira(self, project, issue):
+        if not issue:
+            return self.respond('jira', 404)
+        body = JIRA_RSS_XML.format(items=self.format_jira_item(issue))
+        self.respond('jira', 200, body.encode('utf-8'), 'text/xml')
+
+    def respond_jira_search(self, query):
+        status = self.server.inject_failure()
+        if status == 429:
+            return self.respond('jira-search', 429,
+                                headers={'Retry-After': '1'})
+        elif status:
+            return self.respond('jira-search', status)
+        match = JIRA_SEARCH_JQL.match(query.get('jqlQuery', [''])[0])
+        if not match:
+            return self.respond('jira-search', 400)
+        issues = []
+        for key in match.group('keys').split(','):
+            key_match = JIRA_KEY.match(key.strip())
+            issue = key_match and self.server.get_issue(
+                key_match.group('project'), int(key_match.group('id')))
+            if not issue:
+                # like Jira, reject searches for missing issues
+                return self.respond('jira-search', 400)
+            issues.append(issue)
+        body = JIRA_RSS_XML.format(
+            items=''.join(self.format_jira_item(issue) for issue in issues))
+        self.respond('jira-search', 200, body.encode('utf-8'), 'text/xml')
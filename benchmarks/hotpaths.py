@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    hotpaths
+    ========
+
+    CPU benchmarks for the hot paths of :mod:`sphinxcontrib.issuetracker`.
+
+    Time :class:`~sphinxcontrib.issuetracker.IssueReferences`,
+    :func:`~sphinxcontrib.issuetracker.lookup_issues` and
+    :func:`~sphinxcontrib.issuetracker.resolve_issue_reference` and
+    :class:`~sphinxcontrib.issuetracker.IssueReferencesResolver` on synthetic
+    doctrees, with an issue lookup that resolves every issue immediately.
+
+    Run all benchmarks and write the results to ``results.json``::
+
+       python benchmarks/hotpaths.py -o results.json
+
+    Show that the transform scales linearly with the number of issue
+    references in a single paragraph::
+
+       python benchmarks/hotpaths.py -b transform -s 1000 -s 10000 -s 100000
+
+    Compare the results against the results of an earlier run, and fail if
+    any benchmark is more than 10 percent slower::
+
+       python benchmarks/hotpaths.py --compare baseline.json results.json
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import sys
+import json
+import shutil
+import platform
+import tempfile
+import subprocess
+from optparse import OptionParser
+from timeit import default_timer
+
+import sphinx
+import docutils
+from sphinx.addnodes import pending_xref
+
+from sphinxcontrib import issuetracker
+from sphinxcontrib.issuetracker import (IssueReferences,
+                                        IssueReferencesResolver,
+                                        lookup_issues,
+                                        resolve_issue_reference)
+
+from synthetic import make_app, make_document
+
+
+def prepare_transformed(app, options):
+    document = make_document(app.env, **options.document)
+    IssueReferences(document).apply()
+    return document
+
+
+def prepare_cold(app, options):
+    document = prepare_transformed(app, options)
+    app.env.issuetracker_cache.clear()
+    return document
+
+
+def prepare_warm(app, options):
+    document = prepare_transformed(app, options)
+    lookup_issues(app, document)
+    return document
+
+
+def run_transform(app, document):
+    IssueReferences(document).apply()
+
+
+def run_lookup(app, document):
+    lookup_issues(app, document)
+
+
+def run_resolve(app, document):
+    for node in document.traverse(pending_xref):
+        resolve_issue_reference(app, app.env, node, node[0])
+
+
+def run_resolve_all(app, document):
+    IssueReferencesResolver(document).apply()
+
+
+#: All benchmarks as mapping from names to pairs of functions.  The first
+#: function prepares a document, the second function is timed with this
+#: document.
+BENCHMARKS = {
+    'transform': (
+        lambda app, options: make_document(app.env, **options.document),
+        run_transform),
+    'lookup-cold': (prepare_cold, run_lookup),
+    'lookup-warm': (prepare_warm, run_lookup),
+    'resolve': (prepare_warm, run_resolve),
+    'resolve-all': (prepare_warm, run_resolve_all),
+}
+
+
+def run_benchmark(app, name, options):
+    """
+    Run the benchmark with the given ``name`` ``options.repeat`` times.
+
+    Return a dictionary with the duration of all runs and their minimum and
+    median in seconds.
+    """
+    prepare, run = BENCHMARKS[name]
+    durations = []
+    for _ in range(options.repeat):
+        document = prepare(app, options)
+        start = default_timer()
+        run(app, document)
+        durations.append(default_timer() - start)
+    durations.sort()
+    return {'runs': durations, 'min': durations[0],
+            'median': durations[len(durations) // 2]}
+
+
+def run_scaling(app, sizes, repeat):
+    """
+    Time the transform of documents with a single paragraph of ``size`` text
+    nodes for each of the given ``sizes``, with an issue reference in every
+    text node.
+
+    Return a dictionary, which maps each size to the minimum duration and the
+    minimum duration per text node in seconds.  With linear scaling, the
+    duration per text node remains constant.
+    """
+    results = {}
+    for size in sizes:
+        durations = []
+        for _ in range(repeat):
+            document = make_document(app.env, text_nodes=size,
+                                     reference_density=1, literal_ratio=0,
+                                     nodes_per_paragraph=size)
+            start = default_timer()
+            IssueReferences(document).apply()
+            durations.append(default_timer() - start)
+        results[str(size)] = {'min': min(durations),
+                              'per_node': min(durations) / size}
+    return results
+
+
+def get_revision():
+    try:
+        process = subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+    except OSError:
+        return None
+    stdout, _ = process.communicate()
+    return stdout.decode('ascii').strip() or None
+
+
+def run_benchmarks(options):
+    """
+    Run all benchmarks selected by ``options``.
+
+    Return a dictionary with information about the benchmark environment and
+    the results of all benchmarks.
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        confoverrides = {}
+        if options.pattern:
+            confoverrides['issuetracker_issue_pattern'] = options.pattern
+        app = make_app(directory, confoverrides=confoverrides)
+        # lookup_issues records the referencing document
+        app.env.temp_data['docname'] = 'synthetic'
+        results = {}
+        for name in options.benchmarks or sorted(BENCHMARKS):
+            results[name] = run_benchmark(app, name, options)
+        scaling = None
+        if options.scaling:
+            scaling = run_scaling(app, options.scaling, options.repeat)
+    finally:
+        shutil.rmtree(directory)
+    return {
+        'revision': get_revision(),
+        'python': platform.python_version(),
+        'sphinx': sphinx.__version__,
+        'docutils': docutils.__version__,
+        'issuetracker': issuetracker.__version__,
+        'parameters': dict(options.document, repeat=options.repeat,
+                           pattern=options.pattern),
+        'results': results,
+        'scaling': scaling,
+    }
+
+
+def print_results(results):
+    for name, result in sorted(results['results'].items()):
+        print('{0:<20} min {1:10.6f}s  median {2:10.6f}s'.format(
+            name, result['min'], result['median']))
+    for size, result in sorted((results.get('scaling') or {}).items(),
+                               key=lambda item: int(item[0])):
+        print('transform {0:>10} nodes min {1:10.6f}s  {2:8.3f}us per '
+              'node'.format(size, result['min'], result['per_node'] * 1e6))
+
+
+def compare(baseline, results, threshold):
+    """
+    Compare ``results`` against ``baseline``.
+
+    Print a line for each benchmark in both results.  A benchmark regressed,
+    if its minimum duration increased by more than ``threshold`` (a fraction
+    of the baseline duration).
+
+    Return the list of the names of all regressed benchmarks.
+    """
+    if baseline['parameters'] != results['parameters']:
+        print('warning: results were obtained with different parameters',
+              file=sys.stderr)
+    regressions = []
+    for name in sorted(set(baseline['results']) & set(results['results'])):
+        before = baseline['results'][name]['min']
+        after = results['results'][name]['min']
+        change = (after - before) / before if before else 0
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print('{0:<20} {1:10.6f}s -> {2:10.6f}s  {3:+7.1%}{4}'.format(
+            name, before, after, change, '  REGRESSION' if regressed else ''))
+    return regressions
+
+
+def main():
+    parser = OptionParser(
+        usage='%prog [options]\n       %prog --compare BASELINE RESULTS')
+    parser.add_option('-o', '--output', help='Write results to FILE',
+                      metavar='FILE')
+    parser.add_option('-b', '--benchmark', dest='benchmarks',
+                      action='append', choices=sorted(BENCHMARKS),
+                      help='Only run the given benchmark (repeatable)')
+    parser.add_option('-r', '--repeat', type='int', default=5,
+                      help='Number of runs of each benchmark [%default]')
+    parser.add_option('-n', '--text-nodes', type='int', default=10000,
+                      help='Text nodes per document [%default]')
+    parser.add_option('-d', '--reference-density', type='float',
+                      default=0.05,
+                      help='Probability of issue references in text nodes '
+                      '[%default]')
+    parser.add_option('-l', '--literal-ratio', type='float', default=0.1,
+                      help='Fraction of text nodes in literal blocks '
+                      '[%default]')
+    parser.add_option('-i', '--distinct-issues', type='int', default=100,
+                      help='Number of distinct referenced issues [%default]')
+    parser.add_option('-s', '--scaling', type='int', action='append',
+                      metavar='SIZE',
+                      help='Time the transform of a single paragraph with '
+                      'SIZE issue references (repeatable)')
+    parser.add_option('-p', '--pattern',
+                      help='Use PATTERN as issuetracker_issue_pattern')
+    parser.add_option('-c', '--compare', action='store_true',
+                      help='Compare two result files')
+    parser.add_option('-t', '--threshold', type='float', default=0.1,
+                      help='Fraction of the baseline duration, by which a '
+                      'benchmark must be slower to regress [%default]')
+    options, args = parser.parse_args()
+    if options.compare:
+        if len(args) != 2:
+            parser.error('--compare requires two result files')
+        baseline, results = [json.load(open(filename)) for filename in args]
+        return 1 if compare(baseline, results, options.threshold) else 0
+    if args:
+        parser.error('unexpected arguments')
+    options.document = dict(text_nodes=options.text_nodes,
+                            reference_density=options.reference_density,
+                            literal_ratio=options.literal_ratio,
+                            distinct_issues=options.distinct_issues)
+    results = run_benchmarks(options)
+    print_results(results)
+    if options.output:
+        with open(options.output, 'w') as stream:
+            json.dump(results, stream, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    synthetic
+    =========
+
+    Synthetic Sphinx applications and doctrees for benchmarks.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import os
+import random
+
+from docutils import nodes
+from docutils.frontend import OptionParser
+from docutils.parsers.rst import Parser
+from docutils.utils import new_document
+from sphinx.application import Sphinx
+
+from sphinxcontrib.issuetracker import Issue
+
+
+#: configuration of synthetic projects
+CONF_PY = """\
+extensions = ['sphinxcontrib.issuetracker']
+
+source_suffix = '.rst'
+
+master_doc = 'index'
+
+project = u'issuetracker-benchmark'
+copyright = u'2013, foo'
+
+version = '1'
+release = '1'
+
+exclude_patterns = []
+"""
+
+FILLER = 'Lorem ipsum dolor sit amet, consectetur adipisici elit'
+
+
+def make_issue(issue_id):
+    """
+    Make the synthetic issue with the given ``issue_id``.
+
+    Issues with even ids are closed.
+    """
+    return Issue(id=issue_id, title='Issue {0}'.format(issue_id),
+                 url='http://issues.example.com/{0}'.format(issue_id),
+                 closed=int(issue_id) % 2 == 0)
+
+
+def lookup_synthetic_issue(app, tracker_config, issue_id):
+    """
+    A callback for :event:`issuetracker-lookup-issue`, which resolves each
+    issue to a synthetic issue immediately.
+    """
+    return make_issue(issue_id)
+
+
+def write_project(srcdir, documents=None, confoverrides=None):
+    """
+    Write a synthetic project to ``srcdir``.
+
+    ``documents`` maps document names to their content.  The project always
+    has an ``index`` document, which contains a toctree of all other
+    documents.  ``confoverrides`` is a dictionary of additional configuration
+    values, which are written to :file:`conf.py`.
+    """
+    documents = dict(documents or {})
+    toctree = '\n'.join('   ' + name for name in sorted(documents))
+    documents.setdefault(
+        'index', 'Index\n=====\n\n.. toctree::\n\n{0}\n'.format(toctree))
+    if not os.path.isdir(srcdir):
+        os.makedirs(srcdir)
+    conf_py = CONF_PY + ''.join('{0} = {1!r}\n'.format(key, value) for
+                                key, value in (confoverrides or {}).items())
+    with open(os.path.join(srcdir, 'conf.py'), 'wb') as stream:
+        stream.write(conf_py.encode('utf-8'))
+    for name, content in documents.items():
+        with open(os.path.join(srcdir, name + '.rst'), 'wb') as stream:
+            stream.write(content.encode('utf-8'))
+
+
+def make_app(directory, documents=None, confoverrides=None,
+             buildername='html', lookup=lookup_synthetic_issue):
+    """
+    Make a Sphinx application for a synthetic project in ``directory``.
+
+    ``documents`` and ``confoverrides`` are passed to :func:`write_project`.
+    ``lookup`` is connected to :event:`issuetracker-lookup-issue`, unless it
+    is ``None``.
+    """
+    srcdir = os.path.join(directory, 'src')
+    write_project(srcdir, documents, confoverrides)
+    app = Sphinx(srcdir, srcdir, os.path.join(directory, buildername),
+                 os.path.join(directory, 'doctrees'), buildername,
+                 status=None, warning=None, freshenv=True)
+    if lookup:
+        app.connect(str('issuetracker-lookup-issue'), lookup)
+    return app
+
+
+def make_text(rng, reference_density, distinct_issues):
+    """
+    Make the text of a single text node, which contains an issue reference
+    with probability ``reference_density``.
+    """
+    if rng.random() < reference_density:
+        issue_id = rng.randint(1, distinct_issues)
+        return '{0}, see #{1}. {0}'.format(FILLER, issue_id)
+    return FILLER
+
+
+def make_document(env, text_nodes=10000, reference_density=0.05,
+                  literal_ratio=0.1, distinct_issues=100,
+                  nodes_per_paragraph=10, seed=0):
+    """
+    Make a synthetic document for the given Sphinx ``env``.
+
+    The document has ``text_nodes`` text nodes.  A fraction of
+    ``literal_ratio`` of all text nodes is put into literal blocks, all other
+    text nodes are put into paragraphs of ``nodes_per_paragraph`` text nodes,
+    alternating between plain and emphasized text.  Each text node contains
+    an issue reference with probability ``reference_density``.  Issue ids are
+    drawn from ``distinct_issues`` different ids, so that each issue is
+    referenced repeatedly.  ``seed`` initializes the random number
+    generator, so documents with the same arguments are equal.
+    """
+    settings = OptionParser(components=(Parser,)).get_default_values()
+    settings.env = env
+    document = new_document('<synthetic>', settings)
+    rng = random.Random(seed)
+    paragraph = None
+    for index in range(text_nodes):
+        text = make_text(rng, reference_density, distinct_issues)
+        if rng.random() < literal_ratio:
+            document += nodes.literal_block(text, text)
+            continue
+        if paragraph is None or len(paragraph) >= nodes_per_paragraph:
+            paragraph = nodes.paragraph()
+            document += paragraph
+        if index % 2:
+            paragraph += nodes.emphasis(text, text)
+        else:
+            paragraph += nodes.Text(text)
+    return document
+
+
+
+def make_source(paragraphs=100, references_per_paragraph=5,
+                distinct_issues=100, reference_format='#{0}', seed=0):
+    """
+    Make the reStructuredText source of a synthetic document.
+
+    The document has ``paragraphs`` paragraphs with
+    ``references_per_paragraph`` issue references each, drawn from
+    ``distinct_issues`` different issue numbers.  ``reference_format`` is a
+    format string for issue references, which gets the issue number.
+    """
+    rng = random.Random(seed)
+    lines = ['Synthetic document {0}'.format(seed), '=' * 30, '']
+    for _ in range(paragraphs):
+        lines.append(' '.join(
+            '{0}, see {1}.'.format(FILLER, reference_format.format(
+                rng.randint(1, distinct_issues)))
+            for _ in range(references_per_paragraph)))
+        lines.append('')
+    return '\n'.join(lines)
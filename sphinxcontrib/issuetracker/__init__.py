@@ -44,8 +44,16 @@
 
 import sys
 import re
+import time
 from os import path
+from bisect import bisect_right
 from collections import namedtuple
+from timeit import default_timer
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
 
 from docutils import nodes
 from docutils.transforms import Transform
@@ -54,14 +62,23 @@
 from sphinx.util.osutil import copyfile
 from sphinx.util.console import bold
 
+from sphinxcontrib.issuetracker.breaker import (CircuitBreaker,
+                                                TrackerUnavailable)
+from sphinxcontrib.issuetracker.cache import IssueCache, InFlightLookups
+from sphinxcontrib.issuetracker.stats import BuildStats
+from sphinxcontrib.issuetracker.tracing import Tracer, NullTracer
+from sphinxcontrib.issuetracker.util import write_file_atomically
+
 
 # Python 2/3 compatibility aliases
 if sys.version_info[0] >= 3:
     string_type = str
     text_type = str
+    unichr = chr
 else:
     string_type = basestring
     text_type = unicode
+    unichr = unichr
 
 
 Issue = namedtuple('Issue', 'id title url closed')
@@ -94,6 +111,205 @@ def from_sphinx_config(cls, config):
         return cls(project, url)
 
 
+class TrackerRegistry(object):
+    """
+    Registry of tracker configurations.
+
+    Issue reference nodes don't contain the :class:`TrackerConfig` for the
+    referenced issue, but only its key in this registry, to keep pickled
+    doctrees small.  The registry is available at
+    ``app.env.issuetracker_trackers`` and is pickled along with the
+    environment, so that keys in pickled doctrees remain valid.
+    """
+
+    def __init__(self):
+        self._tracker_configs = []
+
+    def register(self, tracker_config):
+        """
+        Register the given ``tracker_config``.
+
+        Return the key of ``tracker_config`` as integer.
+        """
+        try:
+            return self._tracker_configs.index(tracker_config)
+        except ValueError:
+            self._tracker_configs.append(tracker_config)
+            return len(self._tracker_configs) - 1
+
+    def __getitem__(self, key):
+        return self._tracker_configs[key]
+
+
+def get_tracker_config(env, node):
+    """
+    Get the :class:`TrackerConfig` of the given issue reference ``node``.
+    """
+    if 'trackerconfig' in node:
+        # a node pickled by an older version of this extension
+        return node['trackerconfig']
+    return env.issuetracker_trackers[node['tracker']]
+
+
+IssuePattern = namedtuple('IssuePattern', 'regex literal batchable')
+
+
+#: Opcodes of regular expressions, which look at the text around a match.
+#: Patterns with these opcodes are not batchable, see
+#: :func:`find_issue_references`.  Word boundaries (``\b``) are fine, because
+#: the separator between batched texts is not a word character, just like the
+#: start or the end of a text.
+CONTEXT_OPCODES = frozenset([sre_parse.ASSERT, sre_parse.ASSERT_NOT])
+CONTEXT_AT_CODES = frozenset([
+    sre_parse.AT_BEGINNING, sre_parse.AT_BEGINNING_STRING,
+    sre_parse.AT_END, sre_parse.AT_END_STRING])
+
+
+def _flatten_pattern(parsed_pattern):
+    """
+    Flatten a parsed regular expression into a sequence of literal characters.
+
+    Yield each literal character in ``parsed_pattern``, and ``None`` for any
+    other part of the pattern.  Groups are flattened into the sequence, since
+    the contents of a group are matched literally, too.
+    """
+    for opcode, argument in parsed_pattern:
+        if opcode == sre_parse.LITERAL:
+            yield unichr(argument)
+        elif opcode == sre_parse.SUBPATTERN and not (
+                # groups with case-insensitive flags like (?i:#)
+                len(argument) == 4 and argument[1] & re.IGNORECASE):
+            for char in _flatten_pattern(argument[-1]):
+                yield char
+        else:
+            yield None
+
+
+def _subpatterns(argument):
+    """
+    Get all parsed subpatterns in the ``argument`` of an opcode of a parsed
+    regular expression.
+    """
+    if isinstance(argument, sre_parse.SubPattern):
+        yield argument
+    elif isinstance(argument, (tuple, list)):
+        for item in argument:
+            for subpattern in _subpatterns(item):
+                yield subpattern
+
+
+def _is_batchable(parsed_pattern):
+    """
+    Check whether a parsed regular expression can be run over the joined text
+    of many nodes.
+
+    Return ``False``, if ``parsed_pattern`` contains assertions or anchors,
+    which would see the text of adjacent nodes, and ``True`` otherwise.
+    """
+    for opcode, argument in parsed_pattern:
+        if opcode in CONTEXT_OPCODES:
+            return False
+        if opcode == sre_parse.AT and argument in CONTEXT_AT_CODES:
+            return False
+        if not all(_is_batchable(p) for p in _subpatterns(argument)):
+            return False
+    return True
+
+
+def _required_literal(regex):
+    """
+    Get the longest literal string which every match of ``regex`` contains.
+
+    ``regex`` is a compiled regular expression.  Return the literal as string,
+    or ``None``, if ``regex`` doesn't require any literal string.
+    """
+    if regex.flags & re.IGNORECASE or not isinstance(regex.pattern, text_type):
+        return None
+    longest = current = ''
+    for char in _flatten_pattern(sre_parse.parse(regex.pattern, regex.flags)):
+        if char is None:
+            current = ''
+        else:
+            current += char
+            if len(current) > len(longest):
+                longest = current
+    return longest or None
+
+
+def compile_issue_pattern(pattern):
+    """
+    Compile and validate an issue pattern.
+
+    ``pattern`` is the value of :confval:`issuetracker_issue_pattern`, either a
+    string or a compiled regular expression.
+
+    Return an :class:`IssuePattern` with the compiled regular expression, the
+    literal string, which every issue reference contains (e.g. ``'#'`` for
+    ``#10``), or ``None``, if there is no such literal, and whether the pattern
+    is batchable.  Raise :exc:`~exceptions.ValueError`, if ``pattern`` doesn't
+    have exactly one group.
+    """
+    if isinstance(pattern, string_type):
+        pattern = re.compile(pattern)
+    if pattern.groups != 1:
+        raise ValueError('issuetracker_issue_pattern must have '
+                         'exactly one group: {0!r}'.format(pattern.pattern))
+    batchable = _is_batchable(sre_parse.parse(pattern.pattern, pattern.flags))
+    return IssuePattern(pattern, _required_literal(pattern), batchable)
+
+
+def _find_matches(regex, text, offset=0):
+    return [(match.start() - offset, match.end() - offset,
+             match.group(0), match.group(1))
+            for match in regex.finditer(text)]
+
+
+def find_issue_references(issue_pattern, texts):
+    """
+    Find issue references in ``texts``.
+
+    ``issue_pattern`` is the :class:`IssuePattern` to find issue references
+    with.  ``texts`` is a list of strings.
+
+    If ``issue_pattern`` is batchable, all ``texts`` are joined into a single
+    buffer, which is searched in a single pass.  The positions of all matches
+    are then mapped back to the original texts with the offsets of the texts
+    in the buffer.  Matches never cross the boundaries of texts: If a match
+    would do so, the texts it spans are searched separately.  Patterns with
+    anchors or assertions, which would see adjacent texts, are not batchable,
+    and each text is searched separately.
+
+    Return a list, which contains a list of matches for each text.  Each match
+    is a tuple ``(start, end, issuetext, issue_id)``, where ``start`` and
+    ``end`` give the position of the match in its text, ``issuetext`` is the
+    whole text of the match, and ``issue_id`` the issue id.
+    """
+    regex = issue_pattern.regex
+    if not issue_pattern.batchable or len(texts) <= 1:
+        return [_find_matches(regex, text) for text in texts]
+    offsets = []
+    offset = 0
+    for text in texts:
+        offsets.append(offset)
+        # account for the separator
+        offset += len(text) + 1
+    matches = [[] for _ in texts]
+    crossed = set()
+    for match in regex.finditer('\n'.join(texts)):
+        start, end = match.span()
+        index = bisect_right(offsets, start) - 1
+        offset = offsets[index]
+        if end <= offset + len(texts[index]):
+            matches[index].append((start - offset, end - offset,
+                                   match.group(0), match.group(1)))
+        else:
+            last_index = bisect_right(offsets, end - 1) - 1
+            crossed.update(range(index, last_index + 1))
+    for index in crossed:
+        matches[index] = _find_matches(regex, texts[index])
+    return matches
+
+
 class IssueRole(XRefRole):
     """
     Standard Sphinx cross-referencing role to reference issues.
@@ -107,11 +323,51 @@ class IssueRole(XRefRole):
     innernodeclass = nodes.inline
 
     def process_link(self, env, refnode, has_explicit_title, title, target):
-        # store the tracker config in the reference node
-        refnode['trackerconfig'] = TrackerConfig.from_sphinx_config(env.config)
+        # store the key of the tracker config in the reference node
+        refnode['tracker'] = env.issuetracker_trackers.register(
+            TrackerConfig.from_sphinx_config(env.config))
         return title, target
 
 
+def iter_text_nodes(node):
+    """
+    Iterate over all text nodes below ``node`` in document order, except for
+    text nodes, whose parent is an inline or block literal.  Text in markup
+    nested in literals, e.g. emphasis in a ``parsed-literal``, is included.
+
+    Unlike :meth:`~docutils.nodes.Node.traverse` this function doesn't build
+    a list of all nodes.
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, nodes.Text):
+            if not isinstance(node.parent, (nodes.literal,
+                                            nodes.FixedTextElement)):
+                yield node
+        else:
+            stack.extend(reversed(node.children))
+
+
+def replace_children(parent, replacements):
+    """
+    Replace children of ``parent`` in a single pass.
+
+    ``replacements`` maps the ids of children to lists of new nodes, which
+    replace these children.  Children without replacement are kept.
+    """
+    children = []
+    for child in parent.children:
+        new_nodes = replacements.get(id(child))
+        if new_nodes is None:
+            children.append(child)
+        else:
+            for new_node in new_nodes:
+                parent.setup_child(new_node)
+            children.extend(new_nodes)
+    parent.children = children
+
+
 class IssueReferences(Transform):
     """
     Parse and transform issue ids in a document.
@@ -121,61 +377,79 @@ class IssueReferences(Transform):
     later stages of the build.
     """
 
-    default_priority = 999
+    # before the transform of Sphinx 1.6 and newer, which emits doctree-read
+    default_priority = 870
 
     def apply(self):
-        config = self.document.settings.env.config
-        tracker_config = TrackerConfig.from_sphinx_config(config)
-        issue_pattern = config.issuetracker_issue_pattern
-        title_template = config.issuetracker_title_template
-        if isinstance(issue_pattern, string_type):
-            issue_pattern = re.compile(issue_pattern)
-        for node in self.document.traverse(nodes.Text):
-            parent = node.parent
-            if isinstance(parent, (nodes.literal, nodes.FixedTextElement)):
-                # ignore inline and block literal text
+        start_time = default_timer()
+        env = self.document.settings.env
+        tracker = env.issuetracker_trackers.register(
+            TrackerConfig.from_sphinx_config(env.config))
+        issue_pattern = env.issuetracker_issue_pattern
+        title_template = env.config.issuetracker_title_template
+        literal = issue_pattern.literal
+        text_nodes = []
+        visited_text_nodes = 0
+        for node in iter_text_nodes(self.document):
+            visited_text_nodes += 1
+            if literal is not None and literal not in node:
+                # the node can't contain an issue reference, so don't bother
+                # to run the pattern over it
+                continue
+            text_nodes.append(node)
+        texts = [text_type(node) for node in text_nodes]
+        all_matches = find_issue_references(issue_pattern, texts)
+        references = 0
+        # the new nodes of all text nodes with issue references, and the
+        # parents of these text nodes, both by the id of the node
+        replacements = {}
+        parents = {}
+        for node, text, matches in zip(text_nodes, texts, all_matches):
+            if not matches:
+                # no issue references were found, move on to the next node
                 continue
-            text = text_type(node)
+            references += len(matches)
             new_nodes = []
             last_issue_ref_end = 0
-            for match in issue_pattern.finditer(text):
-                # catch invalid pattern with too many groups
-                if len(match.groups()) != 1:
-                    raise ValueError(
-                        'issuetracker_issue_pattern must have '
-                        'exactly one group: {0!r}'.format(match.groups()))
+            for start, end, issuetext, issue_id in matches:
                 # extract the text between the last issue reference and the
                 # current issue reference and put it into a new text node
-                head = text[last_issue_ref_end:match.start()]
+                head = text[last_issue_ref_end:start]
                 if head:
                     new_nodes.append(nodes.Text(head))
                 # adjust the position of the last issue reference in the
                 # text
-                last_issue_ref_end = match.end()
-                # extract the issue text (including the leading dash)
-                issuetext = match.group(0)
-                # extract the issue number (excluding the leading dash)
-                issue_id = match.group(1)
+                last_issue_ref_end = end
                 # turn the issue reference into a reference node
                 refnode = pending_xref()
                 refnode['reftarget'] = issue_id
                 refnode['reftype'] = 'issue'
-                refnode['trackerconfig'] = tracker_config
+                refnode['tracker'] = tracker
                 reftitle = title_template or issuetext
                 refnode.append(nodes.inline(
                     issuetext, reftitle, classes=['xref', 'issue']))
                 new_nodes.append(refnode)
-            if not new_nodes:
-                # no issue references were found, move on to the next node
-                continue
             # extract the remaining text after the last issue reference, and
             # put it into a text node
             tail = text[last_issue_ref_end:]
             if tail:
                 new_nodes.append(nodes.Text(tail))
-            # find and remove the original node, and insert all new nodes
-            # instead
-            parent.replace(node, new_nodes)
+            # text nodes are strings, which compare equal by their contents,
+            # so identify them by id
+            replacements[id(node)] = new_nodes
+            parents[id(node.parent)] = node.parent
+        # rewrite the children of each parent at once, instead of replacing
+        # each text node separately, which is quadratic in the number of
+        # children
+        for parent in parents.values():
+            replace_children(parent, replacements)
+        end_time = default_timer()
+        env.issuetracker_stats.record_transform(
+            visited_text_nodes, len(text_nodes), references,
+            end_time - start_time)
+        env.issuetracker_tracer.record(
+            'transform', 'transform', start_time, end_time,
+            docname=env.docname, references=references)
 
 
 def make_issue_reference(issue, content_node):
@@ -203,8 +477,9 @@ def lookup_issue(app, tracker_config, issue_id):
     Lookup the given issue.
 
     The issue is first looked up in an internal cache.  If it is not found, the
-    event ``issuetracker-lookup-issue`` is emitted.  The result of this
-    invocation is then cached and returned.
+    event ``issuetracker-lookup-issues`` is emitted, and if this doesn't
+    provide the issue, the event ``issuetracker-lookup-issue`` is emitted.  The
+    result of this invocation is then cached and returned.
 
     ``app`` is the sphinx application object.  ``tracker_config`` is the
     :class:`TrackerConfig` object representing the issue tracker configuration.
@@ -213,28 +488,322 @@ def lookup_issue(app, tracker_config, issue_id):
     Return a :class:`Issue` object for the issue with the given ``issue_id``,
     or ``None`` if the issue wasn't found.
     """
+    return lookup_issue_ids(app, tracker_config, [issue_id])[issue_id]
+
+
+def lookup_issue_ids(app, tracker_config, issue_ids):
+    """
+    Lookup all issues with the given ids.
+
+    The issues are first looked up in an internal cache, and then in the
+    issue index, see :confval:`issuetracker_index`.  For all issues not
+    found in either, the event ``issuetracker-lookup-issues`` is emitted
+    once with the ids of these issues.  Issues missing from the mapping
+    returned by this event are looked up one by one with the event
+    ``issuetracker-lookup-issue``.  All results are cached, except for
+    issues, whose lookup failed, because the issue tracker is unavailable,
+    see :confval:`issuetracker_circuit_breaker`.  These issues are not looked
+    up again in the same build.
+
+    Concurrent lookups of the same issue are only performed once: Callers wait
+    for lookups in progress in other threads, see
+    :class:`~sphinxcontrib.issuetracker.cache.InFlightLookups`.
+
+    ``app`` is the sphinx application object.  ``tracker_config`` is the
+    :class:`TrackerConfig` object representing the issue tracker configuration.
+    ``issue_ids`` is a sequence of strings containing the issue ids.
+
+    Return a dictionary, which maps each of the given ``issue_ids`` to an
+    :class:`Issue` object, or to ``None`` if the issue wasn't found, or the
+    issue tracker was unavailable.
+    """
+    cache = app.env.issuetracker_cache
+    stats = app.env.issuetracker_stats
+    tracer = app.env.issuetracker_tracer
+    missing = []
+    probed = set()
+    for issue_id in issue_ids:
+        if issue_id in probed:
+            # look up each issue only once
+            continue
+        probed.add(issue_id)
+        start = default_timer()
+        hit = issue_id in cache
+        end = default_timer()
+        stats.record_cache_probe(hit)
+        tracer.record('cache probe', 'cache', start, end, id=issue_id, hit=hit)
+        if not hit:
+            missing.append(issue_id)
+    # issues found in the index, which are not put into the cache
+    indexed = {}
+    index = app.env.issuetracker_index
+    if missing and index.covers(tracker_config):
+        start = default_timer()
+        for issue_id in missing:
+            try:
+                indexed[issue_id] = index[issue_id]
+            except KeyError:
+                pass
+        tracer.record('index probe', 'index', start, default_timer(),
+                      count=len(missing), hits=len(indexed))
+        missing = [issue_id for issue_id in missing
+                   if issue_id not in indexed]
+    inflight = app.env.issuetracker_inflight
+    if missing and not inflight.in_owner_process():
+        # forked workers of parallel builds only read the cache, all issues
+        # were looked up before the fork, see prefetch_issues
+        missing = []
+    if missing and inflight.unavailable:
+        missing = [issue_id for issue_id in missing
+                   if (tracker_config, issue_id) not in inflight.unavailable]
+    if missing:
+        claimed, pending = inflight.claim(
+            [(tracker_config, issue_id) for issue_id in missing])
+        try:
+            # another caller may have finished the lookup between the cache
+            # probe and the claim
+            unknown = [issue_id for _, issue_id in claimed
+                       if issue_id not in cache]
+            if unknown and app.env.issuetracker_daemon.enabled:
+                unknown = _lookup_shared_issues(app, tracker_config, unknown)
+            if unknown:
+                _lookup_missing_issues(app, tracker_config, unknown)
+        finally:
+            inflight.release(claimed)
+        if pending:
+            start = default_timer()
+            for event in pending:
+                event.wait()
+            tracer.record('wait for lookups', 'lookup', start,
+                          default_timer(), count=len(pending))
+            # the lookups of other callers may have failed, so look up these
+            # issues again
+            failed = [issue_id for issue_id in missing
+                      if issue_id not in cache]
+            if failed:
+                lookup_issue_ids(app, tracker_config, failed)
+    cache.touch(probed)
+    return dict((issue_id, indexed[issue_id] if issue_id in indexed
+                 else cache.get(issue_id)) for issue_id in issue_ids)
+
+
+def _daemon_key(app, tracker_config, issue_id):
+    return [app.config.issuetracker, tracker_config.project,
+            tracker_config.url, issue_id]
+
+
+def share_changed_issues(app, issue_ids):
+    """
+    Pass the changed issues with the given ``issue_ids`` to the shared issue
+    cache daemon, see :confval:`issuetracker_cache_socket`, so that other
+    builds get the changes, too, instead of the issues cached by the daemon
+    before.
+    """
+    from sphinxcontrib.issuetracker.daemon import DaemonError
+    daemon = app.env.issuetracker_daemon
+    cache = app.env.issuetracker_cache
+    if not daemon.enabled or not issue_ids:
+        return
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    try:
+        daemon.put([(_daemon_key(app, tracker_config, issue_id),
+                     cache[issue_id])
+                    for issue_id in issue_ids if issue_id in cache])
+    except DaemonError as error:
+        daemon.disable(app, error)
+
+
+def _lookup_shared_issues(app, tracker_config, issue_ids):
+    """
+    Lookup the given issues through the shared issue cache daemon, see
+    :confval:`issuetracker_cache_socket`.
+
+    Issues cached by the daemon are put into the cache.  Issues, which are
+    looked up by other builds right now, are awaited.  All other issues are
+    looked up with :func:`_lookup_missing_issues`, and passed to the daemon.
+
+    Return a list of the ids of all issues, which still need to be looked up,
+    because the daemon failed.
+    """
+    from sphinxcontrib.issuetracker.daemon import DaemonError
+    daemon = app.env.issuetracker_daemon
+    cache = app.env.issuetracker_cache
+    keys = dict((issue_id, _daemon_key(app, tracker_config, issue_id))
+                for issue_id in issue_ids)
+    claim = daemon.claim
+    try:
+        while issue_ids:
+            results = claim([keys[issue_id] for issue_id in issue_ids])
+            unknown = []
+            pending = []
+            for issue_id, result in zip(issue_ids, results):
+                if result['status'] == 'hit':
+                    cache[issue_id] = result['issue']
+                elif result['status'] == 'pending':
+                    pending.append(issue_id)
+                else:
+                    unknown.append(issue_id)
+            try:
+                _lookup_missing_issues(app, tracker_config, unknown)
+            finally:
+                daemon.put([(keys[issue_id], cache[issue_id])
+                            for issue_id in unknown if issue_id in cache])
+                daemon.release([keys[issue_id] for issue_id in unknown
+                                if issue_id not in cache])
+            # wait for the issues looked up by other builds
+            issue_ids = pending
+            claim = daemon.wait
+    except DaemonError as error:
+        daemon.disable(app, error)
+    return [issue_id for issue_id in issue_ids if issue_id not in cache]
+
+
+def _lookup_missing_issues(app, tracker_config, issue_ids):
+    """
+    Lookup the given issues with :event:`issuetracker-lookup-issues` and
+    :event:`issuetracker-lookup-issue`, and cache the results.
+
+    If a lookup raises
+    :exc:`~sphinxcontrib.issuetracker.breaker.TrackerUnavailable`, the issues
+    are not cached, but recorded as unavailable for the rest of the build.
+    """
     cache = app.env.issuetracker_cache
-    if issue_id not in cache:
-        issue = app.emit_firstresult('issuetracker-lookup-issue',
-                                     tracker_config, issue_id)
+    unavailable = app.env.issuetracker_inflight.unavailable
+    stats = app.env.issuetracker_stats
+    tracer = app.env.issuetracker_tracer
+    start = default_timer()
+    try:
+        issues = app.emit_firstresult('issuetracker-lookup-issues',
+                                      tracker_config, issue_ids)
+    except TrackerUnavailable:
+        tracer.record('batch lookup', 'lookup', start, default_timer(),
+                      ids=issue_ids, project=tracker_config.project,
+                      unavailable=True)
+        unavailable.update((tracker_config, issue_id)
+                           for issue_id in issue_ids)
+        return
+    end = default_timer()
+    if issues:
+        stats.record_lookup(end - start)
+        tracer.record('batch lookup', 'lookup', start, end, ids=issue_ids,
+                      project=tracker_config.project, found=len(issues))
+    else:
+        # no handler for batch lookups
+        issues = {}
+    for issue_id in issue_ids:
+        if issue_id in issues:
+            cache[issue_id] = issues[issue_id]
+            continue
+        start = default_timer()
+        try:
+            issue = app.emit_firstresult('issuetracker-lookup-issue',
+                                         tracker_config, issue_id)
+        except TrackerUnavailable:
+            tracer.record('lookup', 'lookup', start, default_timer(),
+                          id=issue_id, project=tracker_config.project,
+                          unavailable=True)
+            unavailable.add((tracker_config, issue_id))
+            continue
+        end = default_timer()
+        stats.record_lookup(end - start)
+        tracer.record('lookup', 'lookup', start, end, id=issue_id,
+                      project=tracker_config.project, found=bool(issue))
         cache[issue_id] = issue
-    return cache[issue_id]
 
 
 def lookup_issues(app, doctree):
     """
     Lookup issues found in the given ``doctree``.
 
-    Each issue reference in the given ``doctree`` is looked up.  Each lookup
+    All issues referenced in the given ``doctree`` are looked up together for
+    each tracker configuration with :func:`lookup_issue_ids`.  Each lookup
     result is cached by mapping the referenced issue id to the looked up
     :class:`Issue` object (an existing issue) or ``None`` (a missing issue).
 
-    The cache is available at ``app.env.issuetracker_cache`` and is pickled
-    along with the environment.
+    The cache is available at ``app.env.issuetracker_cache`` as
+    :class:`~sphinxcontrib.issuetracker.cache.IssueCache`.  It is stored in a
+    separate file in the doctree directory, the pickled environment only
+    refers to this file.
+
+    The ids of all issues referenced in the document are recorded in
+    ``app.env.issuetracker_references``, which maps document names to sets of
+    issue ids.
+
+    If :confval:`issuetracker_pipeline_workers` is set, the issues are only
+    submitted to the
+    :class:`~sphinxcontrib.issuetracker.pipeline.LookupPipeline`, and looked
+    up in the background, while Sphinx continues to read documents.
     """
+    issue_ids = set()
+    ids_by_tracker = {}
     for node in doctree.traverse(pending_xref):
         if node['reftype'] == 'issue':
-            lookup_issue(app, node['trackerconfig'], node['reftarget'])
+            tracker_config = get_tracker_config(app.env, node)
+            ids_by_tracker.setdefault(tracker_config, []).append(
+                node['reftarget'])
+            issue_ids.add(node['reftarget'])
+    pipeline = app.env.issuetracker_pipeline
+    for tracker_config, tracker_issue_ids in ids_by_tracker.items():
+        if pipeline.enabled:
+            pipeline.submit(tracker_config, tracker_issue_ids)
+        else:
+            lookup_issue_ids(app, tracker_config, tracker_issue_ids)
+    if issue_ids:
+        app.env.issuetracker_references[app.env.docname] = issue_ids
+        app.env.issuetracker_read_docs.add(app.env.docname)
+
+
+def get_documents_to_write(app, env):
+    """
+    Get the names of all documents, which the builder of ``app`` writes in
+    the current build.
+
+    These are the documents read in this build, the documents the builder
+    considers outdated, and all documents, whose toctree includes one of
+    these documents.  Documents written by a full build (``-a``), which are
+    not among these documents, look up their issues while writing.
+    """
+    outdated = app.builder.get_outdated_docs()
+    if isinstance(outdated, string_type):
+        # the builder writes all documents
+        return set(env.found_docs)
+    docnames = set(outdated) | env.issuetracker_read_docs
+    for docname in list(docnames):
+        docnames.update(env.files_to_rebuild.get(docname, ()))
+    return docnames
+
+
+def prefetch_issues(app, env):
+    """
+    Lookup all issues referenced by documents written in this build, which
+    are not cached yet, after all documents were read, see
+    :func:`get_documents_to_write`.
+
+    Documents record their references with the current tracker
+    configuration, because changing it rereads all documents.
+
+    All lookups finish before Sphinx writes the first document, so that
+    resolving issue references, possibly in the forked worker processes of
+    parallel builds, only reads the cache.  If the cache is limited, issues,
+    which don't fit into the cache, and would be evicted right after the
+    build, are not prefetched, but looked up while writing.
+    """
+    pipeline = env.issuetracker_pipeline
+    pipeline.wait()
+    pipeline.stop()
+    issue_ids = set()
+    for docname in get_documents_to_write(app, env):
+        issue_ids.update(env.issuetracker_references.get(docname, ()))
+    cache = env.issuetracker_cache
+    cache.touch(issue_ids)
+    missing = sorted(issue_id for issue_id in issue_ids
+                     if issue_id not in cache)
+    if cache.max_issues is not None:
+        room = cache.max_issues - (len(issue_ids) - len(missing))
+        missing = missing[:max(room, 0)]
+    if missing:
+        lookup_issue_ids(app, TrackerConfig.from_sphinx_config(app.config),
+                         missing)
 
 
 def resolve_issue_reference(app, env, node, contnode):
@@ -247,7 +816,8 @@ def resolve_issue_reference(app, env, node, contnode):
     reference.  It is expected to have the following attributes:
 
     - ``reftype``: The reference type
-    - ``trackerconfig``: The :class:`TrackerConfig`` to use for this node
+    - ``tracker``: The key of the :class:`TrackerConfig` to use for this node
+      in the :class:`TrackerRegistry`
     - ``reftarget``: The issue id
     - ``classes``: The node classes
 
@@ -265,7 +835,18 @@ def resolve_issue_reference(app, env, node, contnode):
     if node['reftype'] != 'issue':
         return None
 
-    issue = lookup_issue(app, node['trackerconfig'], node['reftarget'])
+    issue = lookup_issue(app, get_tracker_config(env, node), node['reftarget'])
+    return make_resolved_reference(issue, contnode)
+
+
+def make_resolved_reference(issue, contnode):
+    """
+    Get the node, which replaces an issue reference with the content node
+    ``contnode`` to the given ``issue``.
+
+    If ``issue`` is ``None``, return ``contnode``.  Otherwise return a
+    reference to the ``issue``, whose text is formatted with the ``issue``.
+    """
     if not issue:
         return contnode
     else:
@@ -277,11 +858,54 @@ def resolve_issue_reference(app, env, node, contnode):
         return make_issue_reference(issue, formatted_contnode)
 
 
+class IssueReferencesResolver(Transform):
+    """
+    Resolve all issue references in a document at once.
+
+    All referenced issues of the same tracker are looked up with a single
+    call to :func:`lookup_issue_ids`, and the children of each parent of
+    issue references are rewritten at once with :func:`replace_children`,
+    like :class:`IssueReferences` does.
+
+    This transform is added as post transform in Sphinx 1.6 and newer, to
+    resolve issue references before Sphinx emits ``missing-reference`` for
+    each of them.  In older Sphinx versions :func:`resolve_issue_reference`
+    resolves issue references one by one.
+    """
+
+    # before the ReferencesResolver of Sphinx
+    default_priority = 5
+
+    def apply(self):
+        env = self.document.settings.env
+        refnodes_by_tracker = {}
+        for node in self.document.traverse(pending_xref):
+            if node['reftype'] == 'issue':
+                tracker_config = get_tracker_config(env, node)
+                refnodes_by_tracker.setdefault(tracker_config, []).append(node)
+        replacements = {}
+        parents = {}
+        for tracker_config, refnodes in refnodes_by_tracker.items():
+            issues = lookup_issue_ids(env.app, tracker_config,
+                                      [node['reftarget'] for node in refnodes])
+            for node in refnodes:
+                replacements[id(node)] = [make_resolved_reference(
+                    issues[node['reftarget']], node[0])]
+                parents[id(node.parent)] = node.parent
+        for parent in parents.values():
+            replace_children(parent, replacements)
+
+
 def connect_builtin_tracker(app):
-    from sphinxcontrib.issuetracker.resolvers import BUILTIN_ISSUE_TRACKERS
+    from sphinxcontrib.issuetracker.resolvers import (
+        BUILTIN_ISSUE_TRACKERS, BUILTIN_BATCH_ISSUE_TRACKERS)
     if app.config.issuetracker:
-        tracker = BUILTIN_ISSUE_TRACKERS[app.config.issuetracker.lower()]
-        app.connect(str('issuetracker-lookup-issue'), tracker)
+        name = app.config.issuetracker.lower()
+        app.connect(str('issuetracker-lookup-issue'),
+                    BUILTIN_ISSUE_TRACKERS[name])
+        if name in BUILTIN_BATCH_ISSUE_TRACKERS:
+            app.connect(str('issuetracker-lookup-issues'),
+                        BUILTIN_BATCH_ISSUE_TRACKERS[name])
 
 
 def add_stylesheet(app):
@@ -289,12 +913,223 @@ def add_stylesheet(app):
 
 
 def init_cache(app):
-    if not hasattr(app.env, 'issuetracker_cache'):
-        app.env.issuetracker_cache = {}
+    cache = getattr(app.env, 'issuetracker_cache', None)
+    if not isinstance(cache, IssueCache):
+        # a fresh environment, or an environment pickled by an older version
+        # of this extension, which kept the issues in the environment itself.
+        # The cache file outlives the environment and may have been seeded by
+        # an importer, so only merge the issues of an old environment into it
+        issues = cache
+        cache = IssueCache.in_directory(app.doctreedir)
+        if issues:
+            cache.update(issues)
+        app.env.issuetracker_cache = cache
+    cache.limit(app.config.issuetracker_cache_size,
+                app.config.issuetracker_cache_eviction)
+
+
+def init_inflight_lookups(app):
+    from sphinxcontrib.issuetracker.daemon import CacheClient
+    app.env.issuetracker_inflight = InFlightLookups()
+    app.env.issuetracker_daemon = CacheClient(
+        app.config.issuetracker_cache_socket)
+
+
+def init_breaker(app):
+    app.env.issuetracker_breaker = CircuitBreaker()
+    app.env.issuetracker_breaker.configure(
+        app.config.issuetracker_circuit_breaker,
+        app.config.issuetracker_circuit_cooldown)
+
+
+def report_failures(app, exception):
+    """
+    Warn once about each issue tracker host, whose requests failed in this
+    build, without opening its circuit, see
+    :func:`~sphinxcontrib.issuetracker.resolvers.report_failure`.
+    """
+    breaker = app.env.issuetracker_breaker
+    for host, (count, message) in sorted(breaker.failures.items()):
+        if host not in breaker.opened:
+            app.warn('requests to {0} failed {1} times, last failure: '
+                     '{2}'.format(host, count, message))
+
+
+def init_pipeline(app):
+    from sphinxcontrib.issuetracker.pipeline import LookupPipeline
+    pipeline = app.env.issuetracker_pipeline = LookupPipeline()
+    workers = app.config.issuetracker_pipeline_workers
+    if workers:
+        pipeline.start(
+            lambda tracker_config, issue_ids: lookup_issue_ids(
+                app, tracker_config, issue_ids),
+            workers)
+
+
+def stop_pipeline(app, exception):
+    app.env.issuetracker_pipeline.stop()
+
+
+def init_index(app):
+    from sphinxcontrib.issuetracker.index import IssueIndex
+    filename = app.config.issuetracker_index
+    index = IssueIndex()
+    if filename:
+        filename = path.join(app.confdir, filename)
+        try:
+            index = IssueIndex(filename)
+        except (EnvironmentError, ValueError) as error:
+            app.warn('issue index {0} not available: {1}'.format(
+                filename, error))
+    app.env.issuetracker_index = index
+
+
+def init_cassette(app):
+    from sphinxcontrib.issuetracker.transport import Cassette
+    filename = app.config.issuetracker_cassette
+    if filename:
+        filename = path.join(app.confdir, filename)
+    app.env.issuetracker_cassette = Cassette(
+        filename, app.config.issuetracker_cassette_mode,
+        app.config.issuetracker_cassette_latency)
+
+
+def save_cassette(app, exception):
+    app.env.issuetracker_cassette.save()
+
+
+def init_trackers(app):
+    if not hasattr(app.env, 'issuetracker_trackers'):
+        app.env.issuetracker_trackers = TrackerRegistry()
+
+
+def init_references(app):
+    if not hasattr(app.env, 'issuetracker_references'):
+        app.env.issuetracker_references = {}
+    # the documents read in the current build, see get_documents_to_write
+    app.env.issuetracker_read_docs = set()
+
+
+def purge_references(app, env, docname):
+    env.issuetracker_references.pop(docname, None)
+
+
+def refresh_cache(app):
+    """
+    Refresh all cached issues, which changed in the issue tracker since the
+    last refresh.
+
+    Issues are only refreshed if :confval:`issuetracker_refresh` is ``True``,
+    and the configured builtin tracker supports refreshing.  The time of the
+    last successful refresh is stored in the cache.
+    """
+    from sphinxcontrib.issuetracker.resolvers import BUILTIN_REFRESHERS
+    name = (app.config.issuetracker or '').lower()
+    if not app.config.issuetracker_refresh or name not in BUILTIN_REFRESHERS:
+        return
+    cache = app.env.issuetracker_cache
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    key = (name, tracker_config.project, tracker_config.url)
+    started = time.time()
+    try:
+        refreshed = BUILTIN_REFRESHERS[name](app, tracker_config,
+                                             cache.sync_times.get(key))
+    except TrackerUnavailable:
+        refreshed = False
+    if refreshed:
+        cache.set_sync_time(key, started)
+
+
+def get_outdated_documents(app, env, added, changed, removed):
+    """
+    Get all documents which reference changed issues.
+
+    An issue changes if a different issue replaces the cached issue, e.g.
+    because the issue was closed in the meantime, or because the cache was
+    refreshed, see :func:`refresh_cache`.  Such documents are outdated,
+    because they still show the old state of the issue.  Changed issues are
+    passed to the issue cache daemon, see :func:`share_changed_issues`.
+
+    Return a list of all outdated document names.
+    """
+    # some Sphinx versions pass the builder as env, so use the environment of
+    # the application
+    env = app.env
+    refresh_cache(app)
+    changed_issues = env.issuetracker_cache.pop_changed()
+    if not changed_issues:
+        return []
+    share_changed_issues(app, changed_issues)
+    return [docname for docname, issue_ids
+            in env.issuetracker_references.items()
+            if not changed_issues.isdisjoint(issue_ids)]
+
+
+def trim_cache(app, exception):
+    """
+    Remove issues from the cache, which no document references anymore, if
+    :confval:`issuetracker_cache_prune` is ``True``, and evict issues from a
+    full cache, see :confval:`issuetracker_cache_size`.
+    """
+    if exception:
+        return
+    cache = app.env.issuetracker_cache
+    pruned = []
+    if app.config.issuetracker_cache_prune:
+        referenced = set()
+        for issue_ids in app.env.issuetracker_references.values():
+            referenced.update(issue_ids)
+        pruned = cache.prune(referenced)
+    evicted = cache.evict()
+    if pruned or evicted:
+        app.info('removed {0} unreferenced and evicted {1} issues from the '
+                 'issue cache'.format(len(pruned), len(evicted)))
+
+
+def save_cache(app, exception):
+    app.env.issuetracker_cache.save()
+
+
+def init_stats(app):
+    app.env.issuetracker_stats = BuildStats()
+
+
+def init_tracer(app):
+    if app.config.issuetracker_trace:
+        app.env.issuetracker_tracer = Tracer()
+    else:
+        app.env.issuetracker_tracer = NullTracer()
+
+
+def write_trace(app, exception):
+    filename = app.config.issuetracker_trace
+    if filename and not exception:
+        tracer = app.env.issuetracker_tracer
+        write_file_atomically(path.join(app.builder.outdir, filename),
+                              tracer.serialize(filename))
+
+
+def report_stats(app, exception):
+    if exception:
+        return
+    stats = app.env.issuetracker_stats
+    if app.config.issuetracker_stats:
+        app.info(bold('issuetracker statistics:'))
+        for line in stats.summary():
+            app.info('    ' + line)
+    for confval, contents in [
+            ('issuetracker_stats_json', stats.to_json),
+            ('issuetracker_stats_prometheus', stats.to_prometheus)]:
+        filename = getattr(app.config, confval)
+        if filename:
+            write_file_atomically(path.join(app.builder.outdir, filename),
+                                  contents())
 
 
 def init_transformer(app):
     if app.config.issuetracker_plaintext_issues:
+        app.env.issuetracker_issue_pattern = compile_issue_pattern(
+            app.config.issuetracker_issue_pattern)
         app.add_transform(IssueReferences)
 
 
@@ -310,9 +1145,11 @@ def copy_stylesheet(app, exception):
 
 
 def setup(app):
-    app.require_sphinx('1.0')
+    from sphinxcontrib.issuetracker.builder import IssueCheckBuilder
+    app.require_sphinx('1.1')
     app.add_role('issue', IssueRole())
     app.add_event(str('issuetracker-lookup-issue'))
+    app.add_event(str('issuetracker-lookup-issues'))
     app.connect(str('builder-inited'), connect_builtin_tracker)
     # general configuration
     app.add_config_value('issuetracker', None, 'env')
@@ -322,14 +1159,59 @@ def setup(app):
     app.add_config_value('issuetracker_redmine_username', None, 'env')
     app.add_config_value('issuetracker_redmine_password', None, 'env')
     app.add_config_value('issuetracker_redmine_requests', {}, 'env')
+    app.add_config_value('issuetracker_refresh', False, '')
+    app.add_config_value('issuetracker_cache_size', None, '')
+    app.add_config_value('issuetracker_cache_eviction', 'lru', '')
+    app.add_config_value('issuetracker_cache_prune', False, '')
+    app.add_config_value('issuetracker_cache_socket', None, '')
+    app.add_config_value('issuetracker_index', None, '')
+    app.add_config_value('issuetracker_pipeline_workers', 0, '')
+    app.add_config_value('issuetracker_circuit_breaker', 5, '')
+    app.add_config_value('issuetracker_circuit_cooldown', 60, '')
     # configuration specific to plaintext issue references
     app.add_config_value('issuetracker_plaintext_issues', True, 'env')
     app.add_config_value('issuetracker_issue_pattern',
                          re.compile(r'#(\d+)'), 'env')
     app.add_config_value('issuetracker_title_template', None, 'env')
+    # configuration of build statistics
+    app.add_config_value('issuetracker_stats', False, '')
+    app.add_config_value('issuetracker_stats_json', None, '')
+    app.add_config_value('issuetracker_stats_prometheus', None, '')
+    app.add_config_value('issuetracker_trace', None, '')
+    # configuration of the issuetracker-check builder
+    app.add_config_value('issuetracker_check_report', 'issues.json', '')
+    app.add_config_value('issuetracker_check_fail_on', ['missing'], '')
+    # configuration of recorded responses
+    app.add_config_value('issuetracker_cassette', None, '')
+    app.add_config_value('issuetracker_cassette_mode', 'replay', '')
+    app.add_config_value('issuetracker_cassette_latency', None, '')
+    app.add_builder(IssueCheckBuilder)
+    app.connect(str('builder-inited'), init_stats)
+    app.connect(str('builder-inited'), init_tracer)
     app.connect(str('builder-inited'), add_stylesheet)
     app.connect(str('builder-inited'), init_cache)
+    app.connect(str('builder-inited'), init_inflight_lookups)
+    app.connect(str('builder-inited'), init_index)
+    app.connect(str('builder-inited'), init_breaker)
+    app.connect(str('builder-inited'), init_cassette)
+    app.connect(str('builder-inited'), init_pipeline)
+    app.connect(str('builder-inited'), init_trackers)
+    app.connect(str('builder-inited'), init_references)
     app.connect(str('builder-inited'), init_transformer)
+    app.connect(str('env-get-outdated'), get_outdated_documents)
+    app.connect(str('env-purge-doc'), purge_references)
     app.connect(str('doctree-read'), lookup_issues)
+    app.connect(str('env-updated'), prefetch_issues)
     app.connect(str('missing-reference'), resolve_issue_reference)
+    if hasattr(app, 'add_post_transform'):
+        app.add_post_transform(IssueReferencesResolver)
     app.connect(str('build-finished'), copy_stylesheet)
+    app.connect(str('build-finished'), stop_pipeline)
+    app.connect(str('build-finished'), trim_cache)
+    app.connect(str('build-finished'), save_cache)
+    app.connect(str('build-finished'), save_cassette)
+    app.connect(str('build-finished'), report_stats)
+    app.connect(str('build-finished'), report_failures)
+    app.connect(str('build-finished'), write_trace)
+    return {'version': __version__, 'parallel_read_safe': False,
+            'parallel_write_safe': True}
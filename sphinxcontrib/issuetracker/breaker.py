@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    sphinxcontrib.issuetracker.breaker
+    ==================================
+
+    Stop sending requests to issue tracker hosts, which are down.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import threading
+from timeit import default_timer
+
+from sphinxcontrib.issuetracker.util import Transient
+
+
+class TrackerUnavailable(Exception):
+    """
+    Raised if a request to an issue tracker host failed, or was not sent,
+    because the host is unavailable.
+
+    Issues, whose lookup raised this exception, are left unresolved, and not
+    cached, so that the next build looks them up again.
+    """
+
+    def __init__(self, host):
+        Exception.__init__(self, host)
+        #: The unavailable host
+        self.host = host
+
+
+class Circuit(object):
+    """
+    The state of the circuit of a single host.
+    """
+
+    def __init__(self):
+        #: The number of consecutive failures
+        self.failures = 0
+        #: The time, at which the circuit was opened, or ``None``, if the
+        #: circuit is closed
+        self.opened_at = None
+        #: Whether a probe request is in flight in the half-open state
+        self.probing = False
+
+
+class CircuitBreaker(Transient):
+    """
+    A circuit breaker for each issue tracker host.
+
+    After :attr:`threshold` consecutive failed requests to a host, the
+    circuit of the host opens, and no requests are sent to the host anymore.
+    After :attr:`cooldown` seconds the circuit is half-open: A single probe
+    request is sent to the host.  If it succeeds the circuit closes again,
+    otherwise it opens for another :attr:`cooldown` seconds.  If
+    :attr:`cooldown` is ``None``, the circuit stays open for the rest of the
+    build.
+
+    The breaker is available at ``app.env.issuetracker_breaker``, see
+    :confval:`issuetracker_circuit_breaker`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._circuits = {}
+        #: Whether the breaker is configured
+        self.enabled = False
+        #: The number of consecutive failures, which open a circuit
+        self.threshold = None
+        #: The seconds, after which an open circuit is half-open
+        self.cooldown = None
+        #: The hosts, whose circuits opened in this build
+        self.opened = set()
+        #: Maps hosts to pairs of the number of failed requests in this build
+        #: and the message of the last failure
+        self.failures = {}
+        #: The clock used to time the cool-down
+        self.clock = default_timer
+
+    def configure(self, threshold, cooldown=None):
+        """
+        Open the circuit of a host after ``threshold`` consecutive failures
+        for ``cooldown`` seconds.  If ``threshold`` is ``0`` or ``None``, the
+        breaker is disabled.
+        """
+        self.enabled = bool(threshold)
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+    def allow(self, host):
+        """
+        Check, whether a request may be sent to ``host``.
+
+        Return ``False``, if the circuit of ``host`` is open, or if it is
+        half-open, and the probe request is already in flight.  Otherwise
+        return ``True``.
+        """
+        if not self.enabled:
+            return True
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None or circuit.opened_at is None:
+                return True
+            if circuit.probing or self.cooldown is None:
+                return False
+            if self.clock() - circuit.opened_at < self.cooldown:
+                return False
+            circuit.probing = True
+            return True
+
+    def cancel(self, host):
+        """
+        Cancel the probe request to ``host`` allowed by :meth:`allow`, because
+        it was not sent after all, so that the next request probes the host.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is not None:
+                circuit.probing = False
+
+    def record_success(self, host):
+        """
+        Record a successful request to ``host``, which closes its circuit.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._circuits.pop(host, None)
+
+    def record_failure(self, host, message=None):
+        """
+        Record a failed request to ``host``, which failed with ``message``,
+        see :attr:`failures`.
+
+        Return ``True``, if this failure opened the circuit of ``host`` for
+        the first time in this build, or ``False`` otherwise.
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            count, _ = self.failures.get(host, (0, None))
+            self.failures[host] = (count + 1, message)
+            circuit = self._circuits.setdefault(host, Circuit())
+            circuit.failures += 1
+            if circuit.probing or circuit.failures >= self.threshold:
+                circuit.probing = False
+                circuit.opened_at = self.clock()
+                if host not in self.opened:
+                    self.opened.add(host)
+                    return True
+            return False
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    sphinxcontrib.issuetracker.builder
+    ==================================
+
+    A builder, which checks all issue references without writing any output
+    pages.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import json
+from os import path
+
+from sphinx.builders import Builder
+from sphinx.util.console import bold, darkgreen, red
+from sphinx.util.osutil import ensuredir
+
+from sphinxcontrib.issuetracker import TrackerConfig, lookup_issue_ids
+from sphinxcontrib.issuetracker.util import write_file_atomically
+
+
+def get_status(issue, unavailable=False):
+    """
+    Get the status of ``issue`` as string, which is either ``'unavailable'``,
+    ``'missing'``, ``'closed'`` or ``'open'``.
+
+    ``unavailable`` is ``True``, if the lookup of ``issue`` failed, because
+    the issue tracker was unavailable.
+    """
+    if not issue and unavailable:
+        return 'unavailable'
+    if not issue:
+        return 'missing'
+    return 'closed' if issue.closed else 'open'
+
+
+class IssueCheckBuilder(Builder):
+    """
+    Check all issue references in a project.
+
+    This builder reads all documents and looks up all referenced issues, but
+    doesn't resolve references or write any pages.  Instead it writes a JSON
+    report about all referenced issues to
+    :confval:`issuetracker_check_report` in the output directory.  If any
+    referenced issue has a status listed in
+    :confval:`issuetracker_check_fail_on`, the build fails with exit status
+    1.
+    """
+
+    name = 'issuetracker-check'
+
+    def init(self):
+        #: Issue references as mapping from pairs of the tracker
+        #: configuration and the issue id to sets of referencing documents
+        self.references = {}
+        #: Looked up issues by pairs of tracker configuration and issue id
+        self.issues = {}
+        #: Pairs of tracker configuration and issue id, whose lookup failed,
+        #: because the issue tracker was unavailable
+        self.unavailable = set()
+
+    def get_outdated_docs(self):
+        return 'all issue references'
+
+    def get_target_uri(self, docname, typ=None):
+        return ''
+
+    def prepare_writing(self, docnames):
+        pass
+
+    def write_doc(self, docname, doctree):
+        pass
+
+    def write(self, build_docnames, updated_docnames, method='update'):
+        # don't resolve and write any documents, just look up all issue
+        # references recorded while reading, without loading any doctree
+        self.app.info(bold('checking issue references... '), nonl=True)
+        tracker_config = TrackerConfig.from_sphinx_config(self.config)
+        for docname, issue_ids in self.env.issuetracker_references.items():
+            for issue_id in issue_ids:
+                self.references.setdefault(
+                    (tracker_config, issue_id), set()).add(docname)
+        issues = lookup_issue_ids(self.app, tracker_config, sorted(
+            issue_id for _, issue_id in self.references))
+        for issue_id, issue in issues.items():
+            self.issues[tracker_config, issue_id] = issue
+        self.unavailable = set(self.env.issuetracker_inflight.unavailable)
+        self.app.info('done')
+
+    def get_report(self):
+        """
+        Get the report about all referenced issues as dictionary.
+
+        The ``issues`` key contains a list of dictionaries with the
+        ``project``, ``id``, ``status``, ``title`` and ``url`` of each
+        referenced issue, and the sorted names of all ``documents``, which
+        reference the issue.  The ``title`` and ``url`` of missing and
+        unavailable issues are ``None``.  The ``counts`` key maps each status
+        to the number of issues with this status.
+        """
+        entries = []
+        counts = dict.fromkeys(
+            ['open', 'closed', 'missing', 'unavailable'], 0)
+        for key in sorted(self.references):
+            tracker_config, issue_id = key
+            issue = self.issues.get(key)
+            status = get_status(issue, key in self.unavailable)
+            counts[status] += 1
+            entries.append({
+                'project': tracker_config.project,
+                'id': issue_id,
+                'status': status,
+                'title': issue.title if issue else None,
+                'url': issue.url if issue else None,
+                'documents': sorted(self.references[key]),
+            })
+        return {'issues': entries, 'counts': counts}
+
+    def finish(self):
+        report = self.get_report()
+        # old Sphinx versions don't create the output directory
+        ensuredir(self.outdir)
+        filename = path.join(self.outdir,
+                             self.config.issuetracker_check_report)
+        write_file_atomically(filename, json.dumps(report, indent=2,
+                                                   sort_keys=True))
+        fail_on = self.config.issuetracker_check_fail_on
+        failed = [entry for entry in report['issues']
+                  if entry['status'] in fail_on]
+        for entry in failed:
+            self.app.info('{0} issue {1} referenced in {2}'.format(
+                red(entry['status']), entry['id'],
+                ', '.join(entry['documents'])))
+        self.app.info('{open} open, {closed} closed, {missing} missing and '
+                      '{unavailable} unavailable issues '
+                      'referenced'.format(**report['counts']))
+        self.app.info('issue report written to {0}'.format(
+            darkgreen(filename)))
+        if failed:
+            self.app.statuscode = 1
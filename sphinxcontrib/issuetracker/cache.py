@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    sphinxcontrib.issuetracker.cache
+    ================================
+
+    Persistent issue cache of :mod:`sphinxcontrib.issuetracker`.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import os
+import heapq
+import pickle
+import threading
+from os import path
+from contextlib import contextmanager
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+from sphinx.util.osutil import ensuredir
+
+from sphinxcontrib.issuetracker.util import (Transient, locked_file,
+                                             write_file_atomically)
+
+
+#: The name of the cache file in the doctree directory
+CACHE_FILENAME = 'issuetracker_cache.pickle'
+
+#: Eviction policies by name.  Each policy maps the usage of an issue, a pair
+#: of the generation of its last use and the number of its uses, to a key,
+#: which sorts the issues to evict first before all other issues.
+EVICTION_POLICIES = {
+    # least recently used
+    'lru': lambda usage: usage,
+    # least frequently used
+    'lfu': lambda usage: (usage[1], usage[0]),
+}
+
+
+def _stamp(stat):
+    # the cache file is replaced on every write, see IssueCache.save()
+    return (stat.st_ino, stat.st_mtime)
+
+
+class IssueCache(MutableMapping):
+    """
+    Cache of looked up issues.
+
+    The cache maps issue ids to :class:`~sphinxcontrib.issuetracker.Issue`
+    objects, or to ``None`` for missing issues.
+
+    The issues are stored in a separate file given by ``filename`` and not in
+    the pickled environment.  Pickling a cache only stores the file name.  The
+    issues are loaded from this file lazily on first access, and :meth:`save`
+    writes them back only if the cache was modified since.
+
+    Writers of the cache file lock it, see :meth:`transaction`.  If the cache
+    file was written by another process since it was loaded, e.g. by
+    :mod:`~sphinxcontrib.issuetracker.webhooks`, :meth:`save` keeps the
+    issues which this process changed in the meantime.
+
+    The size of the cache is unlimited, unless :meth:`limit` is called.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        #: Whether the cache was modified since it was loaded or saved
+        self.dirty = False
+        #: The maximum number of cached issues, or ``None`` for no limit
+        self.max_issues = None
+        #: The name of the eviction policy, see :data:`EVICTION_POLICIES`
+        self.eviction = 'lru'
+        self._issues = None
+        self._changed = None
+        self._sync_times = None
+        self._usage = None
+        self._generation = None
+        # identifies the contents of the cache file when it was loaded
+        self._stamp = None
+
+    @classmethod
+    def in_directory(cls, directory):
+        """
+        Create a cache stored in the given ``directory``, usually the doctree
+        directory of a Sphinx project.
+        """
+        return cls(path.join(directory, CACHE_FILENAME))
+
+    @property
+    def issues(self):
+        """
+        The cached issues as dictionary, loaded from the cache file on first
+        access.
+        """
+        self._ensure_loaded()
+        return self._issues
+
+    @property
+    def changed(self):
+        """
+        The set of ids of all cached issues, which were replaced with a
+        different issue since the last :meth:`pop_changed`.
+
+        Like the issues, this set is stored in the cache file, so changes
+        made to the cache outside of a build are not lost.
+        """
+        self._ensure_loaded()
+        return self._changed
+
+    @property
+    def sync_times(self):
+        """
+        A dictionary, which maps keys of issue trackers to the time of the last
+        refresh of the cached issues from these trackers.
+
+        The times are stored in the cache file, too.  Use
+        :meth:`set_sync_time` to change a time.
+        """
+        self._ensure_loaded()
+        return self._sync_times
+
+    def set_sync_time(self, key, sync_time):
+        """
+        Set the time of the last refresh of the tracker with the given ``key``
+        to ``sync_time``.
+        """
+        self.sync_times[key] = sync_time
+        self.dirty = True
+
+    @property
+    def usage(self):
+        """
+        A dictionary, which maps the ids of cached issues to pairs of the
+        generation of their last use and the number of their uses.
+
+        Each time the cache is loaded, a new generation starts.  The usage of
+        issues is only tracked, if the size of the cache is limited.
+        """
+        self._ensure_loaded()
+        return self._usage
+
+    def limit(self, max_issues, eviction='lru'):
+        """
+        Limit the cache to ``max_issues`` issues, or remove the limit, if
+        ``max_issues`` is ``None``.
+
+        ``eviction`` is the name of the policy, which selects the issues to
+        remove from a full cache, see :data:`EVICTION_POLICIES`.  Raise
+        :exc:`~exceptions.ValueError`, if there is no such policy.
+        """
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError('unknown eviction policy: {0}'.format(eviction))
+        self.max_issues = max_issues
+        self.eviction = eviction
+
+    def touch(self, issue_ids):
+        """
+        Record a use of all cached issues with the given ``issue_ids``.
+
+        Does nothing, if the size of the cache is unlimited.
+        """
+        if self.max_issues is None:
+            return
+        issues = self.issues
+        usage = self.usage
+        for issue_id in issue_ids:
+            if issue_id in issues:
+                _, count = usage.get(issue_id, (0, 0))
+                usage[issue_id] = (self._generation, count + 1)
+                self.dirty = True
+
+    def evict(self):
+        """
+        Remove issues according to the eviction policy, until the cache
+        holds at most :attr:`max_issues` issues.
+
+        Return a list of the ids of all removed issues.
+        """
+        if self.max_issues is None:
+            return []
+        surplus = len(self) - self.max_issues
+        if surplus <= 0:
+            return []
+        key = EVICTION_POLICIES[self.eviction]
+        usage = self.usage
+        evicted = heapq.nsmallest(
+            surplus, self.issues,
+            key=lambda issue_id: key(usage.get(issue_id, (0, 0))))
+        for issue_id in evicted:
+            del self[issue_id]
+        return evicted
+
+    def prune(self, issue_ids):
+        """
+        Remove all issues, whose ids are not in ``issue_ids``, e.g. because
+        no document references them anymore.
+
+        Return a list of the ids of all removed issues.
+        """
+        pruned = [issue_id for issue_id in self.issues
+                  if issue_id not in issue_ids]
+        for issue_id in pruned:
+            del self[issue_id]
+        return pruned
+
+    def pop_changed(self):
+        """
+        Return and reset the ids of all changed issues.
+        """
+        changed = self.changed
+        if changed:
+            self._changed = set()
+            self.dirty = True
+        return changed
+
+    def _ensure_loaded(self):
+        if self._issues is None:
+            self._stamp, state = self._load()
+            self._issues = state.get('issues', {})
+            self._changed = state.get('changed', set())
+            self._sync_times = state.get('sync_times', {})
+            self._usage = state.get('usage', {})
+            self._generation = state.get('generation', 0) + 1
+
+    def _load(self):
+        """
+        Load the cache file.
+
+        Return a pair of a stamp, which identifies the contents of the cache
+        file, and the state stored in the file.
+        """
+        try:
+            with open(self.filename, 'rb') as source:
+                stamp = _stamp(os.fstat(source.fileno()))
+                return stamp, pickle.load(source)
+        except Exception:
+            # start over with an empty cache if the cache file is missing or
+            # broken, just like Sphinx does with its environment
+            return None, {}
+
+    def _merge_changed(self):
+        """
+        Take issues from the cache file, which another process changed since
+        the file was loaded.
+        """
+        stamp, state = self._load()
+        if stamp is None or stamp == self._stamp:
+            return
+        issues = state.get('issues', {})
+        for issue_id in state.get('changed', ()):
+            # keep issues removed from this cache removed, and issues changed
+            # by this process
+            if (issue_id in issues and issue_id in self.issues and
+                    issue_id not in self.changed):
+                self[issue_id] = issues[issue_id]
+
+    def _file_stamp(self):
+        try:
+            return _stamp(os.stat(self.filename))
+        except EnvironmentError:
+            return None
+
+    def _dump(self):
+        return {'issues': self.issues, 'changed': self.changed,
+                'sync_times': self.sync_times, 'usage': self.usage,
+                'generation': self._generation}
+
+    def _lock(self):
+        ensuredir(path.dirname(self.filename))
+        return locked_file(self.filename + '.lock')
+
+    def _write(self):
+        if not self.dirty:
+            return
+        # never leave a truncated cache file to concurrent readers
+        write_file_atomically(self.filename, pickle.dumps(
+            self._dump(), pickle.HIGHEST_PROTOCOL))
+        self._stamp = self._file_stamp()
+        self.dirty = False
+
+    def save(self):
+        """
+        Write the cache to its file, if it was modified.
+
+        Issues, which another process changed in the cache file since it was
+        loaded, are kept.
+        """
+        if not self.dirty:
+            return
+        with self._lock():
+            self._merge_changed()
+            self._write()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Return a context manager, which locks the cache file, and loads the
+        cache from the file again.  At the end of the ``with`` block the cache
+        is written to the file, before the lock is released.
+
+        Use this to modify the cache file, while builds may use it, too.
+        """
+        with self._lock():
+            self._issues = None
+            self.dirty = False
+            yield self
+            self._write()
+
+    def clear(self):
+        # don't bother to load the cache file just to throw its contents away
+        self._issues = {}
+        self._changed = set()
+        self._sync_times = {}
+        self._usage = {}
+        self._generation = 1
+        self._stamp = self._file_stamp()
+        self.dirty = True
+
+    def __getitem__(self, issue_id):
+        return self.issues[issue_id]
+
+    def __setitem__(self, issue_id, issue):
+        issues = self.issues
+        if issue_id in issues and issues[issue_id] != issue:
+            self.changed.add(issue_id)
+        issues[issue_id] = issue
+        self.dirty = True
+
+    def __delitem__(self, issue_id):
+        del self.issues[issue_id]
+        self.usage.pop(issue_id, None)
+        self.dirty = True
+
+    def __contains__(self, issue_id):
+        return issue_id in self.issues
+
+    def __iter__(self):
+        return iter(self.issues)
+
+    def __len__(self):
+        return len(self.issues)
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, self.filename)
+
+    def __getstate__(self):
+        # only pickle the handle, the issues are in the cache file
+        return {'filename': self.filename}
+
+    def __setstate__(self, state):
+        self.__init__(state['filename'])
+
+
+class InFlightLookups(Transient):
+    """
+    Table of issue lookups in progress.
+
+    Concurrent lookups of the same issue share a single lookup: The first
+    caller claims the lookup and performs it, and all later callers wait for
+    the claimed lookup to finish, and take its result from the cache.
+
+    Lookups are identified by arbitrary hashable keys, e.g. pairs of a
+    :class:`~sphinxcontrib.issuetracker.TrackerConfig` and an issue id.
+
+    Lookups, which failed because the issue tracker was unavailable, are
+    remembered in :attr:`unavailable`, to not repeat them in the same build.
+
+    Only the process, which created the table, performs lookups.  Processes
+    forked from it, e.g. the workers of parallel builds, only read the cache,
+    see :meth:`in_owner_process`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        #: The id of the process, which created this table
+        self.pid = os.getpid()
+        #: The keys of all lookups, which failed, because the issue tracker
+        #: was unavailable
+        self.unavailable = set()
+
+    def claim(self, keys):
+        """
+        Claim the lookups of the given ``keys``.
+
+        Return a pair ``(claimed, pending)``.  ``claimed`` is a list of all
+        keys, whose lookup the caller claimed, and now has to perform, and to
+        :meth:`release` afterwards.  ``pending`` is a list of events for all
+        other keys, which are looked up by other callers right now.  Each
+        event is set, when the lookup is released.
+        """
+        claimed = []
+        pending = []
+        with self._lock:
+            for key in keys:
+                if key in self._pending:
+                    pending.append(self._pending[key])
+                else:
+                    self._pending[key] = threading.Event()
+                    claimed.append(key)
+        return claimed, pending
+
+    def in_owner_process(self):
+        """
+        Return ``True``, if the current process created this table, or
+        ``False``, if it is a forked process.
+        """
+        return os.getpid() == self.pid
+
+    def release(self, keys):
+        """
+        Release the lookups of the given ``keys``, which the caller claimed
+        with :meth:`claim`, and wake up all callers waiting for them.
+        """
+        with self._lock:
+            events = [self._pending.pop(key) for key in keys]
+        for event in events:
+            event.set()
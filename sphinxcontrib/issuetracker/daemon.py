@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    sphinxcontrib.issuetracker.daemon
+    =================================
+
+    A local issue cache service shared by many concurrent builds.
+
+    The service keeps looked up issues in memory, and serves builds on the
+    same host over a Unix socket, see :confval:`issuetracker_cache_socket`.
+    It performs no lookups itself, but coordinates the lookups of all builds:
+    Each issue is only looked up by a single build, while the other builds
+    wait for the result.  Moreover the service keeps the state of the rate
+    limit of each tracker host, so that all builds share a single rate limit
+    budget.
+
+    Start the service with::
+
+       python -m sphinxcontrib.issuetracker.daemon /tmp/issuetracker.sock
+
+    Cached issues expire after an hour, and at most 10000 issues are cached,
+    see the ``--ttl`` and ``--max-issues`` options.
+
+    Requests and responses are JSON objects, one per line.  The ``op`` key of
+    a request is the name of a method of :class:`CacheService`, all other
+    keys are the arguments of this method.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import os
+import sys
+import json
+import time
+import socket
+import threading
+from collections import deque
+from optparse import OptionParser
+
+try:
+    from socketserver import (ThreadingMixIn, UnixStreamServer,
+                              StreamRequestHandler)
+except ImportError:
+    from SocketServer import (ThreadingMixIn, UnixStreamServer,
+                              StreamRequestHandler)
+
+from sphinxcontrib.issuetracker import Issue
+from sphinxcontrib.issuetracker.util import Transient
+
+
+#: Seconds a build waits for the lookup of an issue by another build, before
+#: it looks up the issue itself
+WAIT_TIMEOUT = 60
+#: Seconds after which the daemon forgets a cached issue
+DEFAULT_TTL = 3600
+#: The maximum number of issues cached by the daemon
+DEFAULT_MAX_ISSUES = 10000
+
+
+class DaemonError(Exception):
+    """
+    Raised by :class:`CacheClient`, if the daemon is not available.
+    """
+
+
+class CacheService(object):
+    """
+    The state of the issue cache service.
+
+    Issues are identified by keys, which are lists of the tracker name, the
+    project, the tracker url and the issue id.  Issues are given as
+    dictionaries of the fields of :class:`~sphinxcontrib.issuetracker.Issue`,
+    or as ``None`` for missing issues.
+
+    Cached issues expire ``ttl`` seconds after they were put, so that builds
+    look up issues again, which changed in the issue tracker in the meantime.
+    If more than ``max_issues`` issues are cached, the issues put first are
+    forgotten.  Either limit is disabled with ``None``.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_issues=DEFAULT_MAX_ISSUES):
+        self.ttl = ttl
+        self.max_issues = max_issues
+        self._condition = threading.Condition()
+        #: maps keys to triples of issues, the time they expire at, and the
+        #: number of the put, which cached them
+        self._issues = {}
+        #: pairs of put numbers and keys in the order the issues were put,
+        #: including stale pairs of issues put again or expired since
+        self._order = deque()
+        self._puts = 0
+        self._pending = set()
+        self._limits = {}
+
+    def _claim(self, key):
+        key = tuple(key)
+        if key in self._issues:
+            issue, expires, _ = self._issues[key]
+            if expires is None or time.time() < expires:
+                return {'status': 'hit', 'issue': issue}
+            del self._issues[key]
+        if key in self._pending:
+            return {'status': 'pending'}
+        else:
+            self._pending.add(key)
+            return {'status': 'claimed'}
+
+    def claim(self, keys):
+        """
+        Claim the lookup of the issues with the given ``keys``.
+
+        Return a list with a result for each key.  A result is a dictionary
+        with a ``status`` key.  The status ``'hit'`` means that the issue is
+        cached, and the result contains the cached issue in ``issue``.
+        ``'claimed'`` means that the caller has to look up the issue, and then
+        :meth:`put` or :meth:`release` it.  ``'pending'`` means that another
+        caller looks up the issue right now, see :meth:`wait`.
+        """
+        with self._condition:
+            return [self._claim(key) for key in keys]
+
+    def wait(self, keys, timeout=WAIT_TIMEOUT):
+        """
+        Wait until the lookups of the issues with the given ``keys`` are
+        finished, and claim them again.
+
+        Return a list of results like :meth:`claim`, except that issues,
+        whose lookup didn't finish after ``timeout`` seconds, have the status
+        ``'timeout'``.  The caller has to look up these issues without
+        claiming them.
+        """
+        deadline = time.time() + timeout
+        keys = [tuple(key) for key in keys]
+        with self._condition:
+            while any(key in self._pending for key in keys):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return [{'status': 'timeout'} if key in self._pending
+                    else self._claim(key) for key in keys]
+
+    def put(self, items):
+        """
+        Cache the looked up issues in ``items``, a list of pairs of keys and
+        issues, and finish their lookups.
+
+        Issues, which are cached already, are replaced, e.g. if a build
+        refreshed them.
+        """
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        with self._condition:
+            for key, issue in items:
+                key = tuple(key)
+                self._puts += 1
+                self._issues[key] = (issue, expires, self._puts)
+                if self.max_issues is not None:
+                    self._order.append((self._puts, key))
+                self._pending.discard(key)
+            if self.max_issues is not None:
+                self._forget_surplus()
+            self._condition.notify_all()
+
+    def _is_current(self, number, key):
+        return key in self._issues and self._issues[key][2] == number
+
+    def _forget_surplus(self):
+        while len(self._issues) > self.max_issues:
+            number, key = self._order.popleft()
+            if self._is_current(number, key):
+                del self._issues[key]
+        if len(self._order) > 2 * len(self._issues):
+            # drop stale pairs, so that the order doesn't grow without bound
+            self._order = deque(pair for pair in self._order
+                                if self._is_current(*pair))
+
+    def release(self, keys):
+        """
+        Finish the lookups of the issues with the given ``keys`` without
+        result, e.g. because the lookup failed.
+        """
+        with self._condition:
+            for key in keys:
+                self._pending.discard(tuple(key))
+            self._condition.notify_all()
+
+    def acquire(self, budget):
+        """
+        Acquire a request from the rate limit ``budget``.
+
+        Return a dictionary, whose ``ok`` key is ``True``, if the caller may
+        send the request, or ``False``, if the budget is exhausted.  In the
+        latter case ``reset`` is the time, at which the budget is reset.
+        """
+        with self._condition:
+            remaining, reset = self._limits.get(budget, (None, None))
+            if reset is not None and time.time() >= reset:
+                del self._limits[budget]
+                remaining = None
+            if remaining is None:
+                return {'ok': True}
+            if remaining <= 0:
+                return {'ok': False, 'reset': reset}
+            self._limits[budget] = (remaining - 1, reset)
+            return {'ok': True}
+
+    def limit(self, budget, remaining, reset):
+        """
+        Set the state of the rate limit ``budget`` to ``remaining`` requests
+        until ``reset``, as reported by the tracker.
+        """
+        with self._condition:
+            self._limits[budget] = (remaining, reset)
+
+
+class CacheDaemon(ThreadingMixIn, UnixStreamServer):
+    """
+    Serve a :class:`CacheService` on the Unix socket at ``socket_path``.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, service=None):
+        if os.path.exists(socket_path):
+            # remove the socket of a previous daemon
+            os.remove(socket_path)
+        UnixStreamServer.__init__(self, socket_path, CacheRequestHandler)
+        self.service = service or CacheService()
+
+
+class CacheRequestHandler(StreamRequestHandler):
+
+    OPERATIONS = frozenset(['claim', 'wait', 'put', 'release', 'acquire',
+                            'limit'])
+
+    def handle(self):
+        for line in iter(self.rfile.readline, b''):
+            try:
+                request = json.loads(line.decode('utf-8'))
+                operation = request.pop('op')
+                if operation not in self.OPERATIONS:
+                    raise ValueError('unknown operation: {0}'.format(
+                        operation))
+                kwargs = dict((str(k), v) for k, v in request.items())
+                response = {'result': getattr(self.server.service,
+                                              operation)(**kwargs)}
+            except (ValueError, KeyError, TypeError) as error:
+                response = {'error': str(error)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class CacheClient(Transient):
+    """
+    Client of a :class:`CacheDaemon` listening at ``socket_path``.
+
+    Each thread uses its own connection to the daemon.  All methods raise
+    :exc:`DaemonError`, if the daemon is not available.  If ``socket_path``
+    is ``None``, the client is disabled.
+
+    The client is available at ``app.env.issuetracker_daemon``.
+    """
+
+    def __init__(self, socket_path=None):
+        self.socket_path = socket_path
+        #: Whether to use the daemon
+        self.enabled = socket_path is not None
+        self._local = threading.local()
+
+    def disable(self, app, error):
+        """
+        Disable this client after ``error``, and warn about it via ``app``.
+        """
+        if self.enabled:
+            self.enabled = False
+            app.warn('issue cache daemon at {0} not available, looking up '
+                     'issues without it: {1}'.format(self.socket_path, error))
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.socket_path)
+            connection = self._local.connection = sock.makefile('rwb')
+        return connection
+
+    def _request(self, operation, **kwargs):
+        kwargs['op'] = operation
+        try:
+            connection = self._connection()
+            connection.write(json.dumps(kwargs).encode('utf-8') + b'\n')
+            connection.flush()
+            line = connection.readline()
+            if not line:
+                raise IOError('connection closed by daemon')
+            response = json.loads(line.decode('utf-8'))
+        except (EnvironmentError, ValueError) as error:
+            self._local.connection = None
+            raise DaemonError(str(error))
+        if 'error' in response:
+            raise DaemonError(response['error'])
+        return response['result']
+
+    def _results(self, results):
+        for result in results:
+            if result.get('issue') is not None:
+                result['issue'] = Issue(**result['issue'])
+        return results
+
+    def claim(self, keys):
+        return self._results(self._request('claim', keys=keys))
+
+    def wait(self, keys):
+        return self._results(self._request('wait', keys=keys))
+
+    def put(self, items):
+        items = [(key, issue._asdict() if issue else None)
+                 for key, issue in items]
+        self._request('put', items=items)
+
+    def release(self, keys):
+        self._request('release', keys=keys)
+
+    def acquire(self, budget):
+        """
+        Acquire a request from the rate limit ``budget``.
+
+        Return ``True``, if the request may be sent, or ``False`` otherwise.
+        """
+        return self._request('acquire', budget=budget)['ok']
+
+    def limit(self, budget, remaining, reset):
+        self._request('limit', budget=budget, remaining=remaining,
+                      reset=reset)
+
+
+def main():
+    parser = OptionParser(usage='%prog [options] SOCKET')
+    parser.add_option('--ttl', type='int', default=DEFAULT_TTL,
+                      help='Seconds to cache issues (default: %default, 0 '
+                      'to cache issues forever)')
+    parser.add_option('--max-issues', type='int', default=DEFAULT_MAX_ISSUES,
+                      help='Maximum number of cached issues (default: '
+                      '%default, 0 for no limit)')
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error('socket path missing')
+    service = CacheService(ttl=options.ttl or None,
+                           max_issues=options.max_issues or None)
+    server = CacheDaemon(args[0], service)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(args[0])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
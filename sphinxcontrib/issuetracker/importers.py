@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    sphinxcontrib.issuetracker.importers
+    ====================================
+
+    Import issues from export files of issue trackers into the issue cache.
+
+    Importing an export seeds the issue cache of a Sphinx project, so that
+    builds don't need to look up any issue in the issue tracker.  All export
+    files are parsed incrementally, so that even huge exports are imported
+    with bounded memory.  The following exports are supported:
+
+    ``github``
+       Issues of the Github API as JSON, either as arrays of issues (e.g. the
+       pages written by ``gh api --paginate``), or as one issue per line.
+
+    ``jira``
+       Jira XML exports, either the XML view of a search (one ``item`` per
+       issue), or the :file:`entities.xml` file of a Jira XML backup.
+
+    ``redmine``
+       CSV exports of the Redmine issue list in English, with the ``#``,
+       ``Status`` and ``Subject`` columns.
+
+    ``debian``
+       Bug summaries of the Debian BTS as RFC 822 style records separated by
+       blank lines, with ``Bug``, ``Package``, ``Subject`` and ``Done``
+       fields.
+
+    Import a Github export into the cache in :file:`doc/_build/doctrees`::
+
+       python -m sphinxcontrib.issuetracker.importers --project foo/bar \\
+           github doc/_build/doctrees issues.json
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import io
+import re
+import sys
+import csv
+import json
+import codecs
+from collections import namedtuple
+from optparse import OptionParser
+from xml.etree import ElementTree as etree
+
+from sphinxcontrib.issuetracker import Issue, TrackerConfig, text_type
+from sphinxcontrib.issuetracker.cache import IssueCache
+from sphinxcontrib.issuetracker.resolvers import (
+    make_github_issue, make_jira_issue, make_debian_issue, JIRA_BROWSE_URL)
+
+
+#: Bytes read from an export file at once
+CHUNK_SIZE = 64 * 1024
+
+REDMINE_URL = '{0.url}/issues/{1}'
+
+_WHITESPACE = re.compile(r'\s*')
+
+
+def iter_json_values(source):
+    """
+    Iterate over all JSON values in the binary stream ``source``.
+
+    ``source`` contains a sequence of JSON values, optionally separated by
+    whitespace, like newline-delimited JSON.  Top-level arrays are not
+    yielded themselves, but their elements are, so that the elements of huge
+    arrays are parsed one by one.  Only the current value and a chunk of
+    input are kept in memory.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    position = 0
+    eof = False
+    in_array = False
+    while True:
+        position = _WHITESPACE.match(buffer, position).end()
+        if position < len(buffer):
+            char = buffer[position]
+            if in_array and char in ',]':
+                in_array = char == ','
+                position += 1
+                continue
+            elif not in_array and char == '[':
+                in_array = True
+                position += 1
+                continue
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # the value may be incomplete, so read more input below
+                if eof:
+                    raise
+            else:
+                # a number at the end of the input may continue in the next
+                # chunk
+                if end < len(buffer) or eof:
+                    position = end
+                    yield value
+                    continue
+        elif eof:
+            if in_array:
+                raise ValueError('unterminated JSON array')
+            return
+        # read at least as much input as buffered, to parse huge values in
+        # linear time
+        buffer = buffer[position:]
+        position = 0
+        chunk = source.read(max(CHUNK_SIZE, len(buffer)))
+        eof = not chunk
+        buffer += text_decoder.decode(chunk, eof)
+
+
+def iter_csv_records(source):
+    """
+    Iterate over the records in the UTF-8 encoded CSV binary stream
+    ``source`` as dictionaries, which map column names to values.
+    """
+    if sys.version_info[0] >= 3:
+        lines = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+        try:
+            for record in csv.DictReader(lines):
+                yield record
+        finally:
+            # don't close the source along with the wrapper
+            lines.detach()
+    else:
+        for record in csv.DictReader(source):
+            yield dict((key.decode('utf-8-sig'),
+                        (value or b'').decode('utf-8'))
+                       for key, value in record.items())
+
+
+def iter_rfc822_records(source):
+    """
+    Iterate over RFC 822 style records in the binary stream ``source`` as
+    dictionaries, which map field names to values.
+
+    Records are separated by blank lines.  Indented lines continue the value
+    of the previous field.
+    """
+    record = {}
+    field = None
+    for line in source:
+        line = line.decode('utf-8').rstrip('\r\n')
+        if not line.strip():
+            if record:
+                yield record
+            record = {}
+            field = None
+        elif line[0] in ' \t' and field:
+            record[field] += '\n' + line.strip()
+        else:
+            field, _, value = line.partition(':')
+            field = field.strip()
+            record[field] = value.strip()
+    if record:
+        yield record
+
+
+def import_github_issues(source, tracker_config):
+    """
+    Import Github issues from the JSON export in the binary stream
+    ``source``.
+
+    Issues of other repositories than the project of ``tracker_config`` are
+    skipped.  Return an iterator over
+    :class:`~sphinxcontrib.issuetracker.Issue` objects.
+    """
+    suffix = '/repos/' + tracker_config.project
+    for issue in iter_json_values(source):
+        repository_url = issue.get('repository_url')
+        if repository_url and not repository_url.endswith(suffix):
+            continue
+        yield make_github_issue(text_type(issue['number']), issue)
+
+
+def make_jira_backup_issue(tracker_config, project, key, number, summary,
+                           resolved):
+    """
+    Make an issue from the fields of an ``Issue`` entity of a Jira backup.
+
+    ``project`` is a pair of the key and the name of the project of the
+    issue.  Like :confval:`issuetracker_project`, the name identifies the
+    project.  ``key`` is the issue key, or ``None`` in backups of recent Jira
+    versions, which only store the ``number`` of the issue in its project.
+    """
+    project_key, project_name = project
+    if project_name != tracker_config.project:
+        return None
+    key = key or '{0}-{1}'.format(project_key, number)
+    return Issue(id=key, title=summary, closed=resolved,
+                 url=JIRA_BROWSE_URL.format(tracker_config, key))
+
+
+def import_jira_issues(source, tracker_config):
+    """
+    Import Jira issues from the XML export in the binary stream ``source``.
+
+    The export is either the XML view of a search, or the
+    :file:`entities.xml` of a Jira XML backup.  Issues of other projects than
+    the project of ``tracker_config`` are skipped.  Return an iterator over
+    :class:`~sphinxcontrib.issuetracker.Issue` objects.
+    """
+    # pairs of project keys and names by project entity ids, and issues of
+    # backups, whose project came after the issue
+    projects = {}
+    orphans = []
+    # the ancestors of the current element
+    parents = []
+    for event, element in etree.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            continue
+        parents.pop()
+        if element.tag == 'item':
+            issue = make_jira_issue(tracker_config, element.findtext('key'),
+                                    element)
+            if issue:
+                yield issue
+        elif element.tag == 'Project':
+            projects[element.get('id')] = (element.get('key'),
+                                           element.get('name'))
+        elif element.tag == 'Issue':
+            # backups of recent Jira versions store the project and the
+            # number of each issue instead of the key
+            fields = (element.get('key'), element.get('number'),
+                      element.get('summary') or element.findtext('summary'),
+                      element.get('resolution') is not None)
+            project = element.get('project')
+            if project in projects:
+                issue = make_jira_backup_issue(
+                    tracker_config, projects[project], *fields)
+                if issue:
+                    yield issue
+            else:
+                orphans.append((project, fields))
+        elif len(parents) != 1:
+            # keep all other elements, unless they are entities of a backup
+            continue
+        # drop the element, to keep memory bounded
+        if parents:
+            parents[-1].remove(element)
+    for project, fields in orphans:
+        if project in projects:
+            issue = make_jira_backup_issue(tracker_config, projects[project],
+                                           *fields)
+            if issue:
+                yield issue
+
+
+def import_redmine_issues(source, tracker_config):
+    """
+    Import Redmine issues from the CSV export in the binary stream
+    ``source``.
+
+    Return an iterator over :class:`~sphinxcontrib.issuetracker.Issue`
+    objects.
+    """
+    for record in iter_csv_records(source):
+        issue_id = record['#']
+        yield Issue(id=issue_id, title=record['Subject'],
+                    closed=record['Status'] == 'Closed',
+                    url=REDMINE_URL.format(tracker_config, issue_id))
+
+
+#: The fields of Debian bugs used by
+#: :func:`~sphinxcontrib.issuetracker.resolvers.make_debian_issue`
+DebianBug = namedtuple('DebianBug', 'package source subject done')
+
+
+def import_debian_issues(source, tracker_config):
+    """
+    Import Debian bugs from the bug summaries in the binary stream
+    ``source``.
+
+    Bugs of other packages than the project of ``tracker_config`` are
+    skipped.  Return an iterator over
+    :class:`~sphinxcontrib.issuetracker.Issue` objects.
+    """
+    for record in iter_rfc822_records(source):
+        bug = DebianBug(package=record.get('Package'),
+                        source=record.get('Source'),
+                        subject=record.get('Subject'),
+                        done=bool(record.get('Done')))
+        issue = make_debian_issue(tracker_config, record['Bug'], bug)
+        if issue:
+            yield issue
+
+
+#: Importers by tracker names
+IMPORTERS = {
+    'github': import_github_issues,
+    'jira': import_jira_issues,
+    'redmine': import_redmine_issues,
+    'debian': import_debian_issues,
+}
+
+
+def import_issues(cache, issues):
+    """
+    Put ``issues`` into the issue ``cache``.
+
+    ``cache`` is an :class:`~sphinxcontrib.issuetracker.cache.IssueCache`,
+    ``issues`` an iterable of :class:`~sphinxcontrib.issuetracker.Issue`
+    objects.  Cached issues, which differ from the imported issue, are marked
+    as changed.
+
+    Return the number of imported issues.
+    """
+    count = 0
+    for issue in issues:
+        if cache.get(issue.id) != issue:
+            cache[issue.id] = issue
+        count += 1
+    return count
+
+
+def main():
+    parser = OptionParser(
+        usage='%prog [options] TRACKER DOCTREEDIR [EXPORT ...]')
+    parser.add_option('-p', '--project',
+                      help='The project of the issues (required)')
+    parser.add_option('-u', '--url',
+                      help='The url of the issue tracker (required for jira '
+                      'and redmine)')
+    options, args = parser.parse_args()
+    if len(args) < 2:
+        parser.error('tracker or doctree directory missing')
+    tracker = args[0].lower()
+    if tracker not in IMPORTERS:
+        parser.error('unknown tracker: {0}'.format(tracker))
+    if not options.project:
+        parser.error('project missing')
+    if tracker in ('jira', 'redmine') and not options.url:
+        parser.error('url missing')
+    tracker_config = TrackerConfig(options.project, options.url)
+    cache = IssueCache.in_directory(args[1])
+    count = 0
+    for filename in args[2:] or ['-']:
+        if filename == '-':
+            source = getattr(sys.stdin, 'buffer', sys.stdin)
+            count += import_issues(cache,
+                                   IMPORTERS[tracker](source, tracker_config))
+        else:
+            with open(filename, 'rb') as source:
+                count += import_issues(
+                    cache, IMPORTERS[tracker](source, tracker_config))
+    cache.save()
+    print('{0} issues imported'.format(count))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
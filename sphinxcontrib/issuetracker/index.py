@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    sphinxcontrib.issuetracker.index
+    ================================
+
+    A read-only issue index for very large issue trackers.
+
+    The index is a file with a sorted array of fixed-width entries, followed
+    by a heap with the issue ids, titles and urls.  It is memory-mapped, and
+    issues are found by binary search, so that opening the index is
+    instantaneous, lookups only touch the pages they need, and concurrent
+    builds share the index in the page cache of the operating system.  See
+    :confval:`issuetracker_index`.
+
+    Compile an index from the issue cache in :file:`doc/_build/doctrees`::
+
+       python -m sphinxcontrib.issuetracker.index --project foo/bar \\
+           issues.idx doc/_build/doctrees
+
+    Or compile an index from exports of the issue tracker, see
+    :mod:`~sphinxcontrib.issuetracker.importers`::
+
+       python -m sphinxcontrib.issuetracker.index --project foo/bar \\
+           --import github issues.idx issues.json
+
+    The file starts with a header of the magic bytes ``SPHXIDX1``, the number
+    of entries and the length of the JSON metadata as little-endian unsigned
+    32 bit integers, followed by the metadata, which contain the ``project``
+    and the ``url`` of the issue tracker.  Each entry consists of the offset
+    of the issue in the file as unsigned 64 bit integer, the lengths of the
+    UTF-8 encoded issue id, title and url as unsigned 32 bit integers and a
+    byte of flags.  Entries are sorted by the encoded issue ids.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import os
+import sys
+import json
+import mmap
+import struct
+from optparse import OptionParser
+
+from sphinxcontrib.issuetracker import Issue, TrackerConfig
+from sphinxcontrib.issuetracker.cache import IssueCache
+from sphinxcontrib.issuetracker.util import Transient
+
+
+MAGIC = b'SPHXIDX1'
+
+HEADER = struct.Struct(str('<8sII'))
+
+ENTRY = struct.Struct(str('<QIIIB'))
+
+#: The issue exists, entries without this flag are missing issues
+FLAG_EXISTS = 1
+FLAG_CLOSED = 2
+#: The issue has a title, to distinguish empty titles from ``None``
+FLAG_TITLE = 4
+
+
+def encode_issue(issue_id, issue):
+    """
+    Encode ``issue`` (or ``None``) with the given ``issue_id``.
+
+    Return a tuple of the encoded issue id, title and url, and the flags.
+    """
+    flags = 0
+    title = url = b''
+    if issue is not None:
+        flags |= FLAG_EXISTS
+        if issue.closed:
+            flags |= FLAG_CLOSED
+        if issue.title is not None:
+            flags |= FLAG_TITLE
+            title = issue.title.encode('utf-8')
+        url = (issue.url or '').encode('utf-8')
+    return issue_id.encode('utf-8'), title, url, flags
+
+
+def write_index(filename, issues, tracker_config):
+    """
+    Write an index of ``issues`` to ``filename``.
+
+    ``issues`` is an iterable of pairs of issue ids and
+    :class:`~sphinxcontrib.issuetracker.Issue` objects, or ``None`` for
+    missing issues.  ``tracker_config`` is the
+    :class:`~sphinxcontrib.issuetracker.TrackerConfig` of the issues.  Like
+    :func:`~sphinxcontrib.issuetracker.util.write_file_atomically`, the index
+    is written to a temporary file first, which then replaces ``filename``.
+
+    Return the number of indexed issues.
+    """
+    records = sorted(encode_issue(issue_id, issue)
+                     for issue_id, issue in dict(issues).items())
+    metadata = json.dumps({'project': tracker_config.project,
+                           'url': tracker_config.url}).encode('utf-8')
+    offset = HEADER.size + len(metadata) + ENTRY.size * len(records)
+    temporary_filename = filename + '.tmp'
+    with open(temporary_filename, 'wb') as stream:
+        stream.write(HEADER.pack(MAGIC, len(records), len(metadata)))
+        stream.write(metadata)
+        for key, title, url, flags in records:
+            stream.write(ENTRY.pack(offset, len(key), len(title), len(url),
+                                    flags))
+            offset += len(key) + len(title) + len(url)
+        for key, title, url, _ in records:
+            stream.write(key + title + url)
+    if os.name == 'nt' and os.path.exists(filename):
+        # rename doesn't replace existing files on Windows
+        os.remove(filename)
+    os.rename(temporary_filename, filename)
+    return len(records)
+
+
+class IssueIndex(Transient):
+    """
+    A memory-mapped issue index in the file ``filename``.
+
+    The index maps issue ids to :class:`~sphinxcontrib.issuetracker.Issue`
+    objects, or to ``None`` for missing issues.  If ``filename`` is ``None``,
+    the index is disabled and empty.  Raise :exc:`~exceptions.ValueError`, if
+    the file is no issue index.
+
+    The index is available at ``app.env.issuetracker_index``.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        #: Whether an index is used
+        self.enabled = filename is not None
+        #: The metadata of the index as dictionary
+        self.metadata = {}
+        self._map = None
+        self._count = 0
+        self._entries = 0
+        if filename is not None:
+            self._open()
+
+    def _open(self):
+        with open(self.filename, 'rb') as source:
+            header = source.read(HEADER.size)
+            if len(header) != HEADER.size:
+                raise ValueError('{0} is no issue index'.format(
+                    self.filename))
+            magic, count, metadata_length = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError('{0} is no issue index'.format(
+                    self.filename))
+            self.metadata = json.loads(
+                source.read(metadata_length).decode('utf-8'))
+            self._map = mmap.mmap(source.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        self._count = count
+        self._entries = HEADER.size + metadata_length
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self._count = 0
+
+    def covers(self, tracker_config):
+        """
+        Whether this index contains the issues of ``tracker_config``.
+        """
+        return (self.enabled and
+                self.metadata.get('project') == tracker_config.project and
+                self.metadata.get('url') == tracker_config.url)
+
+    def _find(self, key):
+        # binary search over the sorted entries
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            entry = ENTRY.unpack_from(
+                self._map, self._entries + middle * ENTRY.size)
+            offset, key_length = entry[:2]
+            middle_key = self._map[offset:offset + key_length]
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                return entry
+        raise KeyError(key)
+
+    def __getitem__(self, issue_id):
+        try:
+            entry = self._find(issue_id.encode('utf-8'))
+        except KeyError:
+            raise KeyError(issue_id)
+        offset, key_length, title_length, url_length, flags = entry
+        if not flags & FLAG_EXISTS:
+            return None
+        start = offset + key_length
+        title = self._map[start:start + title_length].decode('utf-8')
+        start += title_length
+        url = self._map[start:start + url_length].decode('utf-8')
+        return Issue(id=issue_id,
+                     title=title if flags & FLAG_TITLE else None,
+                     url=url, closed=bool(flags & FLAG_CLOSED))
+
+    def __contains__(self, issue_id):
+        try:
+            self._find(issue_id.encode('utf-8'))
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        return self._count
+
+    def get(self, issue_id, default=None):
+        try:
+            return self[issue_id]
+        except KeyError:
+            return default
+
+
+def main():
+    parser = OptionParser(
+        usage='%prog [options] INDEX DOCTREEDIR\n'
+        '       %prog [options] --import TRACKER INDEX [EXPORT ...]')
+    parser.add_option('-p', '--project',
+                      help='The project of the issues (required)')
+    parser.add_option('-u', '--url', help='The url of the issue tracker')
+    parser.add_option('-i', '--import', dest='tracker', metavar='TRACKER',
+                      help='Index exports of TRACKER instead of a cache')
+    options, args = parser.parse_args()
+    if not options.project:
+        parser.error('project missing')
+    if not args:
+        parser.error('index missing')
+    tracker_config = TrackerConfig(options.project, options.url)
+    if options.tracker:
+        from sphinxcontrib.issuetracker.importers import IMPORTERS
+        if options.tracker not in IMPORTERS:
+            parser.error('unknown tracker: {0}'.format(options.tracker))
+        importer = IMPORTERS[options.tracker]
+        issues = {}
+        for filename in args[1:] or ['-']:
+            if filename == '-':
+                source = getattr(sys.stdin, 'buffer', sys.stdin)
+                issues.update((issue.id, issue) for issue
+                              in importer(source, tracker_config))
+            else:
+                with open(filename, 'rb') as source:
+                    issues.update((issue.id, issue) for issue
+                                  in importer(source, tracker_config))
+    else:
+        if len(args) != 2:
+            parser.error('doctree directory missing')
+        issues = IssueCache.in_directory(args[1]).issues
+    count = write_index(args[0], issues.items(), tracker_config)
+    print('{0} issues indexed'.format(count))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
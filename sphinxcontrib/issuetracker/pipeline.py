@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    sphinxcontrib.issuetracker.pipeline
+    ===================================
+
+    Look up issues in background threads, while Sphinx reads documents.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import threading
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+from sphinxcontrib.issuetracker.util import Transient
+
+
+class LookupPipeline(Transient):
+    """
+    A pool of background threads, which look up issues.
+
+    The pipeline is disabled, until it is started with :meth:`start`.  Then
+    callers :meth:`submit` the issues to look up, and continue immediately,
+    while the threads look up the issues.  Callers, which need an issue
+    later, wait for the lookup in progress, see
+    :class:`~sphinxcontrib.issuetracker.cache.InFlightLookups`, or look up
+    the issue themselves, if no thread has started to look it up yet.
+
+    The pipeline is available at ``app.env.issuetracker_pipeline``, see
+    :confval:`issuetracker_pipeline_workers`.
+    """
+
+    def __init__(self):
+        #: Whether the pipeline is started
+        self.enabled = False
+        self._queue = Queue()
+        self._threads = []
+
+    def start(self, lookup, workers):
+        """
+        Start ``workers`` threads, which call ``lookup`` with the
+        :class:`~sphinxcontrib.issuetracker.TrackerConfig` and the list of
+        issue ids of each submitted lookup.
+        """
+        self.enabled = True
+        for _ in range(workers):
+            thread = threading.Thread(target=self._work, args=(lookup,))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self, lookup):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                tracker_config, issue_ids = item
+                try:
+                    lookup(tracker_config, issue_ids)
+                except Exception:
+                    # failed issues are not cached, so whoever needs them
+                    # looks them up again, and gets the error
+                    pass
+            finally:
+                self._queue.task_done()
+
+    def submit(self, tracker_config, issue_ids):
+        """
+        Look up the issues with the given ``issue_ids`` of ``tracker_config``
+        in the background.
+        """
+        self._queue.put((tracker_config, list(issue_ids)))
+
+    def wait(self):
+        """
+        Wait until all submitted lookups are finished.
+        """
+        if self.enabled:
+            self._queue.join()
+
+    def stop(self):
+        """
+        Stop all threads.
+
+        Lookups, which were submitted, but not started yet, are discarded.
+        Lookups in progress are finished.
+        """
+        if not self.enabled:
+            return
+        try:
+            while True:
+                self._queue.get_nowait()
+                self._queue.task_done()
+        except Empty:
+            pass
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.enabled = False
@@ -37,14 +37,28 @@
                         absolute_import)
 
 import time
+from timeit import default_timer
+
+try:
+    from urllib.parse import urlparse, quote
+except ImportError:
+    from urlparse import urlparse
+    from urllib import quote
 
 import requests
 from xml.etree import ElementTree as etree
 
-from sphinxcontrib.issuetracker import Issue, __version__
+from sphinxcontrib.issuetracker import Issue, text_type, __version__
+from sphinxcontrib.issuetracker.breaker import TrackerUnavailable
+from sphinxcontrib.issuetracker.daemon import DaemonError
 
 
 GITHUB_API_URL = 'https://api.github.com/repos/{0.project}/issues/{1}'
+GITHUB_ISSUES_API_URL = ('https://api.github.com/repos/{0.project}/issues?'
+                         'state=all&per_page=100')
+# seconds to refresh Github issues before the last refresh, to account for
+# clock skew between Github and this machine
+GITHUB_REFRESH_MARGIN = 300
 BITBUCKET_URL = 'https://bitbucket.org/{0.project}/issue/{1}/'
 BITBUCKET_API_URL = ('https://api.bitbucket.org/1.0/repositories/'
                      '{0.project}/issues/{1}/')
@@ -59,6 +73,21 @@
 JIRA_API_URL = ('{0.url}/si/jira.issueviews:issue-xml/{1}/{1}.xml?'
                 # only request the required fields
                 'field=link&field=resolution&field=summary&field=project')
+JIRA_SEARCH_URL = ('{0.url}/sr/jira.issueviews:searchrequest-xml/temp/'
+                   'SearchRequest.xml?jqlQuery={1}&tempMax={2}&'
+                   'field=key&field=link&field=resolution&field=summary&'
+                   'field=project')
+# the number of issues to look up in a single Jira search, to keep the URL of
+# the search request short
+JIRA_BATCH_SIZE = 50
+# refreshes page through the search view used by lookups, so that refreshed
+# issues are made from the same fields as looked up issues
+JIRA_REFRESH_URL = JIRA_SEARCH_URL + '&pager/start={3}'
+JIRA_BROWSE_URL = '{0.url}/browse/{1}'
+JIRA_REFRESH_PAGE_SIZE = 100
+# Jira interprets times in JQL in the time zone of the user, so refresh Jira
+# issues a whole day before the last refresh to cover all time zones
+JIRA_REFRESH_MARGIN = 86400
 
 
 def check_project_with_username(tracker_config):
@@ -73,7 +102,75 @@ def check_project_with_username(tracker_config):
 }
 
 
-def get(app, url):
+def acquire_request(app, host):
+    """
+    Acquire a request to ``host`` from the rate limit budget shared by all
+    builds through the issue cache daemon.
+
+    Return ``True``, if the request may be sent, or ``False``, if the rate
+    limit of ``host`` is exhausted.
+    """
+    daemon = app.env.issuetracker_daemon
+    if not daemon.enabled:
+        return True
+    try:
+        return daemon.acquire(host)
+    except DaemonError as error:
+        daemon.disable(app, error)
+        return True
+
+
+def report_rate_limit(app, host, response):
+    """
+    Report the rate limit of ``host`` from the headers of ``response`` to the
+    issue cache daemon.
+    """
+    daemon = app.env.issuetracker_daemon
+    if not daemon.enabled:
+        return
+    headers = response.headers
+    remaining = headers.get('X-RateLimit-Remaining')
+    reset = headers.get('X-RateLimit-Reset')
+    retry_after = headers.get('Retry-After')
+    if response.status_code == 429 and retry_after and retry_after.isdigit():
+        remaining, reset = 0, time.time() + int(retry_after)
+    elif remaining and remaining.isdigit() and reset and reset.isdigit():
+        remaining, reset = int(remaining), int(reset)
+    else:
+        return
+    try:
+        daemon.limit(host, remaining, reset)
+    except DaemonError as error:
+        daemon.disable(app, error)
+
+
+def report_failure(app, host, message):
+    """
+    Record a failed request to ``host`` with ``message`` in the circuit
+    breaker of ``host``.
+
+    Failures are only warned about once: When they open the circuit of
+    ``host``, or at the end of the build, see
+    :func:`~sphinxcontrib.issuetracker.report_failures`.  If the circuit
+    breaker is disabled, each failure is warned about.
+
+    Raise :exc:`~sphinxcontrib.issuetracker.breaker.TrackerUnavailable`.
+    """
+    breaker = app.env.issuetracker_breaker
+    if not breaker.enabled:
+        app.warn(message)
+    elif breaker.record_failure(host, message):
+        if breaker.cooldown is None:
+            duration = 'for the rest of the build'
+        else:
+            duration = 'for {0} seconds'.format(breaker.cooldown)
+        app.warn('{0} failed {1} times in a row, not sending requests to it '
+                 '{2}, last failure: {3}'.format(
+                     host, breaker.threshold, duration, message))
+    raise TrackerUnavailable(host)
+
+
+def get(app, url, expected_statuses=()):
     """
     Get a response from the given ``url``.
 
@@ -82,10 +179,61 @@ def get(app, url):
 
     Return the :class:`~requests.Response` object on status code 200, or
     ``None`` otherwise. If the status code is not 200 or 404, a warning is
-    emitted via ``app``.
+    emitted via ``app``.  Responses with a status code in
+    ``expected_statuses`` are returned without warning, too.
+
+    If the request fails without response, or with a status code of 500 or
+    above, a warning is emitted, and
+    :exc:`~sphinxcontrib.issuetracker.breaker.TrackerUnavailable` is raised.
+    If the circuit breaker of the host is open, see
+    :confval:`issuetracker_circuit_breaker`, this exception is raised without
+    sending the request.
+
+    The request is sent through the cassette at
+    ``app.env.issuetracker_cassette``, which records or replays responses,
+    see :confval:`issuetracker_cassette`.
+
+    The request is recorded in the build statistics and the trace.  If the
+    rate limit of the host, which is shared by all builds through the issue
+    cache daemon, is exhausted, a warning is emitted and
+    :exc:`~sphinxcontrib.issuetracker.breaker.TrackerUnavailable` is raised
+    without sending the request, so that the issue is neither cached as
+    missing nor passed to the daemon.
     """
-    response = requests.get(url, headers=HEADERS)
-    if response.status_code == requests.codes.ok:
+    host = urlparse(url).netloc
+    stats = app.env.issuetracker_stats
+    tracer = app.env.issuetracker_tracer
+    breaker = app.env.issuetracker_breaker
+    if not breaker.allow(host):
+        stats.record_short_circuited(host)
+        raise TrackerUnavailable(host)
+    if not acquire_request(app, host):
+        # a probe of a half-open circuit wasn't sent
+        breaker.cancel(host)
+        stats.record_rate_limited(host)
+        app.warn('rate limit of {0} exhausted, not requesting {1}'.format(
+            host, url))
+        raise TrackerUnavailable(host)
+    start = default_timer()
+    try:
+        response = app.env.issuetracker_cassette.get(url, HEADERS)
+    except requests.RequestException as error:
+        stats.record_error(host)
+        tracer.record('GET', 'http', start, default_timer(), url=url,
+                      status=None)
+        report_failure(app, host, 'GET {0} failed: {1}'.format(url, error))
+    end = default_timer()
+    stats.record_request(host, response.status_code, len(response.content),
+                         end - start)
+    tracer.record('GET', 'http', start, end, url=url,
+                  status=response.status_code)
+    report_rate_limit(app, host, response)
+    if response.status_code >= 500:
+        report_failure(app, host, 'GET {0.url} failed with code '
+                       '{0.status_code}'.format(response))
+    breaker.record_success(host)
+    if (response.status_code == requests.codes.ok or
+            response.status_code in expected_statuses):
         return response
     elif response.status_code != requests.codes.not_found:
         msg = 'GET {0.url} failed with code {0.status_code}'
@@ -110,16 +258,52 @@ def lookup_github_issue(app, tracker_config, issue_id):
             if rate_remaining.isdigit() and int(rate_remaining) == 0:
                 app.warn('Github rate limit hit')
                 app.env.github_rate_limit = (time.time(), True)
-            issue = response.json()
-            closed = issue['state'] == 'closed'
-            return Issue(id=issue_id, title=issue['title'], closed=closed,
-                         url=issue['html_url'])
+            return make_github_issue(issue_id, response.json())
     else:
+        app.env.issuetracker_stats.record_rate_limited(
+            urlparse(GITHUB_API_URL).netloc)
         app.warn('Github rate limit exceeded, not resolving issue {0}'.format(
             issue_id))
         return None
 
 
+def make_github_issue(issue_id, issue):
+    closed = issue['state'] == 'closed'
+    return Issue(id=issue_id, title=issue['title'], closed=closed,
+                 url=issue['html_url'])
+
+
+def refresh_github_issues(app, tracker_config, since):
+    """
+    Refresh all cached issues, which changed after ``since``.
+
+    ``since`` is the time of the last refresh in seconds since the epoch, or
+    ``None`` to refresh all cached issues.  All issues changed since this time
+    are listed with a single paginated request, and all cached issues among
+    them are updated.
+
+    Return ``True``, if the refresh succeeded, or ``False`` otherwise.
+    """
+    check_project_with_username(tracker_config)
+    cache = app.env.issuetracker_cache
+    url = GITHUB_ISSUES_API_URL.format(tracker_config)
+    if since:
+        url += '&since=' + time.strftime(
+            '%Y-%m-%dT%H:%M:%SZ', time.gmtime(since - GITHUB_REFRESH_MARGIN))
+    while url:
+        response = get(app, url)
+        if not response:
+            return False
+        for issue in response.json():
+            issue_id = text_type(issue['number'])
+            # only update cached issues, including issues cached as missing,
+            # which may have been created in the meantime
+            if issue_id in cache:
+                cache[issue_id] = make_github_issue(issue_id, issue)
+        url = response.links.get('next', {}).get('url')
+    return True
+
+
 def lookup_bitbucket_issue(app, tracker_config, issue_id):
     check_project_with_username(tracker_config)
 
@@ -132,6 +316,15 @@ def lookup_bitbucket_issue(app, tracker_config, issue_id):
         return Issue(id=issue_id, title=issue['title'], closed=closed, url=url)
 
 
+def make_debian_issue(tracker_config, issue_id, bug):
+    # check if issue matches project
+    if tracker_config.project not in (bug.package, bug.source):
+        return None
+
+    return Issue(id=issue_id, title=bug.subject, closed=bug.done,
+                 url=DEBIAN_URL.format(issue_id))
+
+
 def lookup_debian_issue(app, tracker_config, issue_id):
     import debianbts
     try:
@@ -140,12 +333,18 @@ def lookup_debian_issue(app, tracker_config, issue_id):
     except IndexError:
         return None
 
-    # check if issue matches project
-    if tracker_config.project not in (bug.package, bug.source):
-        return None
+    return make_debian_issue(tracker_config, issue_id, bug)
 
-    return Issue(id=issue_id, title=bug.subject, closed=bug.done,
-                 url=DEBIAN_URL.format(issue_id))
+
+def lookup_debian_issues(app, tracker_config, issue_ids):
+    import debianbts
+    bugs = dict((text_type(bug.bug_num), bug)
+                for bug in debianbts.get_status(*issue_ids))
+    # the status of missing bugs is not returned at all
+    return dict((issue_id, make_debian_issue(tracker_config, issue_id,
+                                             bugs[issue_id])
+                 if issue_id in bugs else None)
+                for issue_id in issue_ids)
 
 
 def lookup_launchpad_issue(app, tracker_config, issue_id):
@@ -181,39 +380,152 @@ def lookup_google_code_issue(app, tracker_config, issue_id):
                      url=GOOGLE_CODE_URL.format(tracker_config, issue_id))
 
 
+def make_jira_issue(tracker_config, issue_id, item):
+    project = item.find('project').text
+    if project != tracker_config.project:
+        return None
+
+    url = item.find('link').text
+    state = item.find('resolution').text
+    # summary contains the title without the issue id
+    title = item.find('summary').text
+    closed = state.lower() != 'unresolved'
+    return Issue(id=issue_id, title=title, closed=closed, url=url)
+
+
 def lookup_jira_issue(app, tracker_config, issue_id):
     if not tracker_config.url:
         raise ValueError('URL required')
     url = JIRA_API_URL.format(tracker_config, issue_id)
     response = get(app, url)
     if response:
-        issue = etree.fromstring(response.content)
-        project = issue.find('*/item/project').text
-        if project != tracker_config.project:
-            return None
+        item = etree.fromstring(response.content).find('*/item')
+        return make_jira_issue(tracker_config, issue_id, item)
 
-        url = issue.find('*/item/link').text
-        state = issue.find('*/item/resolution').text
-        # summary contains the title without the issue id
-        title = issue.find('*/item/summary').text
-        closed = state.lower() != 'unresolved'
-        return Issue(id=issue_id, title=title, closed=closed, url=url)
 
+def search_jira_issues(app, tracker_config, issue_ids):
+    """
+    Search the issues with the given ``issue_ids`` with a single query.
 
-def lookup_redmine_issue(app, tracker_config, issue_id):
+    Jira rejects the whole search with status 400, if any issue doesn't
+    exist.  The issues of a rejected search are split in halves, which are
+    searched again, until the missing issues are found.
+
+    Return a dictionary, which maps the ids of all found issues to
+    :class:`~sphinxcontrib.issuetracker.Issue` objects, and the ids of
+    missing issues to ``None``.  Issues of searches, which failed for other
+    reasons, are omitted.
+    """
+    jql = 'issuekey in ({0})'.format(','.join(issue_ids))
+    url = JIRA_SEARCH_URL.format(tracker_config, quote(jql), len(issue_ids))
+    response = get(app, url, expected_statuses=(requests.codes.bad_request,))
+    if response is None:
+        return {}
+    if response.status_code == requests.codes.bad_request:
+        if len(issue_ids) == 1:
+            return {issue_ids[0]: None}
+        middle = len(issue_ids) // 2
+        issues = search_jira_issues(app, tracker_config, issue_ids[:middle])
+        issues.update(search_jira_issues(app, tracker_config,
+                                         issue_ids[middle:]))
+        return issues
+    issues = {}
+    for item in etree.fromstring(response.content).findall('*/item'):
+        issue_id = item.find('key').text
+        if issue_id in issue_ids:
+            issues[issue_id] = make_jira_issue(tracker_config, issue_id, item)
+    return issues
+
+
+def lookup_jira_issues(app, tracker_config, issue_ids):
+    if not tracker_config.url:
+        raise ValueError('URL required')
+    issues = {}
+    for index in range(0, len(issue_ids), JIRA_BATCH_SIZE):
+        issues.update(search_jira_issues(
+            app, tracker_config, issue_ids[index:index + JIRA_BATCH_SIZE]))
+    return issues
+
+
+def connect_redmine(app, tracker_config):
     from redmine import Redmine
     if not tracker_config.url:
         raise ValueError('URL required')
-    redmine = Redmine(tracker_config.url,
-                      key=app.config.issuetracker_redmine_key,
-                      username=app.config.issuetracker_redmine_username,
-                      password=app.config.issuetracker_redmine_password,
-                      requests=app.config.issuetracker_redmine_requests)
+    return Redmine(tracker_config.url,
+                   key=app.config.issuetracker_redmine_key,
+                   username=app.config.issuetracker_redmine_username,
+                   password=app.config.issuetracker_redmine_password,
+                   requests=app.config.issuetracker_redmine_requests)
+
+
+def make_redmine_issue(issue_id, issue):
+    return Issue(id=issue_id, title=issue.subject,
+                 closed=issue.status is "Closed",
+                 url=issue.url)
+
+
+def refresh_jira_issues(app, tracker_config, since):
+    """
+    Refresh all cached issues, which changed after ``since``.
+
+    ``since`` is the time of the last refresh in seconds since the epoch.  All
+    issues of the project updated since this time are searched with a single
+    paginated JQL query, and all cached issues among them are updated with
+    :func:`make_jira_issue` like looked up issues.  If ``since`` is ``None``,
+    all cached issues are looked up again in batches, and issues, which don't
+    exist anymore, are cached as missing.
+
+    Return ``True``, if the refresh succeeded, or ``False`` otherwise.
+    """
+    if not tracker_config.url:
+        raise ValueError('URL required')
+    cache = app.env.issuetracker_cache
+    if since is None:
+        # issues cached as missing would only split the batches
+        issue_ids = [issue_id for issue_id, issue in cache.items()
+                     if issue is not None]
+        issues = lookup_jira_issues(app, tracker_config, issue_ids)
+        cache.update(issues)
+        # deleted issues are found as missing, so only failed searches leave
+        # issues out
+        return all(issue_id in issues for issue_id in issue_ids)
+    jql = 'project = "{0}" AND updated >= "{1}"'.format(
+        tracker_config.project, time.strftime(
+            '%Y/%m/%d %H:%M', time.gmtime(since - JIRA_REFRESH_MARGIN)))
+    start = 0
+    while True:
+        url = JIRA_REFRESH_URL.format(
+            tracker_config, quote(jql), JIRA_REFRESH_PAGE_SIZE, start)
+        response = get(app, url)
+        if not response:
+            return False
+        items = etree.fromstring(response.content).findall('*/item')
+        for item in items:
+            issue_id = item.find('key').text
+            if issue_id in cache:
+                cache[issue_id] = make_jira_issue(
+                    tracker_config, issue_id, item)
+        start += len(items)
+        if len(items) < JIRA_REFRESH_PAGE_SIZE:
+            return True
+
+
+def lookup_redmine_issue(app, tracker_config, issue_id):
+    redmine = connect_redmine(app, tracker_config)
     if redmine:
         issue = redmine.issue.get(issue_id)
-        return Issue(id=issue_id, title=issue.subject,
-                     closed=issue.status is "Closed",
-                     url=issue.url)
+        return make_redmine_issue(issue_id, issue)
+
+
+def lookup_redmine_issues(app, tracker_config, issue_ids):
+    redmine = connect_redmine(app, tracker_config)
+    if redmine:
+        # include closed issues, which Redmine omits by default
+        found = redmine.issue.filter(issue_id=','.join(issue_ids),
+                                     status_id='*')
+        return dict((text_type(issue.id),
+                     make_redmine_issue(text_type(issue.id), issue))
+                    for issue in found)
 
 BUILTIN_ISSUE_TRACKERS = {
     'github': lookup_github_issue,
@@ -224,3 +536,14 @@ def lookup_redmine_issue(app, tracker_config, issue_id):
     'jira': lookup_jira_issue,
     'redmine': lookup_redmine_issue,
 }
+
+BUILTIN_REFRESHERS = {
+    'github': refresh_github_issues,
+    'jira': refresh_jira_issues,
+}
+
+BUILTIN_BATCH_ISSUE_TRACKERS = {
+    'debian': lookup_debian_issues,
+    'jira': lookup_jira_issues,
+    'redmine': lookup_redmine_issues,
+}
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    sphinxcontrib.issuetracker.stats
+    ================================
+
+    Statistics about the work of :mod:`sphinxcontrib.issuetracker` in a build.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import json
+import math
+import threading
+from collections import defaultdict
+
+from sphinxcontrib.issuetracker.util import Transient
+
+
+#: Percentiles of latencies in reports
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+def percentile(values, fraction):
+    """
+    Get the percentile ``fraction`` (e.g. ``0.9``) of the sorted ``values``
+    with the nearest rank method.
+
+    Return ``None``, if ``values`` is empty.
+    """
+    if not values:
+        return None
+    # round away floating point errors like 0.9 * 100 = 90.00000000000001
+    rank = int(math.ceil(round(fraction * len(values), 9)))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+class HostStats(object):
+    """
+    Statistics about the requests to a single tracker host.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.short_circuited = 0
+        self.statuses = defaultdict(int)
+        self.durations = []
+
+    def as_dict(self):
+        durations = sorted(self.durations)
+        return {
+            'requests': self.requests,
+            'bytes': self.bytes,
+            'errors': self.errors,
+            'rate_limited': self.rate_limited,
+            'short_circuited': self.short_circuited,
+            'statuses': dict((str(status), count) for status, count
+                             in self.statuses.items()),
+            'duration': sum(durations),
+            'latency': dict((str(fraction), percentile(durations, fraction))
+                            for fraction in PERCENTILES),
+        }
+
+
+class BuildStats(Transient):
+    """
+    Statistics about the work of this extension in a build.
+
+    The statistics are collected in ``app.env.issuetracker_stats``, and
+    reported at the end of the build, see :confval:`issuetracker_stats`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        #: The number of transformed documents
+        self.documents = 0
+        #: The number of text nodes visited by the transform
+        self.text_nodes = 0
+        #: The number of text nodes searched for issue references
+        self.searched_text_nodes = 0
+        #: The number of plaintext issue references found by the transform
+        self.references = 0
+        #: The total time spent in the transform in seconds
+        self.transform_duration = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        #: The durations of all issue lookups in seconds
+        self.lookup_durations = []
+        #: Statistics about requests by host name
+        self.hosts = defaultdict(HostStats)
+
+    def record_transform(self, text_nodes, searched_text_nodes, references,
+                         duration):
+        with self._lock:
+            self.documents += 1
+            self.text_nodes += text_nodes
+            self.searched_text_nodes += searched_text_nodes
+            self.references += references
+            self.transform_duration += duration
+
+    def record_cache_probe(self, hit):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def record_lookup(self, duration):
+        with self._lock:
+            self.lookup_durations.append(duration)
+
+    def record_request(self, host, status, size, duration):
+        """
+        Record a request to ``host``, which returned ``status`` with ``size``
+        bytes after ``duration`` seconds.
+
+        Responses other than 200 and 404 count as error, and responses with
+        status 429 count as rate limited, too.
+        """
+        with self._lock:
+            stats = self.hosts[host]
+            stats.requests += 1
+            stats.bytes += size
+            stats.statuses[status] += 1
+            stats.durations.append(duration)
+            if status not in (200, 404):
+                stats.errors += 1
+            if status == 429:
+                stats.rate_limited += 1
+
+    def record_error(self, host):
+        """
+        Record a request to ``host``, which failed without response.
+        """
+        with self._lock:
+            stats = self.hosts[host]
+            stats.requests += 1
+            stats.errors += 1
+
+    def record_rate_limited(self, host):
+        """
+        Record a lookup, which was skipped because the rate limit of ``host``
+        was hit.
+        """
+        with self._lock:
+            self.hosts[host].rate_limited += 1
+
+    def record_short_circuited(self, host):
+        """
+        Record a request, which was not sent, because the circuit breaker of
+        ``host`` was open.
+        """
+        with self._lock:
+            self.hosts[host].short_circuited += 1
+
+    def as_dict(self):
+        """
+        Get all statistics as dictionary.
+        """
+        with self._lock:
+            durations = sorted(self.lookup_durations)
+            return {
+                'transform': {
+                    'documents': self.documents,
+                    'text_nodes': self.text_nodes,
+                    'searched_text_nodes': self.searched_text_nodes,
+                    'references': self.references,
+                    'duration': self.transform_duration,
+                },
+                'cache': {'hits': self.cache_hits,
+                          'misses': self.cache_misses},
+                'lookups': {
+                    'count': len(durations),
+                    'duration': sum(durations),
+                    'latency': dict(
+                        (str(fraction), percentile(durations, fraction))
+                        for fraction in PERCENTILES),
+                },
+                'hosts': dict((host, stats.as_dict()) for host, stats
+                              in self.hosts.items()),
+            }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        """
+        Get all statistics in the text format of Prometheus, for the textfile
+        collector of the node exporter.
+        """
+        stats = self.as_dict()
+        lines = []
+
+        def metric(name, kind, description, samples):
+            name = 'sphinx_issuetracker_' + name
+            lines.append('# HELP {0} {1}'.format(name, description))
+            lines.append('# TYPE {0} {1}'.format(name, kind))
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_text = ','.join('{0}="{1}"'.format(*label)
+                                      for label in sorted(labels.items()))
+                lines.append('{0}{1} {2!r}'.format(
+                    name, '{{{0}}}'.format(label_text) if label_text else '',
+                    value))
+
+        transform = stats['transform']
+        metric('documents', 'gauge', 'Transformed documents',
+               [({}, transform['documents'])])
+        metric('text_nodes', 'gauge', 'Text nodes visited by the transform',
+               [({}, transform['text_nodes'])])
+        metric('searched_text_nodes', 'gauge',
+               'Text nodes searched for issue references',
+               [({}, transform['searched_text_nodes'])])
+        metric('references', 'gauge', 'Plaintext issue references',
+               [({}, transform['references'])])
+        metric('transform_seconds', 'gauge', 'Time spent in the transform',
+               [({}, transform['duration'])])
+        metric('cache_probes', 'gauge', 'Issue cache probes by result',
+               [({'result': 'hit'}, stats['cache']['hits']),
+                ({'result': 'miss'}, stats['cache']['misses'])])
+        lookups = stats['lookups']
+        metric('lookup_seconds', 'summary', 'Latency of issue lookups',
+               [({'quantile': fraction}, value) for fraction, value
+                in sorted(lookups['latency'].items())])
+        lines.append('sphinx_issuetracker_lookup_seconds_sum {0!r}'.format(
+            lookups['duration']))
+        lines.append('sphinx_issuetracker_lookup_seconds_count {0}'.format(
+            lookups['count']))
+        hosts = sorted(stats['hosts'].items())
+        host_metrics = [
+            ('requests', 'Requests to tracker hosts'),
+            ('bytes', 'Bytes received from tracker hosts'),
+            ('errors', 'Failed requests to tracker hosts'),
+            ('rate_limited', 'Rate limited lookups at tracker hosts'),
+            ('short_circuited', 'Requests not sent to unavailable hosts')]
+        for name, description in host_metrics:
+            metric(name, 'gauge', description,
+                   [({'host': host}, host_stats[name])
+                    for host, host_stats in hosts])
+        metric('request_seconds', 'gauge', 'Latency of requests',
+               [({'host': host, 'quantile': fraction}, value)
+                for host, host_stats in hosts
+                for fraction, value in sorted(host_stats['latency'].items())])
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """
+        Get a human-readable summary of all statistics as list of lines.
+        """
+        stats = self.as_dict()
+        transform = stats['transform']
+        lines = ['{references} plaintext issue references in {documents} '
+                 'documents, {searched_text_nodes} of {text_nodes} text nodes '
+                 'searched in {duration:.3f}s'.format(**transform)]
+        cache = stats['cache']
+        lookups = stats['lookups']
+        lines.append('{0} cache hits, {1} misses, {2} lookups in '
+                     '{3:.3f}s{4}'.format(
+                         cache['hits'], cache['misses'], lookups['count'],
+                         lookups['duration'],
+                         format_latency(lookups['latency'])))
+        for host, host_stats in sorted(stats['hosts'].items()):
+            lines.append(
+                '{0}: {1} requests, {2} bytes, {3} errors, {4} rate limited, '
+                '{5} short-circuited{6}'.format(
+                    host, host_stats['requests'], host_stats['bytes'],
+                    host_stats['errors'], host_stats['rate_limited'],
+                    host_stats['short_circuited'],
+                    format_latency(host_stats['latency'])))
+        return lines
+
+
+def format_latency(latency):
+    if latency[str(PERCENTILES[0])] is None:
+        return ''
+    return ' ({0})'.format(', '.join(
+        'p{0:g} {1:.0f}ms'.format(float(fraction) * 100, value * 1000)
+        for fraction, value in sorted(latency.items(),
+                                      key=lambda item: float(item[0]))))
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    sphinxcontrib.issuetracker.tracing
+    ==================================
+
+    Tracing of the work of :mod:`sphinxcontrib.issuetracker` in a build.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import os
+import json
+import threading
+from collections import namedtuple
+
+from sphinxcontrib.issuetracker.util import Transient
+
+
+Span = namedtuple('Span', 'name category start end thread args')
+
+
+class NullTracer(Transient):
+    """
+    A tracer, which doesn't record anything.
+
+    This tracer is used if tracing is disabled, to avoid any overhead.
+    """
+
+    enabled = False
+
+    def record(self, name, category, start, end, **args):
+        pass
+
+
+class Tracer(NullTracer):
+    """
+    Record spans of work in a build.
+
+    A span is a named piece of work with a category, which started and ended
+    at the given times in seconds, as returned by
+    :func:`~timeit.default_timer`, in the current thread.  Spans have
+    additional arguments, like the id of a looked up issue.
+
+    The tracer is available at ``app.env.issuetracker_tracer``, see
+    :confval:`issuetracker_trace`.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        #: All recorded spans in the order of their end
+        self.spans = []
+
+    def record(self, name, category, start, end, **args):
+        """
+        Record a span with the given ``name`` and ``category``, which started
+        at ``start`` and ended at ``end``.  ``args`` are additional arguments
+        of the span.
+        """
+        span = Span(name, category, start, end,
+                    threading.current_thread().ident, args)
+        with self._lock:
+            self.spans.append(span)
+
+    def _sorted_spans(self):
+        with self._lock:
+            return sorted(self.spans, key=lambda span: span.start)
+
+    def to_chrome_trace(self):
+        """
+        Get all spans in the Chrome trace event format as JSON, for
+        ``chrome://tracing`` and similar trace viewers.
+        """
+        pid = os.getpid()
+        events = [{'name': span.name, 'cat': span.category, 'ph': 'X',
+                   # timestamps in microseconds
+                   'ts': span.start * 1000000,
+                   'dur': (span.end - span.start) * 1000000,
+                   'pid': pid, 'tid': span.thread, 'args': span.args}
+                  for span in self._sorted_spans()]
+        return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'})
+
+    def to_ndjson(self):
+        """
+        Get all spans as newline-delimited JSON, with one object per span.
+        """
+        return ''.join(
+            json.dumps({'name': span.name, 'category': span.category,
+                        'start': span.start,
+                        'duration': span.end - span.start,
+                        'thread': span.thread, 'args': span.args},
+                       sort_keys=True) + '\n'
+            for span in self._sorted_spans())
+
+    def serialize(self, filename):
+        """
+        Get all spans in the format for a trace file with the given
+        ``filename``: Chrome trace
+        event format for names ending with ``.json``, and newline-delimited
+        JSON otherwise.
+        """
+        if filename.endswith('.json'):
+            return self.to_chrome_trace()
+        else:
+            return self.to_ndjson()
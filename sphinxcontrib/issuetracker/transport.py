@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    sphinxcontrib.issuetracker.transport
+    ====================================
+
+    Record HTTP responses of issue trackers into cassettes, and replay them
+    without network.
+
+    A cassette is a JSON file with an object, whose ``interactions`` key
+    holds a list of recorded requests.  Each request is an object with the
+    requested ``url``, and the ``status``, the ``headers`` and the ``body`` of
+    the response, and the ``duration`` of the request in seconds.  Bodies,
+    which are not UTF-8, are stored base64 encoded in ``body_base64``
+    instead.  See :confval:`issuetracker_cassette`.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import json
+import time
+import base64
+import threading
+from os import path
+from timeit import default_timer
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from sphinx.util.osutil import ensuredir
+
+from sphinxcontrib.issuetracker.util import Transient, write_file_atomically
+
+
+#: The modes of a cassette
+MODES = frozenset(['record', 'replay'])
+
+
+class UnrecordedRequest(requests.RequestException):
+    """
+    Raised if a cassette replays a request, which it didn't record.
+    """
+
+
+def encode_response(response, duration):
+    """
+    Encode ``response`` and the ``duration`` of its request as dictionary for
+    a cassette.
+    """
+    interaction = {'url': response.url, 'status': response.status_code,
+                   'headers': dict(response.headers), 'duration': duration}
+    try:
+        interaction['body'] = response.content.decode('utf-8')
+    except UnicodeDecodeError:
+        interaction['body_base64'] = base64.b64encode(
+            response.content).decode('ascii')
+    return interaction
+
+
+def decode_response(interaction):
+    """
+    Decode a :class:`~requests.Response` from an ``interaction`` of a
+    cassette.
+    """
+    response = requests.Response()
+    response.url = interaction['url']
+    response.status_code = interaction['status']
+    response.headers = CaseInsensitiveDict(interaction['headers'])
+    response.encoding = get_encoding_from_headers(response.headers)
+    if 'body_base64' in interaction:
+        response._content = base64.b64decode(interaction['body_base64'])
+    else:
+        response._content = interaction['body'].encode('utf-8')
+    return response
+
+
+class Cassette(Transient):
+    """
+    The HTTP transport of :func:`~sphinxcontrib.issuetracker.resolvers.get`.
+
+    If ``filename`` is ``None``, the cassette is disabled, and requests are
+    sent over the network.  Otherwise ``mode`` is either ``'record'`` to send
+    requests, and record their responses into the cassette file ``filename``
+    with :meth:`save`, or ``'replay'`` to replay the responses recorded in
+    this file without network.  Replayed responses take ``latency`` seconds,
+    or the duration of the recorded request, if ``latency`` is ``None``.
+
+    Raise :exc:`~exceptions.ValueError`, if ``mode`` is unknown, or if the
+    file is no cassette.  A missing file is an empty cassette.
+
+    The cassette is available at ``app.env.issuetracker_cassette``.
+    """
+
+    def __init__(self, filename=None, mode='replay', latency=None):
+        if mode not in MODES:
+            raise ValueError('unknown cassette mode: {0}'.format(mode))
+        self.filename = filename
+        self.mode = mode
+        self.latency = latency
+        #: Whether a cassette is used
+        self.enabled = filename is not None
+        #: Whether responses were recorded since the cassette was loaded
+        self.dirty = False
+        self._lock = threading.Lock()
+        self._interactions = {}
+        if filename is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.filename, 'rb') as source:
+                cassette = json.loads(source.read().decode('utf-8'))
+        except EnvironmentError:
+            return
+        try:
+            interactions = cassette['interactions']
+        except (TypeError, KeyError):
+            raise ValueError('{0} is no cassette'.format(self.filename))
+        for interaction in interactions:
+            self._interactions[interaction['url']] = interaction
+
+    def __len__(self):
+        return len(self._interactions)
+
+    def get(self, url, headers):
+        """
+        Get a response for the given ``url``, sending the given ``headers``.
+
+        Return a :class:`~requests.Response` object.  Raise
+        :exc:`UnrecordedRequest`, if a replaying cassette didn't record
+        ``url``.
+        """
+        if not self.enabled:
+            return requests.get(url, headers=headers)
+        if self.mode == 'replay':
+            try:
+                interaction = self._interactions[url]
+            except KeyError:
+                raise UnrecordedRequest('{0} not recorded in {1}'.format(
+                    url, self.filename))
+            latency = self.latency
+            if latency is None:
+                latency = interaction['duration']
+            time.sleep(latency)
+            return decode_response(interaction)
+        start = default_timer()
+        response = requests.get(url, headers=headers)
+        interaction = encode_response(response, default_timer() - start)
+        # key the interaction by the requested url, which differs from the
+        # url of the response after redirects
+        interaction['url'] = url
+        with self._lock:
+            self._interactions[url] = interaction
+            self.dirty = True
+        return response
+
+    def save(self):
+        """
+        Write all recorded responses to the cassette file, if responses were
+        recorded.
+        """
+        if not self.dirty:
+            return
+        with self._lock:
+            interactions = [self._interactions[url]
+                            for url in sorted(self._interactions)]
+            self.dirty = False
+        ensuredir(path.dirname(self.filename))
+        write_file_atomically(self.filename, json.dumps(
+            {'interactions': interactions}, indent=2, sort_keys=True))
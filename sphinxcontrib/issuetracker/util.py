@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    sphinxcontrib.issuetracker.util
+    ===============================
+
+    Utilities for :mod:`sphinxcontrib.issuetracker`.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+
+
+class Transient(object):
+    """
+    Base class for objects, which only live for a single build.
+
+    Such objects are stored in the environment to make them available to
+    transforms, which have no access to the application.  Pickling the
+    environment doesn't pickle their state: Unpickling creates a new instance
+    without arguments instead.
+    """
+
+    def __reduce__(self):
+        return (self.__class__, ())
+
+
+def write_file_atomically(filename, contents):
+    """
+    Write ``contents`` (a string or bytes) to the file ``filename``.
+
+    The contents are written to a temporary file in the same directory first,
+    which then replaces ``filename``, so that readers never see a partially
+    written file.
+    """
+    if not isinstance(contents, bytes):
+        contents = contents.encode('utf-8')
+    # a temporary file per process and thread, so that concurrent writers
+    # don't clobber each other's temporary file
+    temporary_filename = '{0}.{1}.{2}.tmp'.format(
+        filename, os.getpid(), threading.current_thread().ident)
+    try:
+        with open(temporary_filename, 'wb') as stream:
+            stream.write(contents)
+        if os.name == 'nt' and os.path.exists(filename):
+            # rename doesn't replace existing files on Windows
+            os.remove(filename)
+        os.rename(temporary_filename, filename)
+    except Exception:
+        if os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+        raise
+
+
+@contextmanager
+def locked_file(filename):
+    """
+    Hold an exclusive lock on the lock file ``filename`` in the ``with``
+    block, which waits for other processes holding the lock.
+
+    The lock is advisory, and only excludes other processes, which lock the
+    same file.  On platforms without :mod:`fcntl` nothing is locked.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(filename, 'ab') as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+    sphinxcontrib.issuetracker.webhooks
+    ===================================
+
+    Update the issue cache from webhook payloads of issue trackers.
+
+    Issue trackers send webhook payloads, when issues change.  This module
+    applies the state, title and url of issues in such payloads to the issue
+    cache of a Sphinx project, so that builds pick up changed issues without
+    looking them up again.  Only issues, which are already cached, are
+    updated.  Changed issues are marked as changed in the cache, so the next
+    build rebuilds all documents referencing them.
+
+    Apply payloads from files (each file either contains a single JSON
+    payload, or one JSON payload per line) to the cache in
+    :file:`doc/_build/doctrees`::
+
+       python -m sphinxcontrib.issuetracker.webhooks doc/_build/doctrees \\
+           payload.json
+
+    Or receive payloads as HTTP POST requests on port 8000, and apply them to
+    the cache as they arrive::
+
+       python -m sphinxcontrib.issuetracker.webhooks --serve 8000 \\
+           doc/_build/doctrees
+
+    The cache file is locked, loaded and saved for each payload, so builds
+    and the server can use the cache at the same time.  With ``--secret``
+    (or the environment variable ``ISSUETRACKER_WEBHOOK_SECRET``), the
+    server only accepts payloads signed with this secret in the
+    ``X-Hub-Signature-256`` header, like Github signs payloads.
+
+    Github, BitBucket, Jira and Redmine (with the ``redmine_webhook`` plugin)
+    payloads are supported.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import os
+import sys
+import hmac
+import json
+import hashlib
+import threading
+from collections import namedtuple
+from optparse import OptionParser
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from sphinxcontrib.issuetracker import Issue, text_type
+from sphinxcontrib.issuetracker.cache import IssueCache
+
+
+#: An issue in a webhook payload, with the name of the project it belongs to.
+IssueUpdate = namedtuple('IssueUpdate', 'project issue')
+
+
+def parse_github_payload(payload):
+    issue = payload['issue']
+    issue_id = text_type(issue['number'])
+    return IssueUpdate(
+        payload['repository']['full_name'],
+        Issue(id=issue_id, title=issue['title'],
+              closed=issue['state'] == 'closed', url=issue['html_url']))
+
+
+def parse_bitbucket_payload(payload):
+    issue = payload['issue']
+    issue_id = text_type(issue['id'])
+    return IssueUpdate(
+        payload['repository']['full_name'],
+        Issue(id=issue_id, title=issue['title'],
+              closed=issue['state'] not in ('new', 'open'),
+              url=issue['links']['html']['href']))
+
+
+def parse_jira_payload(payload):
+    issue = payload['issue']
+    fields = issue['fields']
+    # the payload only has the REST url of the issue
+    base_url = issue['self'].split('/rest/', 1)[0]
+    return IssueUpdate(
+        fields['project']['name'],
+        Issue(id=issue['key'], title=fields['summary'],
+              closed=fields.get('resolution') is not None,
+              url='{0}/browse/{1}'.format(base_url, issue['key'])))
+
+
+def parse_redmine_payload(payload):
+    payload = payload['payload']
+    issue = payload['issue']
+    status = issue['status']
+    closed = status.get('is_closed', status.get('name') == 'Closed')
+    return IssueUpdate(
+        issue['project']['name'],
+        Issue(id=text_type(issue['id']), title=issue['subject'],
+              closed=bool(closed), url=payload['url']))
+
+
+def parse_payload(payload):
+    """
+    Parse a webhook ``payload``.
+
+    ``payload`` is a JSON payload of a webhook as dictionary.  Return the
+    :class:`IssueUpdate` in the payload.  Raise
+    :exc:`~exceptions.ValueError`, if the payload has an unknown format.
+    """
+    try:
+        if 'webhookEvent' in payload:
+            return parse_jira_payload(payload)
+        elif 'payload' in payload:
+            return parse_redmine_payload(payload)
+        elif 'html_url' in payload.get('issue', {}):
+            return parse_github_payload(payload)
+        elif 'links' in payload.get('issue', {}):
+            return parse_bitbucket_payload(payload)
+    except (KeyError, TypeError) as error:
+        raise ValueError('invalid webhook payload: {0!r}'.format(error))
+    raise ValueError('unknown webhook payload')
+
+
+def load_payloads(source):
+    """
+    Load webhook payloads from the file object ``source``.
+
+    The file either contains a single JSON payload, or one JSON payload per
+    line.  Return a list of all payloads.
+    """
+    contents = source.read()
+    if isinstance(contents, bytes):
+        contents = contents.decode('utf-8')
+    try:
+        return [json.loads(contents)]
+    except ValueError:
+        return [json.loads(line) for line in contents.splitlines()
+                if line.strip()]
+
+
+def apply_updates(cache, updates, project=None):
+    """
+    Apply issue ``updates`` to the issue ``cache``.
+
+    ``cache`` is an :class:`~sphinxcontrib.issuetracker.cache.IssueCache`,
+    ``updates`` an iterable of :class:`IssueUpdate` objects.  If ``project``
+    is not ``None``, only updates of this project are applied.  Updates of
+    issues, which are not cached or which were cached as missing, are
+    ignored.
+
+    Return a list of the ids of all issues, which changed.
+    """
+    changed = []
+    for update in updates:
+        if project is not None and update.project != project:
+            continue
+        issue = update.issue
+        cached_issue = cache.get(issue.id)
+        if cached_issue is None:
+            continue
+        if cached_issue != issue:
+            cache[issue.id] = issue
+            changed.append(issue.id)
+    return changed
+
+
+def _compare_digest(a, b):
+    """
+    Compare the byte strings ``a`` and ``b`` in constant time, for Python
+    versions without :func:`hmac.compare_digest` (2.6 and 3.2).
+    """
+    if len(a) != len(b):
+        return False
+    result = 0
+    for x, y in zip(bytearray(a), bytearray(b)):
+        result |= x ^ y
+    return result == 0
+
+
+compare_digest = getattr(hmac, 'compare_digest', _compare_digest)
+
+
+def sign_payload(secret, body):
+    """
+    Sign the raw ``body`` of a webhook request with ``secret`` like Github.
+
+    Return the value of the ``X-Hub-Signature-256`` header.
+    """
+    digest = hmac.new(secret.encode('utf-8'), body, hashlib.sha256)
+    return 'sha256=' + digest.hexdigest()
+
+
+def verify_signature(secret, body, signature):
+    """
+    Check the ``signature`` of the raw ``body`` of a webhook request, as given
+    in the ``X-Hub-Signature-256`` header, against ``secret``.
+
+    Return ``True``, if the signature is valid, or ``False`` otherwise, or if
+    ``signature`` is ``None``.
+    """
+    if not signature:
+        return False
+    expected = sign_payload(secret, body)
+    # compare in constant time to not leak the signature
+    return compare_digest(expected.encode('utf-8'),
+                          signature.encode('utf-8'))
+
+
+class WebhookServer(HTTPServer):
+    """
+    A HTTP server, which applies webhook payloads sent as POST requests to an
+    issue ``cache``.
+
+    For each payload, the cache is loaded from its file again, and saved after
+    the update, while holding the lock of the cache file, see
+    :meth:`~sphinxcontrib.issuetracker.cache.IssueCache.transaction`.  If
+    ``secret`` is not ``None``, only payloads with a valid signature are
+    applied, see :func:`verify_signature`.
+    """
+
+    def __init__(self, address, cache, project=None, secret=None):
+        HTTPServer.__init__(self, address, WebhookHandler)
+        self.cache = cache
+        self.project = project
+        self.secret = secret
+        self.lock = threading.Lock()
+
+    def apply_payload(self, payload):
+        update = parse_payload(payload)
+        with self.lock:
+            with self.cache.transaction() as cache:
+                return apply_updates(cache, [update], self.project)
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of :class:`WebhookServer`.
+    """
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        secret = self.server.secret
+        if secret is not None and not verify_signature(
+                secret, body, self.headers.get('X-Hub-Signature-256')):
+            self.send_error(403, 'invalid signature')
+            return
+        try:
+            payload = json.loads(body.decode('utf-8'))
+            self.server.apply_payload(payload)
+        except ValueError as error:
+            self.send_error(400, text_type(error))
+        else:
+            self.send_response(204)
+            self.end_headers()
+
+
+def main():
+    parser = OptionParser(usage='%prog [options] DOCTREEDIR [PAYLOAD ...]')
+    parser.add_option('-p', '--project',
+                      help='Only apply updates of issues in PROJECT')
+    parser.add_option('-s', '--serve', type='int', metavar='PORT',
+                      help='Receive payloads as HTTP POST requests on PORT')
+    parser.add_option('-b', '--bind', default='127.0.0.1',
+                      help='Bind the server to ADDRESS [%default]',
+                      metavar='ADDRESS')
+    parser.add_option('--secret',
+                      default=os.environ.get('ISSUETRACKER_WEBHOOK_SECRET'),
+                      help='Only accept payloads signed with SECRET '
+                      '[$ISSUETRACKER_WEBHOOK_SECRET]')
+    options, args = parser.parse_args()
+    if not args:
+        parser.error('doctree directory missing')
+    cache = IssueCache.in_directory(args[0])
+    if options.serve:
+        if len(args) > 1:
+            parser.error('payload files cannot be used with --serve')
+        server = WebhookServer((options.bind, options.serve), cache,
+                               options.project, options.secret)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+    updates = []
+    for filename in args[1:] or ['-']:
+        if filename == '-':
+            payloads = load_payloads(sys.stdin)
+        else:
+            with open(filename, 'rb') as source:
+                payloads = load_payloads(source)
+        updates.extend(parse_payload(payload) for payload in payloads)
+    with cache.transaction():
+        changed = apply_updates(cache, updates, options.project)
+    for issue_id in changed:
+        print('{0} changed'.format(issue_id))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -26,6 +26,8 @@
 from __future__ import (print_function, division, unicode_literals,
                         absolute_import)
 
+import re
+
 import pytest
 from mock import Mock
 from docutils import nodes
@@ -116,12 +118,16 @@ def pytest_namespace():
 
 def pytest_addoption(parser):
     """
-    Add --offline and --fast options to test runner.
+    Add --offline, --fast and --record options to test runner.
     """
     parser.addoption('--offline', action='store_true',
-                     help='Skip tests which require network connection')
+                     help='Skip tests which require network connection, '
+                     'or replay their cassettes')
     parser.addoption('--fast', action='store_true',
                      help='Skip slow tests, implies --offline')
+    parser.addoption('--record', action='store_true',
+                     help='Record the responses of tests which require '
+                     'network connection into cassettes')
 
 
 def pytest_configure(config):
@@ -133,14 +139,35 @@ def pytest_configure(config):
     """
     config.run_fast = config.getvalue('fast')
     config.run_offline = config.run_fast or config.getvalue('offline')
+    config.record = config.getvalue('record')
+
+
+def get_cassette(item):
+    """
+    Get the path of the cassette of the test ``item``.
+
+    Cassettes of tests are stored in the ``cassettes`` directory next to the
+    test module, in a subdirectory named after the test module.
+    """
+    names = [name for name in item.nodeid.split('::')[1:] if name != '()']
+    filename = re.sub(r'[^\w.-]+', '_', '-'.join(names)) + '.json'
+    return item.fspath.dirpath().join(
+        'cassettes', item.fspath.purebasename, filename)
 
 
 def pytest_runtest_setup(item):
     """
     Evaluate ``needs_network`` and ``slow`` markers with respect to
-    ``--offline`` and ``--fast``
+    ``--offline`` and ``--fast``.  Network tests with a cassette run in
+    offline mode, too, and replay the cassette.
+
+    In offline mode, network tests of test classes with a true ``cassettes``
+    attribute must have a cassette, and fail without one.
     """
-    if item.config.run_offline and 'needs_network' in item.keywords:
+    if ('needs_network' in item.keywords and item.config.run_offline and
+            not item.config.record and not get_cassette(item).check()):
+        if getattr(item.cls, 'cassettes', False):
+            pytest.fail('cassette {0} missing'.format(get_cassette(item)))
         pytest.skip('network test in offline mode')
     if item.config.run_fast and 'slow' in item.keywords:
         pytest.skip('skipping slow test in fast mode')
@@ -281,6 +308,15 @@ def pytest_funcarg__confoverrides(request):
     return confoverrides_marker.kwargs if confoverrides_marker else {}
 
 
+def pytest_funcarg__buildername(request):
+    """
+    The name of the builder of the app.
+
+    Test modules may override this funcarg to use another builder.
+    """
+    return 'html'
+
+
 def pytest_funcarg__app(request):
     """
     A Sphinx application for testing.
@@ -297,13 +333,29 @@ def pytest_funcarg__app(request):
     If the marker ``build_app`` is attached to the current test, the app is
     build before returning it.  Otherwise you need to build explicitly in order
     to get the output.
+
+    If the marker ``needs_network`` is attached to the current test, the app
+    replays the responses in the cassette of the test in offline mode, if the
+    cassette exists, or records them into the cassette with ``--record``.
+    Otherwise the app sends real requests.
     """
     srcdir = request.getfuncargvalue('srcdir')
     outdir = request.getfuncargvalue('outdir')
     doctreedir = request.getfuncargvalue('doctreedir')
     confoverrides = request.getfuncargvalue('confoverrides')
+    if 'needs_network' in request.keywords:
+        cassette = get_cassette(request.node)
+        if request.config.record:
+            confoverrides = dict(confoverrides,
+                                 issuetracker_cassette=str(cassette),
+                                 issuetracker_cassette_mode='record')
+        elif request.config.run_offline and cassette.check():
+            confoverrides = dict(confoverrides,
+                                 issuetracker_cassette=str(cassette),
+                                 issuetracker_cassette_latency=0)
+    buildername = request.getfuncargvalue('buildername')
     app = Sphinx(str(srcdir), str(srcdir), str(outdir), str(doctreedir),
-                 'html', confoverrides=confoverrides, status=None,
+                 buildername, confoverrides=confoverrides, status=None,
                  warning=None, freshenv=True)
     request.addfinalizer(reset_global_state)
     if 'mock_lookup' in request.keywords:
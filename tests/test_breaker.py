@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    test_breaker
+    ============
+
+    Test the circuit breaker of issue tracker hosts.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import pytest
+import requests
+
+from mock import Mock
+
+from sphinxcontrib import issuetracker
+from sphinxcontrib.issuetracker import TrackerConfig, resolvers
+from sphinxcontrib.issuetracker.breaker import CircuitBreaker
+
+
+HOST = 'api.github.com'
+
+
+def pytest_funcarg__clock(request):
+    """
+    A fake clock for the ``breaker``, which returns 0 until changed.
+    """
+    return Mock(return_value=0)
+
+
+def pytest_funcarg__breaker(request):
+    """
+    A circuit breaker, which opens after 3 failures for 10 seconds.
+    """
+    breaker = CircuitBreaker()
+    breaker.configure(3, 10)
+    breaker.clock = request.getfuncargvalue('clock')
+    return breaker
+
+
+def test_opens_after_threshold(breaker):
+    """
+    Test that the circuit of a host opens after consecutive failures.
+    """
+    assert not breaker.record_failure(HOST)
+    assert not breaker.record_failure(HOST)
+    assert breaker.allow(HOST)
+    assert breaker.record_failure(HOST)
+    assert not breaker.allow(HOST)
+    assert breaker.allow('bitbucket.org')
+    assert breaker.opened == set([HOST])
+
+
+def test_success_resets_failures(breaker):
+    """
+    Test that a successful request resets the failures of a host.
+    """
+    breaker.record_failure(HOST)
+    breaker.record_failure(HOST)
+    breaker.record_success(HOST)
+    assert not breaker.record_failure(HOST)
+    assert breaker.allow(HOST)
+
+
+def test_half_open(breaker, clock):
+    """
+    Test that a single probe is sent after the cool-down, which closes
+    or opens the circuit again.
+    """
+    for _ in range(3):
+        breaker.record_failure(HOST)
+    clock.return_value = 9
+    assert not breaker.allow(HOST)
+    clock.return_value = 10
+    # only a single probe is sent
+    assert breaker.allow(HOST)
+    assert not breaker.allow(HOST)
+    # a failed probe opens the circuit again, but only the first opening is
+    # reported
+    assert not breaker.record_failure(HOST)
+    assert not breaker.allow(HOST)
+    clock.return_value = 20
+    assert breaker.allow(HOST)
+    breaker.record_success(HOST)
+    assert breaker.allow(HOST)
+    assert breaker.allow(HOST)
+
+
+def test_cancel_probe(breaker, clock):
+    """
+    Test that a cancelled probe lets the next request probe the host.
+    """
+    for _ in range(3):
+        breaker.record_failure(HOST)
+    clock.return_value = 10
+    assert breaker.allow(HOST)
+    assert not breaker.allow(HOST)
+    breaker.cancel(HOST)
+    assert breaker.allow(HOST)
+
+
+def test_open_for_rest_of_build(breaker, clock):
+    """
+    Test that a circuit without cool-down stays open.
+    """
+    breaker.configure(1, None)
+    breaker.record_failure(HOST)
+    clock.return_value = 1000000
+    assert not breaker.allow(HOST)
+
+
+def test_disabled():
+    """
+    Test that a disabled breaker allows all requests.
+    """
+    breaker = CircuitBreaker()
+    assert not breaker.enabled
+    for _ in range(10):
+        assert not breaker.record_failure(HOST)
+    assert breaker.allow(HOST)
+
+
+@pytest.mark.with_content('dummy content')
+@pytest.mark.confoverrides(issuetracker='github',
+                           issuetracker_project='foo/bar',
+                           issuetracker_circuit_breaker=2)
+def test_unavailable_tracker(app, monkeypatch):
+    """
+    Test that lookups fail fast once the tracker is unavailable, and that
+    the issues are not cached.
+    """
+    get = Mock(side_effect=requests.ConnectionError('connection refused'))
+    monkeypatch.setattr(resolvers.requests, 'get', get)
+    monkeypatch.setattr(app, 'warn', Mock())
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    issues = issuetracker.lookup_issue_ids(
+        app, tracker_config, ['10', '11', '12', '13'])
+    assert issues == {'10': None, '11': None, '12': None, '13': None}
+    assert get.call_count == 2
+    assert app.env.issuetracker_cache == {}
+    # only the opened circuit is warned about
+    assert app.warn.call_count == 1
+    message = app.warn.call_args[0][0]
+    assert message.startswith(
+        'api.github.com failed 2 times in a row, not sending requests to it '
+        'for 60 seconds, last failure: GET https://api.github.com/')
+    assert message.endswith('failed: connection refused')
+    stats = app.env.issuetracker_stats.as_dict()['hosts'][HOST]
+    assert stats['errors'] == 2
+    assert stats['short_circuited'] == 2
+    # unavailable issues are not looked up again in the same build
+    issuetracker.lookup_issue_ids(app, tracker_config, ['10', '14'])
+    stats = app.env.issuetracker_stats.as_dict()['hosts'][HOST]
+    assert stats['short_circuited'] == 3
+    issuetracker.report_failures(app, None)
+    assert app.warn.call_count == 1
+
+
+@pytest.mark.with_content('dummy content')
+@pytest.mark.confoverrides(issuetracker='github',
+                           issuetracker_project='foo/bar',
+                           issuetracker_circuit_breaker=1,
+                           issuetracker_circuit_cooldown=10)
+def test_probe_refused_by_rate_limit(app, monkeypatch):
+    """
+    Test that a probe, which the exhausted rate limit refused, doesn't keep
+    the circuit open.
+    """
+    breaker = app.env.issuetracker_breaker
+    breaker.clock = Mock(return_value=0)
+    breaker.record_failure(HOST)
+    breaker.clock.return_value = 10
+    monkeypatch.setattr(resolvers, 'acquire_request', Mock(return_value=False))
+    monkeypatch.setattr(app, 'warn', Mock())
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    assert issuetracker.lookup_issue(app, tracker_config, '10') is None
+    assert breaker.allow(HOST)
+
+
+@pytest.mark.with_content('dummy content')
+@pytest.mark.confoverrides(issuetracker='github',
+                           issuetracker_project='foo/bar')
+def test_server_error_not_cached(app, monkeypatch):
+    """
+    Test that issues are not cached, if the tracker responds with a
+    server error, and that the failure is warned about at the end of the
+    build.
+    """
+    response = Mock(status_code=503, content=b'', headers={},
+                    url='https://api.github.com/repos/foo/bar/issues/10')
+    monkeypatch.setattr(resolvers.requests, 'get',
+                        Mock(return_value=response))
+    monkeypatch.setattr(app, 'warn', Mock())
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    assert issuetracker.lookup_issue(app, tracker_config, '10') is None
+    assert app.env.issuetracker_cache == {}
+    assert not app.warn.called
+    issuetracker.report_failures(app, None)
+    app.warn.assert_called_once_with(
+        'requests to api.github.com failed 1 times, last failure: '
+        'GET https://api.github.com/repos/foo/bar/issues/10 failed with code '
+        '503')
+
+
+@pytest.mark.with_content('dummy content')
+@pytest.mark.confoverrides(issuetracker='github',
+                           issuetracker_project='foo/bar',
+                           issuetracker_circuit_breaker=0)
+def test_warn_each_failure_without_breaker(app, monkeypatch):
+    """
+    Test that each failure is warned about, if the circuit breaker is
+    disabled.
+    """
+    response = Mock(status_code=503, content=b'', headers={},
+                    url='https://api.github.com/repos/foo/bar/issues/10')
+    monkeypatch.setattr(resolvers.requests, 'get',
+                        Mock(return_value=response))
+    monkeypatch.setattr(app, 'warn', Mock())
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    assert issuetracker.lookup_issue(app, tracker_config, '10') is None
+    app.warn.assert_called_once_with(
+        'GET https://api.github.com/repos/foo/bar/issues/10 failed with code '
+        '503')
+    issuetracker.report_failures(app, None)
+    assert app.warn.call_count == 1
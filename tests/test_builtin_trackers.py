@@ -38,6 +38,8 @@
 from __future__ import (print_function, division, unicode_literals,
                         absolute_import)
 
+import re
+
 import pytest
 
 from sphinxcontrib.issuetracker import Issue, TrackerConfig
@@ -196,6 +198,13 @@ class TrackerTest(object):
     #: confoverrides to use for tests defined in this class
     confoverrides = {}
 
+    #: whether the lookups of this class are replayed in offline mode from the
+    #: cassettes in ``cassettes/test_builtin_trackers``, which must exist.
+    #: These cassettes are synthetic: They were written by hand after the
+    #: documented responses of the trackers, and not recorded from the real
+    #: trackers, which online runs still test.
+    cassettes = False
+
     @pytest.mark.needs_network
     def test_lookup(self, cache, issue_id, issue):
         """
@@ -227,6 +236,8 @@ def test_project_missing_username(self, app):
 
 class TestBitBucket(ScopedProjectTrackerTest):
 
+    cassettes = True
+
     name = 'bitbucket'
 
     default_tracker_config = TrackerConfig('birkenfeld/sphinx')
@@ -248,6 +259,8 @@ class TestBitBucket(ScopedProjectTrackerTest):
 
 class TestGitHub(ScopedProjectTrackerTest):
 
+    cassettes = True
+
     name = 'github'
 
     default_tracker_config = TrackerConfig('lunaryorn/pyudev')
@@ -325,6 +338,8 @@ class TestLaunchpad(TrackerTest):
 
 class TestJira(TrackerTest):
 
+    cassettes = True
+
     name = 'jira'
 
     issues = {
@@ -338,7 +353,8 @@ class TestJira(TrackerTest):
         'open': TrackerConfig('Pyogp', 'https://jira.secondlife.com'),
     }
 
-    confoverrides = dict(issuetracker_issue_pattern=r'#([A-Z]+-\d+)')
+    confoverrides = dict(
+        issuetracker_issue_pattern=re.compile(r'#([A-Z]+-\d+)'))
 
     @pytest.mark.with_content('#FOO-15')
     def test_no_url(self, app):
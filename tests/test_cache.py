@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    test_cache
+    ==========
+
+    Test the persistent issue cache.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import pickle
+
+import pytest
+
+from sphinxcontrib.issuetracker import Issue
+from sphinxcontrib.issuetracker.cache import IssueCache, InFlightLookups
+
+
+def pytest_funcarg__content(request):
+    """
+    Dummy content for this test module, overrides the global ``content``
+    funcarg.
+    """
+    return 'dummy content'
+
+
+def pytest_funcarg__issue(request):
+    return Issue(id='10', title='Eggs', closed=False, url='eggs')
+
+
+def pytest_funcarg__cache_file(request):
+    """
+    The path of the cache file for the current test.
+    """
+    tmpdir = request.getfuncargvalue('tmpdir')
+    return tmpdir.join('cache.pickle')
+
+
+def test_missing_cache_file(cache_file):
+    """
+    Test that a cache without cache file is empty and unmodified.
+    """
+    cache = IssueCache(str(cache_file))
+    assert cache == {}
+    assert not cache.dirty
+
+
+def test_save_and_load(cache_file, issue):
+    """
+    Test that a saved cache is loaded back from its file.
+    """
+    cache = IssueCache(str(cache_file))
+    cache['10'] = issue
+    cache['11'] = None
+    assert cache.dirty
+    cache.save()
+    assert not cache.dirty
+    assert IssueCache(str(cache_file)) == {'10': issue, '11': None}
+
+
+def test_save_atomically(cache_file, issue, monkeypatch):
+    """
+    Test that a failed save leaves the previous cache file intact, and no
+    temporary files behind.
+    """
+    cache = IssueCache(str(cache_file))
+    cache['10'] = issue
+    cache.save()
+    cache['11'] = None
+
+    def dumps(*args):
+        raise pickle.PicklingError('spam')
+    monkeypatch.setattr(pickle, 'dumps', dumps)
+    with pytest.raises(pickle.PicklingError):
+        cache.save()
+    monkeypatch.undo()
+    assert IssueCache(str(cache_file)) == {'10': issue}
+    assert not cache_file.dirpath().listdir('*.tmp')
+
+
+def test_transaction(cache_file, issue):
+    """
+    Test that a transaction loads the cache file again, and saves the cache
+    afterwards.
+    """
+    cache = IssueCache(str(cache_file))
+    cache['10'] = issue
+    cache.save()
+    other = IssueCache(str(cache_file))
+    other['11'] = None
+    other.save()
+    with cache.transaction():
+        cache['10'] = issue._replace(closed=True)
+    assert IssueCache(str(cache_file)) == {
+        '10': issue._replace(closed=True), '11': None}
+
+
+def test_save_keeps_changes_of_other_process(cache_file, issue):
+    """
+    Test that saving the cache keeps issues, which were changed in the cache
+    file since the cache was loaded, unless they were removed or changed in
+    this cache, too.
+    """
+    cache = IssueCache(str(cache_file))
+    cache.update({'10': issue, '11': issue._replace(id='11'), '12': None})
+    cache.save()
+    cache = IssueCache(str(cache_file))
+    cache['12'] = issue._replace(id='12')
+    with IssueCache(str(cache_file)).transaction() as other:
+        other['10'] = issue._replace(closed=True)
+        other['11'] = issue._replace(id='11', closed=True)
+        other['12'] = None
+    del cache['11']
+    cache.save()
+    assert IssueCache(str(cache_file)) == {
+        '10': issue._replace(closed=True), '12': issue._replace(id='12')}
+
+
+def test_save_only_if_dirty(cache_file, issue):
+    """
+    Test that an unmodified cache doesn't write its file.
+    """
+    cache = IssueCache(str(cache_file))
+    assert cache == {}
+    cache.save()
+    assert not cache_file.check()
+
+
+def test_lazy_loading(cache_file, issue):
+    """
+    Test that the cache file is only read on first access.
+    """
+    cache = IssueCache(str(cache_file))
+    cache['10'] = issue
+    cache.save()
+    other = IssueCache(str(cache_file))
+    cache_file.remove()
+    assert other == {}
+
+
+def test_broken_cache_file(cache_file):
+    """
+    Test that a broken cache file results in an empty cache.
+    """
+    cache_file.write('spam')
+    assert IssueCache(str(cache_file)) == {}
+
+
+def test_pickle_only_handle(cache_file, issue):
+    """
+    Test that pickling a cache only pickles the file name, and not the issues.
+    """
+    cache = IssueCache(str(cache_file))
+    cache['10'] = issue
+    cache.save()
+    data = pickle.dumps(cache)
+    assert b'Eggs' not in data
+    unpickled = pickle.loads(data)
+    assert unpickled.filename == cache.filename
+    assert unpickled == {'10': issue}
+
+
+def test_in_directory(tmpdir):
+    """
+    Test that the cache file is placed in the given directory.
+    """
+    cache = IssueCache.in_directory(str(tmpdir))
+    assert cache.filename == str(tmpdir.join('issuetracker_cache.pickle'))
+
+
+def test_cache_in_environment(app):
+    """
+    Test that the environment contains the cache, stored in the doctree
+    directory.
+    """
+    cache = app.env.issuetracker_cache
+    assert isinstance(cache, IssueCache)
+    assert cache.filename == IssueCache.in_directory(app.doctreedir).filename
+
+
+def test_changed_issues(cache_file, issue):
+    """
+    Test that replacing a cached issue with a different issue records the
+    issue as changed.
+    """
+    cache = IssueCache(str(cache_file))
+    cache['10'] = issue
+    cache['11'] = None
+    assert not cache.changed
+    cache['10'] = issue
+    assert not cache.changed
+    cache['10'] = issue._replace(closed=True)
+    assert cache.changed == set(['10'])
+    cache.save()
+    assert IssueCache(str(cache_file)).changed == set(['10'])
+
+
+def test_pop_changed(cache_file, issue):
+    """
+    Test that popping changed issues resets the changed issues.
+    """
+    cache = IssueCache(str(cache_file))
+    cache['10'] = issue
+    cache['10'] = None
+    cache.save()
+    assert cache.pop_changed() == set(['10'])
+    assert cache.dirty
+    assert not cache.changed
+
+
+def test_inflight_lookups():
+    """
+    Test that lookups in progress are only claimed once.
+    """
+    inflight = InFlightLookups()
+    claimed, pending = inflight.claim(['10', '11'])
+    assert claimed == ['10', '11']
+    assert pending == []
+    claimed, pending = inflight.claim(['11', '12'])
+    assert claimed == ['12']
+    assert len(pending) == 1
+    event = pending[0]
+    assert not event.is_set()
+    inflight.release(['10', '11'])
+    assert event.is_set()
+    # released lookups can be claimed again
+    claimed, pending = inflight.claim(['11'])
+    assert claimed == ['11']
+
+
+def test_sync_times(cache_file):
+    """
+    Test that the times of refreshes are stored in the cache file.
+    """
+    cache = IssueCache(str(cache_file))
+    assert cache.sync_times == {}
+    cache.set_sync_time(('github', 'foo/bar', None), 10)
+    assert cache.dirty
+    cache.save()
+    cache = IssueCache(str(cache_file))
+    assert cache.sync_times == {('github', 'foo/bar', None): 10}
+
+
+def test_evict_least_recently_used(cache_file, issue):
+    """
+    Test that a full cache evicts the issues, which were used least
+    recently.
+    """
+    cache = IssueCache(str(cache_file))
+    cache.limit(2)
+    cache.update({'10': issue, '11': None, '12': None})
+    cache.touch(['10', '11', '12'])
+    cache.save()
+    # a later build only uses some issues
+    cache = IssueCache(str(cache_file))
+    cache.limit(2)
+    cache.touch(['12', '10', '13'])
+    assert cache.evict() == ['11']
+    assert cache == {'10': issue, '12': None}
+    assert set(cache.usage) == set(['10', '12'])
+    assert cache.evict() == []
+
+
+def test_evict_least_frequently_used(cache_file, issue):
+    """
+    Test that the LFU policy evicts the issues, which were used least
+    often.
+    """
+    cache = IssueCache(str(cache_file))
+    cache.limit(1, 'lfu')
+    cache.update({'10': issue, '11': None})
+    cache.touch(['10', '11'])
+    cache.touch(['10'])
+    cache.touch(['10'])
+    cache.save()
+    cache = IssueCache(str(cache_file))
+    cache.limit(1, 'lfu')
+    cache.touch(['11'])
+    assert cache.evict() == ['11']
+    assert cache == {'10': issue}
+
+
+def test_unlimited_cache(cache_file, issue):
+    """
+    Test that an unlimited cache neither tracks usage nor evicts issues.
+    """
+    cache = IssueCache(str(cache_file))
+    cache['10'] = issue
+    cache.save()
+    cache.touch(['10'])
+    assert not cache.dirty
+    assert cache.usage == {}
+    assert cache.evict() == []
+    with pytest.raises(ValueError):
+        cache.limit(10, 'random')
+
+
+def test_prune(cache_file, issue):
+    cache = IssueCache(str(cache_file))
+    cache.update({'10': issue, '11': None, '12': None})
+    assert sorted(cache.prune(set(['10', '12', '13']))) == ['11']
+    assert cache == {'10': issue, '12': None}
+
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    test_check
+    ==========
+
+    Test the ``issuetracker-check`` builder.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import json
+
+import pytest
+
+from sphinxcontrib.issuetracker.breaker import TrackerUnavailable
+
+
+def pytest_funcarg__buildername(request):
+    """
+    Build with the ``issuetracker-check`` builder.
+    """
+    return 'issuetracker-check'
+
+
+def pytest_funcarg__report(request):
+    """
+    The report written by building the ``app``.
+    """
+    app = request.getfuncargvalue('app')
+    app.build()
+    outdir = request.getfuncargvalue('outdir')
+    return json.loads(outdir.join('issues.json').read())
+
+
+@pytest.mark.mock_lookup
+@pytest.mark.with_content('#10 and #11, and again #10')
+@pytest.mark.with_issue(id='10', title='Eggs', closed=True, url='eggs')
+def test_report(app, report, outdir):
+    """
+    Test that the report lists each referenced issue once with its status
+    and referencing documents, and that no pages are written.
+    """
+    assert report == {
+        'issues': [
+            {'project': 'issuetracker-test', 'id': '10', 'status': 'closed',
+             'title': 'Eggs', 'url': 'eggs', 'documents': ['index']},
+            {'project': 'issuetracker-test', 'id': '11', 'status': 'missing',
+             'title': None, 'url': None, 'documents': ['index']}],
+        'counts': {'open': 0, 'closed': 1, 'missing': 1,
+                   'unavailable': 0}}
+    # the missing issue fails the build
+    assert app.statuscode == 1
+    assert not outdir.join('index.html').check()
+
+
+@pytest.mark.mock_lookup
+@pytest.mark.with_content('#10')
+@pytest.mark.with_issue(id='10', title='Eggs', closed=True, url='eggs')
+def test_closed_issues_pass(app, report):
+    """
+    Test that closed issues don't fail the build by default.
+    """
+    assert report['counts']['closed'] == 1
+    assert app.statuscode == 0
+
+
+@pytest.mark.mock_lookup
+@pytest.mark.with_content('#10')
+@pytest.mark.with_issue(id='10', title='Eggs', closed=True, url='eggs')
+@pytest.mark.confoverrides(issuetracker_check_fail_on=['closed'])
+def test_fail_on_closed_issues(app, report):
+    """
+    Test that closed issues fail the build, if configured.
+    """
+    assert app.statuscode == 1
+
+
+@pytest.mark.mock_lookup
+@pytest.mark.with_content('#10')
+@pytest.mark.confoverrides(issuetracker_check_fail_on=[],
+                           issuetracker_check_report='check.json')
+def test_report_filename(app, outdir):
+    """
+    Test that the report is written to the configured file.
+    """
+    app.build()
+    assert json.loads(outdir.join('check.json').read())['counts'] == {
+        'open': 0, 'closed': 0, 'missing': 1, 'unavailable': 0}
+    assert app.statuscode == 0
+
+
+@pytest.mark.mock_lookup
+@pytest.mark.with_content('#10')
+@pytest.mark.confoverrides(issuetracker_check_fail_on=[])
+def test_doctrees_not_loaded(app, outdir, monkeypatch):
+    """
+    Test that the references recorded while reading are checked, without
+    loading any doctree.
+    """
+    def get_doctree(env, docname):
+        raise AssertionError('doctree {0} loaded'.format(docname))
+    # patch the class, because the environment is pickled
+    monkeypatch.setattr(type(app.env), 'get_doctree', get_doctree)
+    app.build()
+    assert json.loads(outdir.join('issues.json').read())['counts'] == {
+        'open': 0, 'closed': 0, 'missing': 1, 'unavailable': 0}
+
+
+@pytest.mark.mock_lookup
+@pytest.mark.with_content('#10')
+def test_unavailable_issues_pass(app, mock_lookup, outdir):
+    """
+    Test that issues, whose lookup failed because the issue tracker was
+    unavailable, are reported as unavailable, and don't fail the build by
+    default.
+    """
+    mock_lookup.side_effect = TrackerUnavailable('issues.example.com')
+    app.build()
+    report = json.loads(outdir.join('issues.json').read())
+    assert report['issues'][0]['status'] == 'unavailable'
+    assert report['counts'] == {
+        'open': 0, 'closed': 0, 'missing': 0, 'unavailable': 1}
+    assert app.statuscode == 0
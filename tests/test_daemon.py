@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    test_daemon
+    ===========
+
+    Test the issue cache daemon shared by concurrent builds.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import time
+import threading
+
+import pytest
+
+from sphinxcontrib import issuetracker
+from sphinxcontrib.issuetracker import Issue, TrackerConfig
+from sphinxcontrib.issuetracker.daemon import (
+    CacheService, CacheDaemon, CacheClient, DaemonError)
+
+
+pytestmark = pytest.mark.skipif(
+    str('not hasattr(__import__("socket"), "AF_UNIX")'))
+
+
+KEY = ['github', 'foo/bar', None, '10']
+
+
+def pytest_funcarg__service(request):
+    """
+    A :class:`CacheService` with default limits.
+    """
+    return CacheService()
+
+
+def pytest_funcarg__daemon(request):
+    """
+    A :class:`CacheDaemon` serving in a background thread.
+    """
+    tmpdir = request.getfuncargvalue('tmpdir')
+    daemon = CacheDaemon(str(tmpdir.join('daemon.sock')))
+    thread = threading.Thread(target=daemon.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    def stop():
+        daemon.shutdown()
+        daemon.server_close()
+        thread.join()
+    request.addfinalizer(stop)
+    return daemon
+
+
+def pytest_funcarg__confoverrides(request):
+    """
+    Configure the socket of the ``daemon`` in the app.
+    """
+    confoverrides = request.getfuncargvalue('confoverrides')
+    if 'daemon' in request.funcargnames:
+        daemon = request.getfuncargvalue('daemon')
+        confoverrides = dict(confoverrides,
+                             issuetracker_cache_socket=daemon.server_address)
+    return confoverrides
+
+
+def test_claim(service):
+    """
+    Test that only the first caller claims a lookup.
+    """
+    assert service.claim([KEY]) == [{'status': 'claimed'}]
+    assert service.claim([KEY]) == [{'status': 'pending'}]
+    service.put([(KEY, None)])
+    assert service.claim([KEY]) == [{'status': 'hit', 'issue': None}]
+
+
+def test_release(service):
+    """
+    Test that released lookups are claimed again.
+    """
+    service.claim([KEY])
+    service.release([KEY])
+    assert service.claim([KEY]) == [{'status': 'claimed'}]
+
+
+def test_wait(service):
+    """
+    Test that waiting callers get the issue of the claiming caller.
+    """
+    service.claim([KEY])
+    issue = {'id': '10', 'title': 'Eggs', 'closed': False, 'url': 'eggs'}
+
+    def put():
+        time.sleep(0.1)
+        service.put([(KEY, issue)])
+    threading.Thread(target=put).start()
+    assert service.wait([KEY]) == [{'status': 'hit', 'issue': issue}]
+
+
+def test_wait_timeout(service):
+    """
+    Test that waiting callers give up on lookups, which don't finish in
+    time.
+    """
+    service.claim([KEY])
+    assert service.wait([KEY], timeout=0.1) == [{'status': 'timeout'}]
+
+
+def test_rate_limit(service):
+    """
+    Test that all callers share a rate limit budget.
+    """
+    assert service.acquire('api.github.com') == {'ok': True}
+    reset = time.time() + 3600
+    service.limit('api.github.com', 1, reset)
+    assert service.acquire('api.github.com') == {'ok': True}
+    assert service.acquire('api.github.com') == {'ok': False,
+                                                 'reset': reset}
+    # the budget is available again after its reset
+    service.limit('api.github.com', 0, time.time() - 1)
+    assert service.acquire('api.github.com') == {'ok': True}
+
+
+def test_expired_issues(service, monkeypatch):
+    """
+    Test that cached issues are looked up again after their TTL.
+    """
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now)
+    service.put([(KEY, None)])
+    assert service.claim([KEY]) == [{'status': 'hit', 'issue': None}]
+    now += service.ttl
+    assert service.claim([KEY]) == [{'status': 'claimed'}]
+
+
+def test_max_issues():
+    """
+    Test that the issues put first are forgotten, if the service caches too
+    many issues.
+    """
+    service = CacheService(max_issues=2)
+    keys = [KEY[:3] + [issue_id] for issue_id in ['10', '11', '12']]
+    service.put([(keys[0], None), (keys[1], None)])
+    # replacing an issue counts as putting it again
+    service.put([(keys[0], None)])
+    service.put([(keys[2], None)])
+    assert service.claim(keys) == [{'status': 'hit', 'issue': None},
+                                   {'status': 'claimed'},
+                                   {'status': 'hit', 'issue': None}]
+
+
+def test_client(daemon):
+    """
+    Test that the client claims and puts issues through the daemon.
+    """
+    client = CacheClient(daemon.server_address)
+    issue = Issue(id='10', title='Eggs', closed=False, url='eggs')
+    assert client.claim([KEY]) == [{'status': 'claimed'}]
+    client.put([(KEY, issue)])
+    assert client.claim([KEY]) == [{'status': 'hit', 'issue': issue}]
+
+
+def test_client_unavailable(tmpdir):
+    """
+    Test that the client raises DaemonError, if no daemon listens at the
+    socket.
+    """
+    client = CacheClient(str(tmpdir.join('missing.sock')))
+    with pytest.raises(DaemonError):
+        client.claim([KEY])
+
+
+@pytest.mark.mock_lookup
+@pytest.mark.build_app
+@pytest.mark.with_content('#10')
+@pytest.mark.with_issue(id='10', title='Eggs', closed=False, url='eggs')
+def test_lookup_through_daemon(app, daemon, mock_lookup, issue):
+    """
+    Test that builds share looked up issues through the daemon.
+    """
+    assert mock_lookup.call_count == 1
+    # another build with an empty cache gets the issue from the daemon
+    app.env.issuetracker_cache.clear()
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    assert issuetracker.lookup_issue(app, tracker_config, '10') == issue
+    assert mock_lookup.call_count == 1
+
+
+@pytest.mark.with_content('dummy content')
+@pytest.mark.with_issue(id='10', title='Eggs', closed=False, url='eggs')
+def test_share_changed_issues(app, daemon, issue):
+    """
+    Test that changed issues replace the issues cached by the daemon.
+    """
+    daemon.service.put([(KEY, issue._asdict())])
+    cache = app.env.issuetracker_cache
+    cache['10'] = issue
+    cache['10'] = issue._replace(closed=True)
+    app.config.issuetracker = 'github'
+    app.config.issuetracker_project = 'foo/bar'
+    issuetracker.get_outdated_documents(app, app.env, set(), set(), set())
+    assert daemon.service.claim([KEY]) == [
+        {'status': 'hit', 'issue': issue._replace(closed=True)._asdict()}]
+
+
+@pytest.mark.with_content('dummy content')
+@pytest.mark.confoverrides(issuetracker='github',
+                           issuetracker_project='foo/bar')
+def test_exhausted_rate_limit(app, daemon, monkeypatch):
+    """
+    Test that issues aren't cached, neither locally nor in the daemon, if
+    the shared rate limit is exhausted.
+    """
+    def get(url, headers):
+        raise AssertionError('request sent despite exhausted rate limit')
+    monkeypatch.setattr(app.env.issuetracker_cassette, 'get', get)
+    daemon.service.limit('api.github.com', 0, time.time() + 3600)
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    assert issuetracker.lookup_issue(app, tracker_config, '10') is None
+    assert '10' not in app.env.issuetracker_cache
+    assert daemon.service.claim([['github', 'foo/bar', None, '10']]) == [
+        {'status': 'claimed'}]
+
+
+@pytest.mark.mock_lookup
+@pytest.mark.with_content('dummy content')
+@pytest.mark.confoverrides(issuetracker_cache_socket='missing.sock')
+def test_lookup_without_daemon(app, mock_lookup):
+    """
+    Test that issues are looked up without an unavailable daemon.
+    """
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    assert issuetracker.lookup_issue(app, tracker_config, '10') is None
+    assert mock_lookup.call_count == 1
+    assert not app.env.issuetracker_daemon.enabled
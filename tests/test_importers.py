@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    test_importers
+    ==============
+
+    Test importing issues from export files of issue trackers.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import io
+import json
+
+import pytest
+
+from sphinxcontrib.issuetracker import Issue, TrackerConfig
+from sphinxcontrib.issuetracker.cache import IssueCache
+from sphinxcontrib.issuetracker import importers
+from sphinxcontrib.issuetracker.importers import (
+    iter_json_values, import_issues, IMPORTERS)
+
+
+GITHUB_ISSUES = [
+    {'number': 10, 'title': 'Eggs', 'state': 'closed',
+     'html_url': 'https://github.com/foo/bar/issues/10',
+     'repository_url': 'https://api.github.com/repos/foo/bar'},
+    {'number': 11, 'title': 'Spam', 'state': 'open',
+     'html_url': 'https://github.com/foo/bar/issues/11',
+     'repository_url': 'https://api.github.com/repos/foo/bar'},
+    {'number': 12, 'title': 'Ham', 'state': 'open',
+     'html_url': 'https://github.com/spam/eggs/issues/12',
+     'repository_url': 'https://api.github.com/repos/spam/eggs'},
+]
+
+JIRA_SEARCH_EXPORT = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<rss version="0.92">
+<channel>
+<title>Jira</title>
+<item>
+<title>[FOO-10] Eggs</title>
+<link>https://jira.example.com/browse/FOO-10</link>
+<project key="FOO">Foo</project>
+<summary>Eggs</summary>
+<key>FOO-10</key>
+<resolution>Fixed</resolution>
+</item>
+<item>
+<title>[FOO-11] Spam</title>
+<link>https://jira.example.com/browse/FOO-11</link>
+<project key="FOO">Foo</project>
+<summary>Spam</summary>
+<key>FOO-11</key>
+<resolution>Unresolved</resolution>
+</item>
+<item>
+<title>[BAR-12] Ham</title>
+<link>https://jira.example.com/browse/BAR-12</link>
+<project key="BAR">Bar</project>
+<summary>Ham</summary>
+<key>BAR-12</key>
+<resolution>Unresolved</resolution>
+</item>
+</channel>
+</rss>
+"""
+
+JIRA_BACKUP_EXPORT = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<entity-engine-xml>
+<Issue id="10010" key="FOO-10" project="10000" summary="Eggs"
+       resolution="1"/>
+<Action id="20000" issue="10010" type="comment"><body>Done</body></Action>
+<Issue id="10011" project="10000" number="11"><summary>Spam</summary></Issue>
+<Issue id="10012" project="10001" number="12" summary="Ham"/>
+<Project id="10000" key="FOO" name="Foo"/>
+<Project id="10001" key="BAR" name="Bar"/>
+</entity-engine-xml>
+"""
+
+# Redmine writes a byte order mark
+REDMINE_EXPORT = """\
+\ufeff#,Project,Tracker,Status,Subject
+10,Foo,Bug,Closed,Eggs
+11,Foo,Feature,New,"Spam, and more spam"
+"""
+
+DEBIAN_EXPORT = """\
+Bug: 10
+Package: foo
+Subject: Eggs
+Done: Spam <spam@example.com>
+
+Bug: 11
+Package: foo-utils
+Source: foo
+Subject: Spam
+  continued
+
+Bug: 12
+Package: bar
+Subject: Ham
+"""
+
+EXPECTED_ISSUES = {
+    'github': (TrackerConfig('foo/bar'), [
+        Issue(id='10', title='Eggs', closed=True,
+              url='https://github.com/foo/bar/issues/10'),
+        Issue(id='11', title='Spam', closed=False,
+              url='https://github.com/foo/bar/issues/11')]),
+    'jira': (TrackerConfig('Foo', 'https://jira.example.com'), [
+        Issue(id='FOO-10', title='Eggs', closed=True,
+              url='https://jira.example.com/browse/FOO-10'),
+        Issue(id='FOO-11', title='Spam', closed=False,
+              url='https://jira.example.com/browse/FOO-11')]),
+    'redmine': (TrackerConfig('foo', 'https://redmine.example.com'), [
+        Issue(id='10', title='Eggs', closed=True,
+              url='https://redmine.example.com/issues/10'),
+        Issue(id='11', title='Spam, and more spam', closed=False,
+              url='https://redmine.example.com/issues/11')]),
+    'debian': (TrackerConfig('foo'), [
+        Issue(id='10', title='Eggs', closed=True,
+              url='http://bugs.debian.org/cgi-bin/bugreport.cgi?bug=10'),
+        Issue(id='11', title='Spam\ncontinued', closed=False,
+              url='http://bugs.debian.org/cgi-bin/bugreport.cgi?bug=11')]),
+}
+
+
+@pytest.mark.parametrize(('tracker', 'export'), [
+    ('github', json.dumps(GITHUB_ISSUES, indent=2)),
+    ('jira', JIRA_SEARCH_EXPORT),
+    ('jira', JIRA_BACKUP_EXPORT),
+    ('redmine', REDMINE_EXPORT),
+    ('debian', DEBIAN_EXPORT),
+])
+def test_import(tracker, export):
+    tracker_config, issues = EXPECTED_ISSUES[tracker]
+    source = io.BytesIO(export.encode('utf-8'))
+    assert list(IMPORTERS[tracker](source, tracker_config)) == issues
+
+
+def test_iter_json_values(monkeypatch):
+    """
+    Test that arrays and sequences of JSON values are parsed, even if values
+    are split across chunks.
+    """
+    monkeypatch.setattr(importers, 'CHUNK_SIZE', 3)
+    values = [{'title': 'Eggs \xe4\xf6\xfc'}, 12345, 'spam', [1, 2], None]
+    source = json.dumps(values[:3]) + '\n' + json.dumps(values[3]) + ' null'
+    assert list(iter_json_values(io.BytesIO(source.encode('utf-8')))) == [
+        {'title': 'Eggs \xe4\xf6\xfc'}, 12345, 'spam', 1, 2, None]
+    # arrays of separate pages are concatenated
+    source = io.BytesIO(b'[1, 2][3]\n[]')
+    assert list(iter_json_values(source)) == [1, 2, 3]
+
+
+def test_iter_json_values_invalid():
+    with pytest.raises(ValueError):
+        list(iter_json_values(io.BytesIO(b'[1, 2')))
+    with pytest.raises(ValueError):
+        list(iter_json_values(io.BytesIO(b'{"spam": ')))
+
+
+def test_import_issues(tmpdir):
+    """
+    Test that imported issues are cached, and changed issues are marked.
+    """
+    cache = IssueCache(str(tmpdir.join('cache.pickle')))
+    tracker_config, issues = EXPECTED_ISSUES['github']
+    cache['10'] = issues[0]._replace(closed=False)
+    cache['12'] = None
+    assert import_issues(cache, issues) == 2
+    assert cache.issues == {'10': issues[0], '11': issues[1], '12': None}
+    assert cache.changed == set(['10'])
+
+
+@pytest.mark.with_content('#10 and #11')
+@pytest.mark.mock_lookup
+def test_build_with_imported_issues(request, doctreedir, mock_lookup):
+    """
+    Test that a fresh build uses the imported issues instead of looking them
+    up.
+    """
+    tracker_config, issues = EXPECTED_ISSUES['github']
+    doctreedir.ensure(dir=True)
+    cache = IssueCache.in_directory(str(doctreedir))
+    source = io.BytesIO(json.dumps(GITHUB_ISSUES).encode('utf-8'))
+    import_issues(cache, IMPORTERS['github'](source, tracker_config))
+    cache.save()
+    app = request.getfuncargvalue('app')
+    app.build()
+    assert not mock_lookup.called
+    assert app.env.issuetracker_cache == dict((i.id, i) for i in issues)
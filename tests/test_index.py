@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    test_index
+    ==========
+
+    Test the memory-mapped issue index.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import random
+
+import pytest
+
+from sphinxcontrib import issuetracker
+from sphinxcontrib.issuetracker import Issue, TrackerConfig
+from sphinxcontrib.issuetracker.index import IssueIndex, write_index
+
+
+TRACKER_CONFIG = TrackerConfig('issuetracker-test')
+
+ISSUES = {
+    '10': Issue(id='10', title='Eggs', url='eggs', closed=True),
+    '11': Issue(id='11', title=None, url='spam', closed=False),
+    '12': Issue(id='12', title='\xe4\xf6\xfc', url='ham', closed=False),
+    '13': None,
+}
+
+
+def pytest_funcarg__index_file(request):
+    """
+    The path of an index of ``ISSUES`` for the current test.
+    """
+    tmpdir = request.getfuncargvalue('tmpdir')
+    filename = str(tmpdir.join('issues.idx'))
+    assert write_index(filename, ISSUES.items(), TRACKER_CONFIG) == 4
+    return filename
+
+
+def pytest_funcarg__index(request):
+    """
+    The :class:`IssueIndex` of the ``index_file``.
+    """
+    index = IssueIndex(request.getfuncargvalue('index_file'))
+    request.addfinalizer(index.close)
+    return index
+
+
+def pytest_funcarg__confoverrides(request):
+    """
+    Configure the ``index_file`` in the app.
+    """
+    confoverrides = request.getfuncargvalue('confoverrides')
+    if 'index_file' in request.funcargnames:
+        index_file = request.getfuncargvalue('index_file')
+        confoverrides = dict(confoverrides, issuetracker_index=index_file)
+    return confoverrides
+
+
+def test_index(index):
+    """
+    Test that all indexed issues are found, and no other issues.
+    """
+    assert index.enabled
+    assert len(index) == 4
+    for issue_id, issue in ISSUES.items():
+        assert issue_id in index
+        assert index[issue_id] == issue
+    assert '1' not in index
+    assert '14' not in index
+    with pytest.raises(KeyError):
+        index['14']
+    assert index.get('14', 'spam') == 'spam'
+
+
+def test_index_many_issues(tmpdir):
+    """
+    Test that all issues are found in a big index.
+    """
+    issues = dict((str(number), Issue(id=str(number), title='Spam',
+                                      url='spam', closed=number % 2 == 0))
+                  for number in random.Random(0).sample(range(100000), 1000))
+    filename = str(tmpdir.join('issues.idx'))
+    write_index(filename, issues.items(), TRACKER_CONFIG)
+    index = IssueIndex(filename)
+    assert len(index) == 1000
+    for issue_id, issue in issues.items():
+        assert index[issue_id] == issue
+    assert sum(1 for number in range(100000) if str(number) in index) == 1000
+
+
+def test_covers(index):
+    """
+    Test that an index only covers the tracker it was written for.
+    """
+    assert index.covers(TRACKER_CONFIG)
+    assert not index.covers(TrackerConfig('issuetracker-test', 'spam'))
+    assert not index.covers(TrackerConfig('eggs'))
+    assert not IssueIndex().covers(TRACKER_CONFIG)
+
+
+def test_no_index(tmpdir):
+    """
+    Test that a file, which is not an index, is rejected.
+    """
+    filename = tmpdir.join('issues.idx')
+    filename.write(b'spam', 'wb')
+    with pytest.raises(ValueError):
+        IssueIndex(str(filename))
+
+
+@pytest.mark.mock_lookup
+@pytest.mark.with_content('dummy content')
+def test_lookup_indexed_issues(app, index_file, mock_lookup):
+    """
+    Test that indexed issues are not looked up, and not cached.
+    """
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    assert issuetracker.lookup_issue_ids(
+        app, tracker_config, ['10', '13', '14']) == {
+            '10': ISSUES['10'], '13': None, '14': None}
+    mock_lookup.assert_called_once_with(app, tracker_config, '14')
+    assert app.env.issuetracker_cache.issues == {'14': None}
+
+
+@pytest.mark.mock_lookup
+@pytest.mark.with_content('dummy content')
+@pytest.mark.confoverrides(issuetracker_index='missing.idx')
+def test_missing_index(app, mock_lookup):
+    """
+    Test that issues are looked up, if the configured index is missing.
+    """
+    assert not app.env.issuetracker_index.enabled
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    assert issuetracker.lookup_issue(app, tracker_config, '10') is None
+    assert mock_lookup.call_count == 1
@@ -36,11 +36,18 @@
 from __future__ import (print_function, division, unicode_literals,
                         absolute_import)
 
+import re
+import time
 import pickle
+import threading
+from xml.etree import ElementTree as etree
 
 import pytest
 
-from sphinxcontrib.issuetracker import TrackerConfig
+from mock import Mock
+
+from sphinxcontrib import issuetracker
+from sphinxcontrib.issuetracker import Issue, TrackerConfig, resolvers
 
 
 def pytest_funcarg__app(request):
@@ -77,7 +84,10 @@ def test_cache_pickled(cache, doctreedir, issue):
     environment_file = doctreedir.join('environment.pickle')
     with environment_file.open('rb') as source:
         env = pickle.load(source)
-    # check that the pickled cache matches the real cache
+    # check that the pickled environment only refers to the cache file
+    assert env.issuetracker_cache.__getstate__() == {
+        'filename': cache.filename}
+    # and that the cache loaded from this file matches the real cache
     assert env.issuetracker_cache == cache
     # and check that it actually contains what it is supposed to contain
     assert env.issuetracker_cache == {'10': issue, '11': None}
@@ -104,3 +114,399 @@ def test_event_emitted_only_once(app, mock_lookup, issue):
     """
     assert mock_lookup.call_count == 2
     assert app.env.issuetracker_cache == {'10': issue, '11': None}
+
+
+@pytest.mark.with_content('#10 #11 ``#12``')
+def test_references_recorded(app):
+    """
+    Test that the issues referenced by each document are recorded.
+    """
+    assert app.env.issuetracker_references == {'index': set(['10', '11'])}
+
+
+@pytest.mark.with_content('#10')
+def test_references_purged(app):
+    """
+    Test that the referenced issues are forgotten with the document.
+    """
+    issuetracker.purge_references(app, app.env, 'index')
+    assert app.env.issuetracker_references == {}
+
+
+@pytest.mark.with_content('#10 #11')
+@pytest.mark.with_issue(id='10', title='Eggs', closed=False, url='eggs')
+@pytest.mark.confoverrides(issuetracker_cache_prune=True)
+def test_unreferenced_issues_pruned(app, issue):
+    """
+    Test that issues, which no document references, are removed from the
+    cache at the end of the build.
+    """
+    cache = app.env.issuetracker_cache
+    assert cache == {'10': issue, '11': None}
+    cache['12'] = None
+    issuetracker.trim_cache(app, None)
+    assert cache == {'10': issue, '11': None}
+
+
+@pytest.mark.with_content('#10 #11 #12')
+@pytest.mark.confoverrides(issuetracker_cache_size=2)
+def test_cache_size_limited(app):
+    """
+    Test that a full cache evicts issues at the end of the build.
+    """
+    assert len(app.env.issuetracker_cache) == 2
+
+
+@pytest.mark.with_content('#10 #11')
+@pytest.mark.with_issue(id='10', title='Eggs', closed=False, url='eggs')
+def test_outdated_documents(app, issue):
+    """
+    Test that documents which reference changed issues are outdated.
+    """
+    outdated = issuetracker.get_outdated_documents(
+        app, app.env, set(), set(), set())
+    assert outdated == []
+    app.env.issuetracker_cache['10'] = issue._replace(closed=True)
+    outdated = issuetracker.get_outdated_documents(
+        app, app.env, set(), set(), set())
+    assert outdated == ['index']
+    # changes are only reported once
+    outdated = issuetracker.get_outdated_documents(
+        app, app.env, set(), set(), set())
+    assert outdated == []
+
+
+@pytest.mark.with_content('dummy content')
+@pytest.mark.with_issue(id='10', title='Eggs', closed=False, url='eggs')
+def test_batch_lookup(app, mock_lookup, issue):
+    """
+    Test that issues are looked up together, and that issues missing from the
+    result of the batch lookup are looked up one by one.
+    """
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    calls = []
+
+    def lookup_issues(app, tracker_config, issue_ids):
+        calls.append(issue_ids)
+        return {'10': issue, '12': None}
+    app.connect(str('issuetracker-lookup-issues'), lookup_issues)
+    issues = issuetracker.lookup_issue_ids(
+        app, tracker_config, ['10', '11', '10', '12'])
+    assert issues == {'10': issue, '11': None, '12': None}
+    assert calls == [['10', '11', '12']]
+    # only the issue missing from the result is looked up with the single
+    # lookup event
+    mock_lookup.assert_called_once_with(app, tracker_config, '11')
+    assert app.env.issuetracker_cache == issues
+    # cached issues are not looked up again
+    issuetracker.lookup_issue_ids(app, tracker_config, ['10', '11'])
+    assert len(calls) == 1
+
+
+@pytest.mark.with_content('dummy content')
+def test_concurrent_lookups_shared(app, mock_lookup):
+    """
+    Test that concurrent lookups of the same issue share a single lookup.
+    """
+    def lookup(app, tracker_config, issue_id):
+        time.sleep(0.1)
+        return None
+    mock_lookup.side_effect = lookup
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    threads = [threading.Thread(target=issuetracker.lookup_issue,
+                                args=(app, tracker_config, '10'))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert mock_lookup.call_count == 1
+    assert app.env.issuetracker_cache == {'10': None}
+
+
+@pytest.mark.with_content(':issue:`10` :issue:`11`')
+@pytest.mark.with_issue(id='10', title='Eggs', closed=False, url='eggs')
+@pytest.mark.confoverrides(issuetracker_pipeline_workers=2,
+                           issuetracker_trace='trace.json')
+def test_pipelined_lookups(app, mock_lookup, issue):
+    """
+    Test that issues are looked up in background threads while reading, and
+    that the threads are stopped at the end of the build.
+    """
+    assert mock_lookup.call_count == 2
+    assert app.env.issuetracker_cache == {'10': issue, '11': None}
+    lookup_threads = set(span.thread for span
+                         in app.env.issuetracker_tracer.spans
+                         if span.name == 'lookup')
+    assert lookup_threads
+    assert threading.current_thread().ident not in lookup_threads
+    pipeline = app.env.issuetracker_pipeline
+    assert not pipeline.enabled
+    assert not pipeline._threads
+
+
+@pytest.mark.with_content('dummy content')
+def test_pipeline_disabled(app):
+    assert not app.env.issuetracker_pipeline.enabled
+
+
+@pytest.mark.with_content('#10 #11')
+@pytest.mark.with_issue(id='10', title='Eggs', closed=False, url='eggs')
+@pytest.mark.confoverrides(issuetracker_project='foo/bar',
+                           issuetracker_refresh=True)
+def test_refresh_github(app, issue, monkeypatch):
+    """
+    Test that cached issues are refreshed from the list of changed issues.
+    """
+    pages = {
+        None: ([{'number': 10, 'title': 'Eggs', 'state': 'closed',
+                 'html_url': 'eggs'},
+                {'number': 12, 'title': 'Spam', 'state': 'open',
+                 'html_url': 'spam'}], 'page2'),
+        'page2': ([{'number': 11, 'title': 'Ham', 'state': 'open',
+                    'html_url': 'ham'}], None),
+    }
+    urls = []
+
+    def get(app, url):
+        urls.append(url)
+        issues, next_url = pages['page2' if url == 'page2' else None]
+        links = {'next': {'url': next_url}} if next_url else {}
+        return Mock(json=Mock(return_value=issues), links=links)
+    monkeypatch.setattr(resolvers, 'get', get)
+    app.config.issuetracker = 'github'
+    cache = app.env.issuetracker_cache
+    issuetracker.refresh_cache(app)
+    assert cache == {'10': issue._replace(closed=True),
+                     '11': Issue(id='11', title='Ham', closed=False,
+                                 url='ham')}
+    assert urls == [resolvers.GITHUB_ISSUES_API_URL.format(
+        TrackerConfig('foo/bar')), 'page2']
+    assert cache.sync_times
+    # the next refresh only lists issues changed since the last refresh
+    issuetracker.refresh_cache(app)
+    assert '&since=' in urls[2]
+    assert cache.changed == set(['10', '11'])
+
+
+@pytest.mark.with_content('dummy content')
+@pytest.mark.with_issue(id='FOO-10', title='Eggs', closed=False,
+                        url='https://jira.example.com/browse/FOO-10')
+@pytest.mark.confoverrides(issuetracker_project='Foo',
+                           issuetracker_url='https://jira.example.com',
+                           issuetracker_refresh=True)
+def test_refresh_jira(app, issue, monkeypatch):
+    """
+    Test that cached issues are refreshed from a search for updated issues.
+    """
+    pages = [[jira_item('FOO-10', 'Fixed'), jira_item('FOO-12')],
+             [jira_item('FOO-13')]]
+    urls = []
+    monkeypatch.setattr(resolvers, 'get', jira_pages(pages, urls))
+    monkeypatch.setattr(resolvers, 'JIRA_REFRESH_PAGE_SIZE', 2)
+    app.config.issuetracker = 'jira'
+    cache = app.env.issuetracker_cache
+    cache.update({'FOO-10': issue, 'FOO-11': None})
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    cache.set_sync_time(('jira', 'Foo', 'https://jira.example.com'), 0)
+    issuetracker.refresh_cache(app)
+    assert cache == {'FOO-10': issue._replace(closed=True), 'FOO-11': None}
+    assert cache.changed == set(['FOO-10'])
+    assert len(urls) == 2
+    assert urls[0].endswith('&pager/start=0')
+    assert urls[1].endswith('&pager/start=2')
+    assert cache.sync_times[
+        ('jira', tracker_config.project, tracker_config.url)] > 0
+
+
+@pytest.mark.with_content('dummy content')
+@pytest.mark.with_issue(id='FOO-10', title='Eggs', closed=False,
+                        url='https://jira.example.com/browse/FOO-10')
+@pytest.mark.confoverrides(issuetracker_project='Foo',
+                           issuetracker_url='https://jira.example.com',
+                           issuetracker_refresh=True)
+def test_refresh_jira_unchanged_issue(app, issue, monkeypatch):
+    """
+    Test that refreshing an issue, which was updated without changing its
+    title or resolution, doesn't mark the issue as changed.
+    """
+    monkeypatch.setattr(resolvers, 'get', jira_pages([[jira_item('FOO-10')]]))
+    app.config.issuetracker = 'jira'
+    cache = app.env.issuetracker_cache
+    # an issue looked up before the refresh
+    cache['FOO-10'] = resolvers.make_jira_issue(
+        TrackerConfig.from_sphinx_config(app.config), 'FOO-10',
+        etree.fromstring(jira_item('FOO-10')))
+    assert cache['FOO-10'] == issue
+    cache.pop_changed()
+    cache.set_sync_time(('jira', 'Foo', 'https://jira.example.com'), 0)
+    issuetracker.refresh_cache(app)
+    assert cache == {'FOO-10': issue}
+    assert not cache.changed
+
+
+def jira_item(key, resolution='Unresolved'):
+    """
+    Get the item of the issue ``key`` with the given ``resolution`` in a Jira
+    search result.
+    """
+    return ('<item><key>{0}</key><link>https://jira.example.com/browse/{0}'
+            '</link><project>Foo</project><resolution>{1}</resolution>'
+            '<summary>Eggs</summary></item>'.format(key, resolution))
+
+
+def jira_pages(pages, urls=None):
+    """
+    Create a fake for :func:`resolvers.get`, which answers each request with
+    the next of the given ``pages`` of a Jira search result.  Each page is a
+    list of items.  The URLs of all requests are appended to ``urls``.
+    """
+    pages = iter(pages)
+
+    def get(app, url):
+        if urls is not None:
+            urls.append(url)
+        content = '<rss><channel>{0}</channel></rss>'.format(
+            ''.join(next(pages)))
+        return Mock(content=content.encode('utf-8'))
+    return get
+
+
+def jira_search(existing, urls=None):
+    """
+    Create a fake for :meth:`Cassette.get`, which answers Jira searches for
+    issues.  Like Jira, it rejects searches for any issue not in
+    ``existing``.  The URLs of all searches are appended to ``urls``.
+    """
+    def get(url, headers):
+        if urls is not None:
+            urls.append(url)
+        keys = re.search(r'issuekey%20in%20%28(.*?)%29', url).group(1)
+        keys = keys.split('%2C')
+        if not set(keys) <= set(existing):
+            return Mock(status_code=400, content=b'', url=url, headers={})
+        content = '<rss><channel>{0}</channel></rss>'.format(
+            ''.join(jira_item(key) for key in keys))
+        return Mock(status_code=200, content=content.encode('utf-8'),
+                    url=url, headers={})
+    return get
+
+
+@pytest.mark.with_content('dummy content')
+@pytest.mark.with_issue(id='FOO-10', title='Eggs', closed=False,
+                        url='https://jira.example.com/browse/FOO-10')
+@pytest.mark.confoverrides(issuetracker_project='Foo',
+                           issuetracker_url='https://jira.example.com',
+                           issuetracker_refresh=True)
+def test_first_refresh_jira_with_deleted_issue(app, issue, monkeypatch):
+    """
+    Test that the first refresh caches deleted issues as missing, and still
+    records the time of the refresh.
+    """
+    monkeypatch.setattr(app.env.issuetracker_cassette, 'get',
+                        jira_search(['FOO-10']))
+    app.config.issuetracker = 'jira'
+    cache = app.env.issuetracker_cache
+    cache.update({'FOO-10': issue._replace(closed=True),
+                  'FOO-11': issue._replace(id='FOO-11'), 'FOO-12': None})
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    issuetracker.refresh_cache(app)
+    assert cache == {'FOO-10': issue, 'FOO-11': None, 'FOO-12': None}
+    assert cache.sync_times[
+        ('jira', tracker_config.project, tracker_config.url)] > 0
+
+
+@pytest.mark.with_content('dummy content')
+@pytest.mark.confoverrides(issuetracker_project='Foo',
+                           issuetracker_url='https://jira.example.com')
+def test_lookup_jira_batch_with_missing_issue(app, monkeypatch):
+    """
+    Test that a Jira search rejected because of a missing issue is split
+    until the missing issue is found, without warning.
+    """
+    urls = []
+    monkeypatch.setattr(app.env.issuetracker_cassette, 'get',
+                        jira_search(['FOO-{0}'.format(i) for i in range(8)
+                                     if i != 5], urls))
+    monkeypatch.setattr(app, 'warn', Mock())
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    issue_ids = ['FOO-{0}'.format(i) for i in range(8)]
+    issues = resolvers.lookup_jira_issues(app, tracker_config, issue_ids)
+    assert sorted(issues) == issue_ids
+    assert issues['FOO-5'] is None
+    assert issues['FOO-4'] == Issue(
+        id='FOO-4', title='Eggs', closed=False,
+        url='https://jira.example.com/browse/FOO-4')
+    # the full batch, both halves, both quarters of the failed half, and the
+    # halves of the failed quarter
+    assert len(urls) == 7
+    assert not app.warn.called
+
+
+@pytest.mark.with_content('#10 #11')
+@pytest.mark.with_issue(id='10', title='Eggs', closed=False, url='eggs')
+def test_prefetch_issues(app, mock_lookup, issue):
+    """
+    Test that all referenced issues, which are not cached, are looked up
+    after reading.
+    """
+    cache = app.env.issuetracker_cache
+    del cache['10']
+    mock_lookup.reset_mock()
+    issuetracker.prefetch_issues(app, app.env)
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    mock_lookup.assert_called_once_with(app, tracker_config, '10')
+    assert cache == {'10': issue, '11': None}
+
+
+@pytest.mark.with_content('#10 #11')
+@pytest.mark.with_issue(id='10', title='Eggs', closed=False, url='eggs')
+def test_prefetch_only_written_documents(app, mock_lookup):
+    """
+    Test that issues of documents, which are neither read nor written in
+    this build, are not prefetched.
+    """
+    cache = app.env.issuetracker_cache
+    app.env.issuetracker_references['spam'] = set(['12'])
+    del cache['10']
+    app.env.issuetracker_read_docs.clear()
+    mock_lookup.reset_mock()
+    issuetracker.prefetch_issues(app, app.env)
+    assert not mock_lookup.called
+    # the issues of documents read in this build are prefetched
+    app.env.issuetracker_read_docs.add('index')
+    issuetracker.prefetch_issues(app, app.env)
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    mock_lookup.assert_called_once_with(app, tracker_config, '10')
+    assert '12' not in cache
+
+
+@pytest.mark.with_content('#10 #11 #12')
+def test_prefetch_no_more_than_cache_size(app, mock_lookup):
+    """
+    Test that issues, which would be evicted from a limited cache right after
+    the build, are not prefetched.
+    """
+    cache = app.env.issuetracker_cache
+    cache.clear()
+    cache['10'] = None
+    cache.limit(2)
+    mock_lookup.reset_mock()
+    issuetracker.prefetch_issues(app, app.env)
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    mock_lookup.assert_called_once_with(app, tracker_config, '11')
+    assert cache == {'10': None, '11': None}
+
+
+@pytest.mark.with_content('dummy content')
+def test_no_lookups_in_forked_process(app, mock_lookup):
+    """
+    Test that forked worker processes of parallel builds don't look up
+    issues.
+    """
+    app.env.issuetracker_inflight.pid = -1
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    assert issuetracker.lookup_issue_ids(app, tracker_config, ['10']) == {
+        '10': None}
+    assert not mock_lookup.called
+    assert app.env.issuetracker_cache == {}
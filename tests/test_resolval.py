@@ -108,3 +108,25 @@ def test_non_ascii_title(resolved_doctree, issue):
     """
     pytest.assert_issue_xref(resolved_doctree, issue, 'öäüß')
     assert resolved_doctree.astext() == 'öäüß'
+
+
+@pytest.mark.with_issue(id='10', title='Eggs', url='eggs', closed=False)
+@pytest.mark.with_content('#10 *#11* #10')
+def test_resolve_all_references(app, issue):
+    """
+    Test that all issue references of a document are resolved at once in
+    Sphinx versions with post transforms, before Sphinx emits
+    ``missing-reference``.
+    """
+    if not hasattr(app, 'add_post_transform'):
+        pytest.skip('post transforms not supported')
+    missing_references = []
+    app.connect(str('missing-reference'),
+                lambda *args: missing_references.append(args[2]))
+    app.build()
+    doctree = app.env.get_and_resolve_doctree('index', app.builder)
+    references = doctree.traverse(nodes.reference)
+    assert [reference['refuri'] for reference in references] == ['eggs'] * 2
+    assert doctree.astext() == '#10 #11 #10'
+    assert isinstance(doctree.next_node(nodes.emphasis)[0], nodes.inline)
+    assert not missing_references
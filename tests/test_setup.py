@@ -39,9 +39,11 @@
 import re
 
 
-BUILTIN_TRACKER_NAME_PATTERN = re.compile('lookup_(.*)_issue')
+BUILTIN_TRACKER_NAME_PATTERN = re.compile('lookup_(.*)_issue$')
+BUILTIN_BATCH_TRACKER_NAME_PATTERN = re.compile('lookup_(.*)_issues$')
 
 import pytest
+from mock import Mock
 from sphinx.environment import SphinxStandaloneReader
 
 from sphinxcontrib import issuetracker
@@ -75,6 +77,22 @@ def test_builtin_issue_trackers():
     assert not trackers
 
 
+def test_builtin_batch_issue_trackers():
+    """
+    Test that all builtin batch lookups are really declared in the
+    BUILTIN_BATCH_ISSUE_TRACKERS dict, and have a single lookup, too.
+    """
+    trackers = dict(resolvers.BUILTIN_BATCH_ISSUE_TRACKERS)
+    for attr in dir(resolvers):
+        match = BUILTIN_BATCH_TRACKER_NAME_PATTERN.match(attr)
+        if match:
+            tracker_name = match.group(1).replace('_', ' ')
+            assert tracker_name in trackers
+            assert tracker_name in resolvers.BUILTIN_ISSUE_TRACKERS
+            trackers.pop(tracker_name)
+    assert not trackers
+
+
 def test_unknown_tracker(app):
     """
     Test that setting ``issuetracker`` to an unknown tracker fails.
@@ -106,3 +124,14 @@ def test_transform_not_added(app):
     """
     transforms = SphinxStandaloneReader.transforms
     assert issuetracker.IssueReferences not in transforms
+
+
+def test_parallel_safety():
+    """
+    Test that the extension declares itself safe for parallel writing, but
+    not for parallel reading.
+    """
+    metadata = issuetracker.setup(Mock())
+    assert metadata['version'] == issuetracker.__version__
+    assert not metadata['parallel_read_safe']
+    assert metadata['parallel_write_safe']
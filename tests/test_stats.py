@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    test_stats
+    ==========
+
+    Test build statistics.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import json
+
+import pytest
+
+from sphinxcontrib.issuetracker.stats import BuildStats, percentile
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.9) == 90
+    assert percentile(values, 0.99) == 99
+    assert percentile([3], 0.5) == 3
+    assert percentile([], 0.5) is None
+
+
+def test_record_requests():
+    """
+    Test that requests are recorded per host.
+    """
+    stats = BuildStats()
+    stats.record_request('api.github.com', 200, 100, 0.5)
+    stats.record_request('api.github.com', 404, 10, 0.1)
+    stats.record_request('api.github.com', 429, 0, 0.1)
+    stats.record_error('api.github.com')
+    stats.record_rate_limited('api.github.com')
+    host_stats = stats.as_dict()['hosts']['api.github.com']
+    assert host_stats['requests'] == 4
+    assert host_stats['bytes'] == 110
+    assert host_stats['errors'] == 2
+    assert host_stats['rate_limited'] == 2
+    assert host_stats['statuses'] == {'200': 1, '404': 1, '429': 1}
+    assert host_stats['latency']['0.5'] == 0.1
+
+
+@pytest.mark.with_content('dummy content')
+def test_stats_not_pickled(app):
+    """
+    Test that the statistics of a build are not pickled with the environment.
+    """
+    import pickle
+    stats = app.env.issuetracker_stats
+    stats.record_cache_probe(hit=True)
+    unpickled = pickle.loads(pickle.dumps(stats))
+    assert unpickled.as_dict()['cache'] == {'hits': 0, 'misses': 0}
+
+
+@pytest.mark.mock_lookup
+@pytest.mark.build_app
+@pytest.mark.with_content('#10 #10 #11 ``#12`` spam')
+@pytest.mark.with_issue(id='10', title='Eggs', closed=False, url='eggs')
+def test_build_stats(app, mock_lookup):
+    """
+    Test that the transform, cache probes and lookups are recorded.
+    """
+    stats = app.env.issuetracker_stats.as_dict()
+    assert stats['transform']['documents'] == 1
+    assert stats['transform']['references'] == 3
+    assert stats['transform']['searched_text_nodes'] == 1
+    assert stats['transform']['duration'] < 60
+    # each issue misses the cache once, further probes depend on whether
+    # issues are resolved at once or one by one
+    assert stats['cache']['misses'] == 2
+    assert stats['lookups']['count'] == mock_lookup.call_count == 2
+
+
+@pytest.mark.build_app
+@pytest.mark.with_content('#10')
+@pytest.mark.confoverrides(issuetracker_stats_json='stats.json',
+                           issuetracker_stats_prometheus='stats.prom')
+def test_stats_files(app, outdir):
+    """
+    Test that statistics are written to the configured files.
+    """
+    stats = json.loads(outdir.join('stats.json').read())
+    assert stats['transform']['references'] == 1
+    prometheus = outdir.join('stats.prom').read()
+    assert 'sphinx_issuetracker_references 1\n' in prometheus
+    assert 'sphinx_issuetracker_cache_probes{result="miss"}' in prometheus
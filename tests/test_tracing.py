@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    test_tracing
+    ============
+
+    Test tracing of builds.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import json
+
+import pytest
+
+from sphinxcontrib.issuetracker.tracing import Tracer, NullTracer
+
+
+def pytest_funcarg__tracer(request):
+    tracer = Tracer()
+    tracer.record('lookup', 'lookup', 2.0, 2.5, id='10')
+    tracer.record('cache probe', 'cache', 1.0, 1.25, id='10', hit=False)
+    return tracer
+
+
+def test_chrome_trace(tracer):
+    """
+    Test that spans are written as complete events sorted by start time.
+    """
+    trace = json.loads(tracer.serialize('trace.json'))
+    events = trace['traceEvents']
+    assert [event['name'] for event in events] == ['cache probe', 'lookup']
+    event = events[0]
+    assert event['ph'] == 'X'
+    assert event['cat'] == 'cache'
+    assert event['ts'] == 1000000
+    assert event['dur'] == 250000
+    assert event['args'] == {'id': '10', 'hit': False}
+    assert event['tid'] == events[1]['tid']
+
+
+def test_ndjson(tracer):
+    """
+    Test that spans are written as one JSON object per line.
+    """
+    spans = [json.loads(line) for line
+             in tracer.serialize('trace.ndjson').splitlines()]
+    assert [span['name'] for span in spans] == ['cache probe', 'lookup']
+    assert spans[1]['start'] == 2.0
+    assert spans[1]['duration'] == 0.5
+
+
+@pytest.mark.with_content('dummy content')
+def test_tracing_disabled(app):
+    """
+    Test that nothing is traced by default.
+    """
+    assert isinstance(app.env.issuetracker_tracer, NullTracer)
+    assert not app.env.issuetracker_tracer.enabled
+
+
+@pytest.mark.mock_lookup
+@pytest.mark.build_app
+@pytest.mark.with_content('#10 #10')
+@pytest.mark.confoverrides(issuetracker_trace='trace.ndjson')
+def test_build_traced(app, outdir):
+    """
+    Test that the transform, cache probes and lookups of a build are traced.
+    """
+    spans = [json.loads(line) for line
+             in outdir.join('trace.ndjson').read().splitlines()]
+    names = [span['name'] for span in spans]
+    assert names.count('transform') == 1
+    assert names.count('lookup') == 1
+    assert names.count('cache probe') >= 1
+    transform = spans[names.index('transform')]
+    assert transform['args'] == {'docname': 'index', 'references': 2}
@@ -37,7 +37,7 @@
 
 import pytest
 
-from sphinxcontrib.issuetracker import TrackerConfig
+from sphinxcontrib.issuetracker import TrackerConfig, TrackerRegistry
 
 
 def pytest_funcarg__content(request):
@@ -123,3 +123,17 @@ def test_tracker_config_from_sphinx_config_trailing_slash(app):
     tracker_config = TrackerConfig.from_sphinx_config(app.config)
     assert tracker_config.project == 'eggs'
     assert tracker_config.url == 'http://example.com'
+
+
+def test_tracker_registry():
+    """
+    Test that the tracker registry returns a single key for equal tracker
+    configs.
+    """
+    registry = TrackerRegistry()
+    eggs = registry.register(TrackerConfig('eggs'))
+    spam = registry.register(TrackerConfig('spam', 'http://example.com'))
+    assert eggs != spam
+    assert registry.register(TrackerConfig('eggs')) == eggs
+    assert registry[eggs] == TrackerConfig('eggs')
+    assert registry[spam] == TrackerConfig('spam', 'http://example.com')
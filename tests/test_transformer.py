@@ -35,10 +35,13 @@
 from __future__ import (print_function, division, unicode_literals,
                         absolute_import)
 
+import re
+
 import pytest
 from docutils import nodes
 from sphinx.addnodes import pending_xref
 
+from sphinxcontrib import issuetracker
 from sphinxcontrib.issuetracker import Issue
 
 
@@ -109,6 +112,22 @@ def test_transform_inline_markup(doctree):
     pytest.assert_issue_pending_xref(strong, '10', '#10')
 
 
+@pytest.mark.with_content('#10 *#11* #12 **#13** #14')
+def test_transform_many_references_in_paragraph(doctree, content):
+    """
+    Test that all issue ids in a paragraph are transformed in order, with
+    their parents intact.
+    """
+    references = doctree.traverse(pending_xref)
+    assert [ref['reftarget'] for ref in references] == [
+        '10', '11', '12', '13', '14']
+    for reference in references:
+        assert any(child is reference for child in reference.parent)
+    assert isinstance(references[1].parent, nodes.emphasis)
+    assert isinstance(references[3].parent, nodes.strong)
+    assert doctree.astext() == content.replace('*', '')
+
+
 @pytest.mark.with_content('``#10``')
 def test_transform_literal(doctree):
     """
@@ -135,6 +154,21 @@ def test_transform_literal_block(doctree):
     assert literal_block.astext() == 'eggs\n   #10'
 
 
+@pytest.mark.with_content("""\
+.. parsed-literal::
+
+   spam *#10*""")
+def test_transform_parsed_literal(doctree):
+    """
+    Test that issue references in markup nested in a parsed literal are
+    transformed, but not the literal text itself.
+    """
+    pytest.assert_issue_pending_xref(doctree, '10', '#10')
+    literal_block = doctree.next_node(nodes.literal_block)
+    assert literal_block.astext() == 'spam #10'
+    assert isinstance(doctree.next_node(pending_xref).parent, nodes.emphasis)
+
+
 @pytest.mark.with_content("""\
 .. code-block:: python
 
@@ -159,14 +193,96 @@ def test_transform_doctest_block(doctree):
 
 
 @pytest.mark.with_content('ab')
-@pytest.mark.confoverrides(issuetracker_issue_pattern=r'(a)(b)')
 def test_too_many_groups(app):
     """
     Test that using an issue pattern with too many groups fails with an
     understandable error message.
     """
+    app.config.issuetracker_issue_pattern = r'(a)(b)'
     with pytest.raises(ValueError) as excinfo:
-        app.build()
+        issuetracker.init_transformer(app)
     error = excinfo.value
     assert str(error) == ('issuetracker_issue_pattern must have '
-                          'exactly one group: {0!r}'.format(('a', 'b')))
+                          'exactly one group: {0!r}'.format('(a)(b)'))
+
+
+def test_issue_pattern_literal():
+    """
+    Test that the literal string required by issue patterns is extracted.
+    """
+    def literal(pattern):
+        return issuetracker.compile_issue_pattern(pattern).literal
+    assert literal(r'#(\d+)') == '#'
+    assert literal(re.compile(r'#(\d+)')) == '#'
+    assert literal(r'gh-(\d+)') == 'gh-'
+    assert literal(r'issue (#\d+)') == 'issue #'
+    assert literal(r'(?:GH|gh)-(\d+)') == '-'
+    assert literal(r'(?<!\w)#(\d+)') == '#'
+
+
+def test_issue_pattern_without_literal():
+    """
+    Test that patterns which don't require a literal string don't get one.
+    """
+    def literal(pattern):
+        return issuetracker.compile_issue_pattern(pattern).literal
+    assert literal(r'(\d+)') is None
+    assert literal(r'#?(\d+)') is None
+    assert literal(re.compile(r'#(\d+)', re.IGNORECASE)) is None
+
+
+@pytest.mark.with_content('#10 :issue:`11`')
+def test_transform_tracker_key(app, doctree):
+    """
+    Test that issue references only contain the key of the tracker config.
+    """
+    tracker_config = issuetracker.TrackerConfig.from_sphinx_config(app.config)
+    xrefs = doctree.traverse(pending_xref)
+    assert len(xrefs) == 2
+    for xref in xrefs:
+        assert 'trackerconfig' not in xref
+        assert app.env.issuetracker_trackers[xref['tracker']] == tracker_config
+
+
+@pytest.mark.with_content('gh-10 #11 GH-12')
+@pytest.mark.confoverrides(
+    issuetracker_issue_pattern=re.compile(r'gh-(\d+)'))
+def test_transform_custom_pattern(doctree):
+    """
+    Test that a custom issue pattern is used to find issue references.
+    """
+    pytest.assert_issue_pending_xref(doctree, '10', 'gh-10')
+
+
+def test_find_issue_references_batched():
+    """
+    Test that batched search maps matches back to their texts.
+    """
+    issue_pattern = issuetracker.compile_issue_pattern(r'#(\d+)')
+    assert issue_pattern.batchable
+    matches = issuetracker.find_issue_references(
+        issue_pattern, ['#1 spam', 'eggs', 'eggs #2 #3'])
+    assert matches == [[(0, 2, '#1', '1')], [],
+                       [(5, 7, '#2', '2'), (8, 10, '#3', '3')]]
+
+
+def test_find_issue_references_not_crossing_texts():
+    """
+    Test that batched search doesn't find matches across text boundaries.
+    """
+    issue_pattern = issuetracker.compile_issue_pattern(r'\s?#(\d+)\s?')
+    assert issue_pattern.batchable
+    matches = issuetracker.find_issue_references(
+        issue_pattern, ['spam #1', ' eggs', '#2'])
+    assert matches == [[(4, 7, ' #1', '1')], [], [(0, 2, '#2', '2')]]
+
+
+def test_find_issue_references_unbatchable():
+    """
+    Test that patterns with anchors are not batched.
+    """
+    issue_pattern = issuetracker.compile_issue_pattern(r'^#(\d+)')
+    assert not issue_pattern.batchable
+    matches = issuetracker.find_issue_references(
+        issue_pattern, ['#1 #2', '#3'])
+    assert matches == [[(0, 2, '#1', '1')], [(0, 2, '#3', '3')]]
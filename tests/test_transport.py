@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    test_transport
+    ==============
+
+    Test recording and replaying responses of issue trackers.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import json
+
+import pytest
+import requests
+
+from mock import Mock
+
+from sphinxcontrib import issuetracker
+from sphinxcontrib.issuetracker import Issue, TrackerConfig, transport
+from sphinxcontrib.issuetracker.transport import (
+    Cassette, UnrecordedRequest, decode_response)
+
+
+URL = 'https://api.github.com/repos/foo/bar/issues/10'
+
+INTERACTION = {
+    'url': URL,
+    'status': 200,
+    'headers': {'Content-Type': 'application/json; charset=utf-8',
+                'X-RateLimit-Remaining': '59',
+                'Link': '<https://api.github.com/page2>; rel="next"'},
+    'body': json.dumps({'number': 10, 'title': 'Eggs', 'state': 'open',
+                        'html_url': 'eggs'}),
+    'duration': 0.25,
+}
+
+
+def pytest_funcarg__cassette_file(request):
+    """
+    A cassette file with the recorded ``INTERACTION``.
+    """
+    tmpdir = request.getfuncargvalue('tmpdir')
+    cassette_file = tmpdir.join('cassette.json')
+    cassette_file.write(json.dumps({'interactions': [INTERACTION]}))
+    return cassette_file
+
+
+def pytest_funcarg__sleep(request):
+    """
+    A mock replacing :func:`time.sleep` in replayed requests.
+    """
+    monkeypatch = request.getfuncargvalue('monkeypatch')
+    sleep = Mock()
+    monkeypatch.setattr(transport.time, 'sleep', sleep)
+    return sleep
+
+
+def pytest_funcarg__confoverrides(request):
+    """
+    Configure the ``cassette_file`` in the app.
+    """
+    confoverrides = request.getfuncargvalue('confoverrides')
+    if 'cassette_file' in request.funcargnames:
+        cassette_file = request.getfuncargvalue('cassette_file')
+        confoverrides = dict(confoverrides,
+                             issuetracker_cassette=str(cassette_file))
+    return confoverrides
+
+
+def test_replay(cassette_file, sleep):
+    """
+    Test that recorded responses are replayed, and unrecorded requests
+    fail.
+    """
+    cassette = Cassette(str(cassette_file))
+    assert cassette.enabled
+    assert len(cassette) == 1
+    response = cassette.get(URL, {})
+    assert response.status_code == 200
+    assert response.headers['x-ratelimit-remaining'] == '59'
+    assert response.json()['title'] == 'Eggs'
+    assert response.links['next']['url'] == 'https://api.github.com/page2'
+    # replayed responses take as long as the recorded request
+    sleep.assert_called_once_with(0.25)
+    with pytest.raises(UnrecordedRequest):
+        cassette.get(URL + '1', {})
+
+
+def test_replay_latency(cassette_file, sleep):
+    """
+    Test that a configured latency overrides the recorded durations.
+    """
+    cassette = Cassette(str(cassette_file), latency=0.01)
+    cassette.get(URL, {})
+    sleep.assert_called_once_with(0.01)
+
+
+def test_record(tmpdir, monkeypatch):
+    """
+    Test that recorded responses are written to the cassette, and replayed
+    later.
+    """
+    response = decode_response(dict(INTERACTION, body_base64='/wA='))
+    get = Mock(return_value=response)
+    monkeypatch.setattr(transport.requests, 'get', get)
+    cassette_file = tmpdir.join('cassettes', 'cassette.json')
+    cassette = Cassette(str(cassette_file), 'record')
+    assert cassette.get(URL, {'User-Agent': 'spam'}) is response
+    get.assert_called_once_with(URL, headers={'User-Agent': 'spam'})
+    cassette.save()
+    assert not cassette.dirty
+    replayed = Cassette(str(cassette_file), latency=0).get(URL, {})
+    assert replayed.status_code == 200
+    assert replayed.content == b'\xff\x00'
+    assert replayed.headers == response.headers
+
+
+def test_disabled(monkeypatch):
+    """
+    Test that a disabled cassette sends requests over the network.
+    """
+    get = Mock()
+    monkeypatch.setattr(transport.requests, 'get', get)
+    cassette = Cassette()
+    assert not cassette.enabled
+    assert cassette.get(URL, {}) is get.return_value
+
+
+def test_invalid_cassette(tmpdir):
+    """
+    Test that unknown modes and files, which are no cassettes, are
+    rejected.
+    """
+    with pytest.raises(ValueError):
+        Cassette(str(tmpdir.join('cassette.json')), 'rewind')
+    cassette_file = tmpdir.join('cassette.json')
+    cassette_file.write('[]')
+    with pytest.raises(ValueError):
+        Cassette(str(cassette_file))
+
+
+@pytest.mark.with_content('dummy content')
+@pytest.mark.confoverrides(issuetracker='github',
+                           issuetracker_project='foo/bar',
+                           issuetracker_cassette_latency=0)
+def test_lookup_replayed(app, cassette_file, monkeypatch):
+    """
+    Test that issues are looked up from a cassette without network.
+    """
+    monkeypatch.setattr(requests, 'get', Mock(side_effect=AssertionError))
+    tracker_config = TrackerConfig.from_sphinx_config(app.config)
+    issue = issuetracker.lookup_issue(app, tracker_config, '10')
+    assert issue == Issue(id='10', title='Eggs', closed=False, url='eggs')
+    stats = app.env.issuetracker_stats.as_dict()['hosts']['api.github.com']
+    assert stats['statuses'] == {'200': 1}
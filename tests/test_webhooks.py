@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Sebastian Wiesner <lunaryorn@gmail.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+    test_webhooks
+    =============
+
+    Test updating the issue cache from webhook payloads.
+
+    .. moduleauthor::  Sebastian Wiesner  <lunaryorn@gmail.com>
+"""
+
+
+from __future__ import (print_function, division, unicode_literals,
+                        absolute_import)
+
+import io
+import json
+import threading
+
+try:
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+except ImportError:
+    from urllib2 import Request, urlopen, HTTPError
+
+import pytest
+
+from sphinxcontrib.issuetracker import Issue
+from sphinxcontrib.issuetracker.cache import IssueCache
+from sphinxcontrib.issuetracker import webhooks
+from sphinxcontrib.issuetracker.webhooks import (
+    IssueUpdate, WebhookServer, parse_payload, load_payloads, apply_updates,
+    sign_payload, verify_signature)
+
+
+GITHUB_PAYLOAD = {
+    'action': 'closed',
+    'issue': {'number': 10, 'title': 'Eggs', 'state': 'closed',
+              'html_url': 'https://github.com/foo/bar/issues/10'},
+    'repository': {'full_name': 'foo/bar'},
+}
+
+BITBUCKET_PAYLOAD = {
+    'issue': {'id': 10, 'title': 'Eggs', 'state': 'resolved',
+              'links': {'html': {
+                  'href': 'https://bitbucket.org/foo/bar/issue/10'}}},
+    'repository': {'full_name': 'foo/bar'},
+}
+
+JIRA_PAYLOAD = {
+    'webhookEvent': 'jira:issue_updated',
+    'issue': {'key': 'FOO-10',
+              'self': 'https://jira.example.com/rest/api/2/issue/10010',
+              'fields': {'summary': 'Eggs', 'resolution': {'name': 'Fixed'},
+                         'project': {'key': 'FOO', 'name': 'Foo'}}},
+}
+
+REDMINE_PAYLOAD = {
+    'payload': {
+        'action': 'updated',
+        'issue': {'id': 10, 'subject': 'Eggs',
+                  'status': {'id': 5, 'name': 'Closed', 'is_closed': True},
+                  'project': {'id': 1, 'name': 'Foo'}},
+        'url': 'https://redmine.example.com/issues/10',
+    },
+}
+
+
+def pytest_funcarg__cache(request):
+    """
+    An issue cache with an open issue ``10`` and a missing issue ``11``.
+    """
+    tmpdir = request.getfuncargvalue('tmpdir')
+    cache = IssueCache(str(tmpdir.join('cache.pickle')))
+    cache['10'] = Issue(id='10', title='Spam', closed=False,
+                        url='https://github.com/foo/bar/issues/10')
+    cache['11'] = None
+    cache.save()
+    return cache
+
+
+def pytest_funcarg__server(request):
+    """
+    A :class:`WebhookServer` for the ``cache`` with the secret ``'spam'``,
+    serving in a background thread.
+    """
+    cache = request.getfuncargvalue('cache')
+    server = WebhookServer(('127.0.0.1', 0), cache, secret='spam')
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+        thread.join()
+    request.addfinalizer(stop)
+    return server
+
+
+def post(server, payload, signature=None):
+    """
+    Post ``payload`` to the ``server`` with the given ``signature``.
+
+    Return the status code of the response.
+    """
+    body = json.dumps(payload).encode('utf-8')
+    request = Request('http://127.0.0.1:{0}/'.format(server.server_port),
+                      body, {'Content-Type': 'application/json'})
+    if signature:
+        request.add_header('X-Hub-Signature-256', signature(body))
+    try:
+        return urlopen(request).getcode()
+    except HTTPError as error:
+        return error.code
+
+
+@pytest.mark.parametrize(('payload', 'update'), [
+    (GITHUB_PAYLOAD, IssueUpdate('foo/bar', Issue(
+        id='10', title='Eggs', closed=True,
+        url='https://github.com/foo/bar/issues/10'))),
+    (BITBUCKET_PAYLOAD, IssueUpdate('foo/bar', Issue(
+        id='10', title='Eggs', closed=True,
+        url='https://bitbucket.org/foo/bar/issue/10'))),
+    (JIRA_PAYLOAD, IssueUpdate('Foo', Issue(
+        id='FOO-10', title='Eggs', closed=True,
+        url='https://jira.example.com/browse/FOO-10'))),
+    (REDMINE_PAYLOAD, IssueUpdate('Foo', Issue(
+        id='10', title='Eggs', closed=True,
+        url='https://redmine.example.com/issues/10'))),
+])
+def test_parse_payload(payload, update):
+    assert parse_payload(payload) == update
+
+
+def test_parse_unknown_payload():
+    with pytest.raises(ValueError):
+        parse_payload({'zen': 'Keep it logically awesome.'})
+    with pytest.raises(ValueError):
+        parse_payload({'webhookEvent': 'jira:issue_updated'})
+
+
+def test_load_payloads():
+    """
+    Test that files with a single payload or a payload per line are loaded.
+    """
+    source = io.BytesIO(json.dumps(GITHUB_PAYLOAD, indent=2).encode('utf-8'))
+    assert load_payloads(source) == [GITHUB_PAYLOAD]
+    lines = '\n'.join(json.dumps(payload) for payload
+                      in [GITHUB_PAYLOAD, JIRA_PAYLOAD])
+    source = io.BytesIO(lines.encode('utf-8'))
+    assert load_payloads(source) == [GITHUB_PAYLOAD, JIRA_PAYLOAD]
+
+
+def test_apply_updates(cache):
+    """
+    Test that updates of cached issues are applied and marked as changed.
+    """
+    update = parse_payload(GITHUB_PAYLOAD)
+    missing = IssueUpdate('foo/bar', update.issue._replace(id='11'))
+    uncached = IssueUpdate('foo/bar', update.issue._replace(id='12'))
+    assert apply_updates(cache, [update, missing, uncached]) == ['10']
+    assert cache['10'] == update.issue
+    assert cache['11'] is None
+    assert '12' not in cache
+    assert cache.changed == set(['10'])
+    # applying the same update again changes nothing
+    assert apply_updates(cache, [update]) == []
+
+
+def test_apply_updates_of_project(cache):
+    """
+    Test that only updates of the given project are applied.
+    """
+    update = parse_payload(GITHUB_PAYLOAD)
+    assert apply_updates(cache, [update], project='spam/eggs') == []
+    assert not cache.changed
+    assert apply_updates(cache, [update], project='foo/bar') == ['10']
+
+
+def test_server_reloads_cache(server, cache):
+    """
+    Test that the server applies payloads to the current cache file, and
+    doesn't overwrite issues, which a build added in the meantime.
+    """
+    # a build adds an issue, after the server loaded the cache
+    build_cache = IssueCache(cache.filename)
+    build_cache['12'] = None
+    build_cache.save()
+    assert post(server, GITHUB_PAYLOAD,
+                lambda body: sign_payload('spam', body)) == 204
+    cache = IssueCache(cache.filename)
+    assert cache['10'].closed
+    assert cache['12'] is None
+    assert cache.changed == set(['10'])
+
+
+def test_build_keeps_changes_of_server(server, cache):
+    """
+    Test that a build, which loaded the cache before the server applied a
+    payload, keeps the change of the server.
+    """
+    build_cache = IssueCache(cache.filename)
+    build_cache['12'] = None
+    assert post(server, GITHUB_PAYLOAD,
+                lambda body: sign_payload('spam', body)) == 204
+    build_cache.save()
+    cache = IssueCache(cache.filename)
+    assert cache['10'].closed
+    assert cache['12'] is None
+    assert cache.changed == set(['10'])
+
+
+def test_server_rejects_invalid_signature(server, cache):
+    """
+    Test that the server rejects payloads without a valid signature.
+    """
+    assert post(server, GITHUB_PAYLOAD) == 403
+    assert post(server, GITHUB_PAYLOAD,
+                lambda body: sign_payload('eggs', body)) == 403
+    assert not IssueCache(cache.filename)['10'].closed
+
+
+def test_verify_signature_without_compare_digest(monkeypatch):
+    """
+    Test that signatures are verified on Python versions without
+    :func:`hmac.compare_digest`.
+    """
+    monkeypatch.setattr(webhooks, 'compare_digest',
+                        webhooks._compare_digest)
+    signature = sign_payload('spam', b'eggs')
+    assert verify_signature('spam', b'eggs', signature)
+    assert not verify_signature('spam', b'ham', signature)
+    assert not verify_signature('spam', b'eggs', signature[:-1])
+    assert not verify_signature('spam', b'eggs', None)